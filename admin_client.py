@@ -0,0 +1,181 @@
+import asyncio
+import statistics
+import time
+from collections import defaultdict
+
+import httpx
+
+BASE_URL = "http://127.0.0.1:8000"
+API_TOKEN = "secret-token"
+
+
+def generate_round_robin_pairs(teams):
+    """Generates match pairs using the round-robin (circle) method, interleaved to maximize rest time."""
+    if not teams:
+        return []
+
+    teams = list(teams)
+    # If odd number of teams, add a dummy team for byes
+    if len(teams) % 2:
+        teams.append(None)
+
+    n = len(teams)
+    rounds = []
+    for _ in range(n - 1):
+        round_pairs = []
+        for i in range(n // 2):
+            team1 = teams[i]
+            team2 = teams[n - 1 - i]
+            if team1 and team2: # Ensure no Nones are paired
+                # Sort by class_id to keep pairs consistent
+                round_pairs.append(tuple(sorted((team1['id'], team2['id']))))
+        rounds.append(round_pairs)
+
+        # Rotate teams for next round, keeping first team fixed
+        teams.insert(1, teams.pop())
+
+    # Interleave the matches to spread them out
+    interleaved_pairs = []
+    num_matches_per_round = max((len(r) for r in rounds), default=0)
+    for i in range(num_matches_per_round):
+        for round_pairs in rounds:
+            if i < len(round_pairs):
+                interleaved_pairs.append(round_pairs[i])
+    return interleaved_pairs
+
+
+class AdminClient:
+    """
+    Async client for the admin API. One keep-alive connection pool is shared by all
+    operations, at most `concurrency` requests are in flight, and every request's latency
+    and outcome is recorded per operation name.
+    """
+
+    def __init__(self, base_url=BASE_URL, token=API_TOKEN, concurrency=8, timeout=10.0):
+        self.base_url = base_url
+        self.token = token
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(list)
+        self._client = None
+        self._semaphore = None
+        self._paths = None
+        self._paths_lock = None
+
+    async def __aenter__(self):
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        self._client = httpx.AsyncClient(base_url=self.base_url, headers=headers, limits=limits, timeout=self.timeout)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._paths_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+
+    async def request(self, operation, method, url, **kwargs):
+        """Sends one request and records its latency; returns the decoded JSON or None on failure."""
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self._client.request(method, url, **kwargs)
+                response.raise_for_status()
+                return response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                detail = e.response.text if isinstance(e, httpx.HTTPStatusError) else str(e)
+                self.failures[operation].append(f"{method} {url}: {detail}")
+                return None
+            finally:
+                self.latencies[operation].append(time.perf_counter() - start)
+
+    async def login(self, password):
+        result = await self.request("login", "POST", "/login", json={"password": password})
+        if result and result.get("token"):
+            self.token = result["token"]
+            self._client.headers["Authorization"] = f"Bearer {self.token}"
+            return True
+        return False
+
+    async def has_path(self, path):
+        """Whether the server's OpenAPI schema lists `path` (used to prefer bulk endpoints)."""
+        async with self._paths_lock:
+            if self._paths is None:
+                schema = await self.request("openapi", "GET", "/openapi.json")
+                self._paths = set(schema.get("paths", {})) if schema else set()
+        return path in self._paths
+
+    async def get_catalog(self):
+        """The sport and league names registered on the server (GET /catalog/), in display order."""
+        catalog = await self.request("get_catalog", "GET", "/catalog/")
+        if catalog is None:
+            return [], []
+        return [sport["name"] for sport in catalog["sports"]], [league["name"] for league in catalog["leagues"]]
+
+    async def get_league_teams(self, sport, league):
+        return await self.request("get_teams", "GET", f"/leagues/{sport}/{league}/teams/") or []
+
+    async def get_league_matches(self, sport, league):
+        return await self.request("get_matches", "GET", f"/leagues/{sport}/{league}/matches/") or []
+
+    async def create_league_match(self, sport, league, class1_id, class2_id):
+        payload = {
+            "sport": sport,
+            "league": league,
+            "class1_id": class1_id,
+            "class2_id": class2_id,
+            "class1_score": 0,
+            "class2_score": 0,
+            "class1_sets_won": 0,
+            "class2_sets_won": 0,
+            "winner_id": None,
+        }
+        return await self.request("create_match", "POST", "/league_matches/", json=payload)
+
+    async def create_class(self, name):
+        return await self.request("create_class", "POST", "/classes/", json={"name": name})
+
+    async def generate_league_matches(self, sport, league, prefer_bulk=True):
+        """
+        Creates the missing round-robin matches of one league. Uses the server-side generator when
+        the server offers it, otherwise creates each missing pair with its own request.
+        """
+        if prefer_bulk and await self.has_path("/leagues/{sport}/{league}/generate_matches/"):
+            result = await self.request("generate_matches", "POST", f"/leagues/{sport}/{league}/generate_matches/")
+            return result["created_count"] if result else 0
+
+        teams, existing_matches = await asyncio.gather(
+            self.get_league_teams(sport, league),
+            self.get_league_matches(sport, league),
+        )
+        if len(teams) < 2:
+            return 0
+        existing_pairs = {tuple(sorted((m['class1']['id'], m['class2']['id']))) for m in existing_matches}
+        missing = [pair for pair in generate_round_robin_pairs(teams) if pair not in existing_pairs]
+        results = await asyncio.gather(*(self.create_league_match(sport, league, c1, c2) for c1, c2 in missing))
+        return sum(1 for r in results if r is not None)
+
+    async def generate_all_league_matches(self, sports=None, leagues=None, prefer_bulk=True):
+        """Runs generate_league_matches for every (sport, league) concurrently; None means all in the catalog."""
+        if sports is None or leagues is None:
+            catalog_sports, catalog_leagues = await self.get_catalog()
+            sports = catalog_sports if sports is None else sports
+            leagues = catalog_leagues if leagues is None else leagues
+        keys = [(sport, league) for sport in sports for league in leagues]
+        counts = await asyncio.gather(*(self.generate_league_matches(s, l, prefer_bulk) for s, l in keys))
+        return dict(zip(keys, counts))
+
+    def report(self):
+        """Per-operation request count, failures and latency percentiles, as printable lines."""
+        lines = []
+        for operation, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            lines.append(
+                f"{operation:<18} n={len(samples):<4} failed={len(self.failures[operation]):<3} "
+                f"p50={statistics.median(ordered) * 1000:.1f}ms p95={p95 * 1000:.1f}ms max={ordered[-1] * 1000:.1f}ms"
+            )
+        for operation, errors in sorted(self.failures.items()):
+            for error in errors:
+                lines.append(f"  [{operation}] {error}")
+        return lines
@@ -0,0 +1,258 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from starlette.datastructures import Headers
+
+# 同時に処理する公開リクエスト (認証なし) の上限。1画面を開いたときの同時GET (競技詳細で9件) は待ち行列で受ける。
+# 管理者の上限と合わせて DB の接続プール (既定 5 + 溢れ 10) より少なくし、バックグラウンドの再計算・
+# 書き込みの分を残す。これを超えるとスレッドが接続を待ったまま止まり、得点入力も待たされる。
+# 集計は GIL を取り合うので、同時に動かす数を増やしても速くならず、書き込みの順番が遅れるだけになる
+READ_CONCURRENCY = int(os.environ.get("TOKUTEN_READ_CONCURRENCY", "8"))
+# 空きを待てる公開リクエストの数と、待つ最大時間 (秒)。超えた分は直近の応答 (古いもの) か 503 を返す
+READ_QUEUE_DEPTH = int(os.environ.get("TOKUTEN_READ_QUEUE_DEPTH", "64"))
+READ_QUEUE_TIMEOUT = float(os.environ.get("TOKUTEN_READ_QUEUE_TIMEOUT", "2"))
+# 同時に処理する管理者リクエスト (得点入力・準備) の上限。超えた分は空くまで待たせる
+WRITE_CONCURRENCY = int(os.environ.get("TOKUTEN_WRITE_CONCURRENCY", "4"))
+# 管理者リクエストが空きを待つ最大時間 (秒)。超えたら 503
+WRITE_QUEUE_TIMEOUT = float(os.environ.get("TOKUTEN_WRITE_QUEUE_TIMEOUT", "10"))
+# 断った公開GETに返せるよう、URLごとに保持しておく直近の応答の数
+STALE_CACHE_SIZE = int(os.environ.get("TOKUTEN_STALE_CACHE_SIZE", "256"))
+# 1クライアント (IPアドレス) あたりの公開リクエストの毎秒の上限と、まとめて受け付ける数。0 で無効
+RATE_LIMIT = float(os.environ.get("TOKUTEN_RATE_LIMIT", "0"))
+RATE_BURST = float(os.environ.get("TOKUTEN_RATE_BURST", "40"))
+
+# これより大きい応答は保持しない (エクスポートなど)
+MAX_CACHED_BODY = 1 << 20
+MAX_BUCKETS = 10000
+RETRY_AFTER = 1
+
+
+def _json_reply(status, detail, retry_after):
+    body = json.dumps({"detail": detail}).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+               (b"retry-after", str(retry_after).encode())]
+    return status, headers, body
+
+
+async def _send(send, status, headers, body):
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class Admission:
+    """
+    Two lanes in front of the threadpool and connection pool. Requests carrying the admin token (score entry and
+    setup) have their own limit and queue for a slot; public requests are capped so that a
+    polling storm cannot occupy the threads writes need. Public requests over the cap wait in a
+    short bounded queue; one that finds the queue full or waits too long is shed, and a shed GET
+    is answered with the last response for its URL, marked stale, or with 503 and Retry-After. A slot is
+    held until the last body chunk has been sent, so streamed exports count against the limits;
+    only server-sent event streams, which stay open indefinitely, release theirs when they start.
+    """
+
+    def __init__(self, read_limit=READ_CONCURRENCY, write_limit=WRITE_CONCURRENCY, write_timeout=WRITE_QUEUE_TIMEOUT,
+                 cache_size=STALE_CACHE_SIZE, rate=RATE_LIMIT, burst=RATE_BURST, read_queue=READ_QUEUE_DEPTH,
+                 read_timeout=READ_QUEUE_TIMEOUT):
+        self.read_limit = read_limit
+        self.read_queue = read_queue
+        self.read_timeout = read_timeout
+        self.write_limit = write_limit
+        self.write_timeout = write_timeout
+        self.cache_size = cache_size
+        self.rate = rate
+        self.burst = burst
+        self.reads = 0
+        self.writes = 0
+        self.shed = 0
+        self.served_stale = 0
+        self.rate_limited = 0
+        self.write_timeouts = 0
+        self._waiters = deque()
+        self._read_waiters = deque()
+        self._cache = OrderedDict()  # (festival, path, query) -> (status, headers, body, stored_at)
+        self._buckets = {}  # client -> [tokens, updated]
+
+    def stats(self):
+        return {
+            "public_in_flight": self.reads, "public_waiting": len(self._read_waiters), "public_limit": self.read_limit,
+            "priority_in_flight": self.writes, "priority_waiting": len(self._waiters), "priority_limit": self.write_limit,
+            "shed": self.shed, "served_stale": self.served_stale, "rate_limited": self.rate_limited,
+            "priority_timeouts": self.write_timeouts, "cached_responses": len(self._cache),
+        }
+
+    # --- 管理者の枠: 空くまで待つ ---
+    async def acquire_write(self):
+        if self.writes < self.write_limit:
+            self.writes += 1
+            return True
+        if await _wait_for_slot(self._waiters, self.write_timeout, self.release_write):
+            return True
+        self.write_timeouts += 1
+        return False
+
+    def release_write(self):
+        if not _hand_over(self._waiters):
+            self.writes -= 1
+
+    # --- 公開の枠: 短い待ち行列に並び、溢れたら断る ---
+    async def acquire_read(self):
+        if self.reads < self.read_limit:
+            self.reads += 1
+            return True
+        if len(self._read_waiters) < self.read_queue and \
+                await _wait_for_slot(self._read_waiters, self.read_timeout, self.release_read):
+            return True
+        self.shed += 1
+        return False
+
+    def release_read(self):
+        if not _hand_over(self._read_waiters):
+            self.reads -= 1
+
+    def take_token(self, client):
+        """Seconds until `client` may send again (0 when this request is allowed)."""
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._prune(now)
+            bucket = self._buckets[client] = [self.burst, now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            self.rate_limited += 1
+            return (1 - tokens) / self.rate
+        bucket[0] = tokens - 1
+        return 0
+
+    def _prune(self, now):
+        # 満タンまで回復しているクライアントは、消しても次に来たときと同じ状態になる
+        full = [client for client, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for client in full or list(self._buckets)[:len(self._buckets) // 2]:
+            del self._buckets[client]
+
+    # --- 断ったときに返す直近の応答 ---
+    def cached(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        self.served_stale += 1
+        status, headers, body, stored_at = entry
+        age = str(int(time.time() - stored_at)).encode()
+        return status, headers + [(b"x-cache", b"stale"), (b"age", age)], body
+
+    def store(self, key, status, headers, body):
+        self._cache[key] = (status, headers, body, time.time())
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+async def _wait_for_slot(waiters, timeout, release):
+    """Queues in `waiters` for a slot handed over by `_hand_over`; False after `timeout` seconds."""
+    waiter = asyncio.get_running_loop().create_future()
+    waiters.append(waiter)
+    try:
+        # 空いた枠は release から直接引き継がれる
+        await asyncio.wait_for(waiter, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    except BaseException:
+        # 枠を引き継いだ直後に切断された場合は返す
+        if waiter.done() and not waiter.cancelled():
+            release()
+        raise
+    finally:
+        if waiter in waiters:
+            waiters.remove(waiter)
+
+
+def _hand_over(waiters):
+    """Passes a released slot to the first live waiter; False when nobody is waiting."""
+    while waiters:
+        waiter = waiters.popleft()
+        if not waiter.done():
+            waiter.set_result(None)
+            return True
+    return False
+
+
+control = Admission()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying `control` (see Admission); `is_trusted(authorization)` picks the lane."""
+
+    def __init__(self, app, is_trusted, control: Admission = control):
+        self.app = app
+        self.is_trusted = is_trusted
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        if self.is_trusted(headers.get("authorization")):
+            return await self._priority(scope, receive, send)
+        return await self._public(scope, receive, send, headers)
+
+    async def _priority(self, scope, receive, send):
+        control = self.control
+        if not await control.acquire_write():
+            return await _send(send, *_json_reply(503, "Server is busy, please retry", RETRY_AFTER))
+        await self._run(scope, receive, send, control.release_write)
+
+    async def _public(self, scope, receive, send, headers):
+        control = self.control
+        client = scope["client"][0] if scope.get("client") else ""
+        wait = control.take_token(client)
+        if wait:
+            return await _send(send, *_json_reply(429, "Too many requests", math.ceil(wait)))
+        key = (headers.get("x-festival"), scope["path"], scope["query_string"]) if scope["method"] == "GET" else None
+        if not await control.acquire_read():
+            reply = control.cached(key) if key is not None else None
+            return await _send(send, *(reply or _json_reply(503, "Server is busy, please retry", RETRY_AFTER)))
+        await self._run(scope, receive, send, control.release_read, cache_key=key)
+
+    async def _run(self, scope, receive, send, release, cache_key=None):
+        released = False
+        captured = None
+        size = 0
+
+        async def sending(message):
+            nonlocal released, captured, size
+            if message["type"] == "http.response.start":
+                content_type = Headers(raw=message["headers"]).get("content-type", "")
+                if content_type.startswith("text/event-stream") and not released:
+                    released = True
+                    release()
+                if cache_key is not None and message["status"] == 200 and content_type.startswith("application/json"):
+                    captured = (message["status"], list(message["headers"]), [])
+                    size = 0
+            elif message["type"] == "http.response.body" and captured is not None:
+                body = message.get("body", b"")
+                captured[2].append(body)
+                size += len(body)
+                if size > MAX_CACHED_BODY:
+                    captured = None
+                elif not message.get("more_body", False):
+                    self.control.store(cache_key, captured[0], captured[1], b"".join(captured[2]))
+                    captured = None
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and not released:
+                released = True
+                release()
+
+        try:
+            await self.app(scope, receive, sending)
+        finally:
+            if not released:
+                release()
@@ -0,0 +1,251 @@
+from sqlalchemy.orm import Session
+from collections import defaultdict
+import models, services, sportcatalog
+from fastapi import HTTPException
+
+
+def _match_points(match):
+    """Returns the league points (2/1/0) earned by each side of a finished match."""
+    score1 = match.class1_score if match.class1_score is not None else 0
+    score2 = match.class2_score if match.class2_score is not None else 0
+    if score1 > score2:
+        return 2, 0
+    if score2 > score1:
+        return 0, 2
+    return 1, 1
+
+
+def _order_matches(matches, num_teams):
+    """
+    Orders the remaining matches team by team so that each team's last match comes as early as possible.
+    Once a team has played its last match its points are final, which keeps the memo keys small.
+    """
+    remaining_count = [0] * num_teams
+    for a, b in matches:
+        remaining_count[a] += 1
+        remaining_count[b] += 1
+    team_order = sorted(range(num_teams), key=lambda t: remaining_count[t])
+
+    ordered = []
+    placed = set()
+    for team in team_order:
+        for index, (a, b) in enumerate(matches):
+            if index not in placed and team in (a, b):
+                ordered.append((a, b))
+                placed.add(index)
+    return ordered
+
+
+def _outcome_exists(points, matches, bar, target, maximize):
+    """
+    Searches the outcomes (2-0, 1-1, 0-2) of `matches` for one where the number of teams with
+    at least `bar` points is >= `target` (maximize=True) or < `target` (maximize=False).
+
+    Points only ever grow, so a team that already reached `bar` stays there and a team that cannot
+    reach it with all remaining wins never will. Both facts give early exits and cutoffs, and
+    partial point vectors that were already shown to fail are memoized.
+    """
+    num_teams = len(points)
+    matches = _order_matches(matches, num_teams)
+    points = list(points)
+
+    remaining = [0] * num_teams
+    last_match = [-1] * num_teams
+    for index, (a, b) in enumerate(matches):
+        remaining[a] += 1
+        remaining[b] += 1
+        last_match[a] = index
+        last_match[b] = index
+
+    retired_at = defaultdict(list)
+    for team in range(num_teams):
+        retired_at[last_match[team] + 1].append(team)
+
+    failed = set()
+
+    def search(step, done_above, active):
+        for team in retired_at.get(step, ()):
+            active = active - {team}
+            if points[team] >= bar:
+                done_above += 1
+
+        already_above = done_above + sum(1 for t in active if points[t] >= bar)
+        can_be_above = done_above + sum(1 for t in active if points[t] + 2 * remaining[t] >= bar)
+        if maximize:
+            if already_above >= target:
+                return True
+            if can_be_above < target:
+                return False
+        else:
+            if can_be_above < target:
+                return True
+            if already_above >= target:
+                return False
+
+        key = (step, done_above, tuple(points[t] for t in sorted(active)))
+        if key in failed:
+            return False
+
+        a, b = matches[step]
+        remaining[a] -= 1
+        remaining[b] -= 1
+        for gain_a, gain_b in ((2, 0), (0, 2), (1, 1)):
+            points[a] += gain_a
+            points[b] += gain_b
+            found = search(step + 1, done_above, active)
+            points[a] -= gain_a
+            points[b] -= gain_b
+            if found:
+                remaining[a] += 1
+                remaining[b] += 1
+                return True
+        remaining[a] += 1
+        remaining[b] += 1
+
+        failed.add(key)
+        return False
+
+    return search(0, 0, frozenset(range(num_teams)))
+
+
+def _rival_state(team, class_ids, points, remaining_matches, team_wins):
+    """
+    Fixes every remaining match of `team` (all wins or all losses) and returns the rivals' points
+    and the rivals-only matches, re-indexed from 0.
+    """
+    rivals = [cid for cid in class_ids if cid != team]
+    index = {cid: i for i, cid in enumerate(rivals)}
+    rival_points = [points[cid] for cid in rivals]
+    team_points = points[team]
+    rival_matches = []
+    for class1_id, class2_id in remaining_matches:
+        if team in (class1_id, class2_id):
+            other = class2_id if class1_id == team else class1_id
+            if team_wins:
+                team_points += 2
+            else:
+                rival_points[index[other]] += 2
+        else:
+            rival_matches.append((index[class1_id], index[class2_id]))
+    return team_points, rival_points, rival_matches
+
+
+def can_miss_top(team, class_ids, points, remaining_matches, slots):
+    """Whether some outcome leaves `slots` or more rivals level with or above `team`."""
+    team_points, rival_points, rival_matches = _rival_state(team, class_ids, points, remaining_matches, team_wins=False)
+    return _outcome_exists(rival_points, rival_matches, bar=team_points, target=slots, maximize=True)
+
+
+def can_reach_top(team, class_ids, points, remaining_matches, slots):
+    """Whether some outcome leaves fewer than `slots` rivals strictly above `team`."""
+    team_points, rival_points, rival_matches = _rival_state(team, class_ids, points, remaining_matches, team_wins=True)
+    return _outcome_exists(rival_points, rival_matches, bar=team_points + 1, target=slots, maximize=False)
+
+
+def calculate_league_clinch(sport: str, league: str, matches, class_names: dict, db: Session, standings=None):
+    """
+    Reports, for every class in the league, whether it has clinched or been eliminated from
+    first place and from a tournament slot. `standings` is the league's standings when the
+    caller already has them.
+
+    While matches remain, a points tie is treated as undecided because the sets won in the
+    remaining matches are unknown. Once every match is finished the regular standings
+    (including tie-breaks) decide.
+    """
+    slots = services.tournament_slots_per_league(sport, db)
+    points = defaultdict(int)
+    remaining_count = defaultdict(int)
+    remaining_matches = []
+    class_ids = []
+
+    for match in matches:
+        if not match.class1_id or not match.class2_id:
+            continue
+        for cid in (match.class1_id, match.class2_id):
+            if cid not in points:
+                points[cid] = 0
+                class_ids.append(cid)
+        if match.is_finished:
+            points1, points2 = _match_points(match)
+            points[match.class1_id] += points1
+            points[match.class2_id] += points2
+        else:
+            remaining_matches.append((match.class1_id, match.class2_id))
+            remaining_count[match.class1_id] += 1
+            remaining_count[match.class2_id] += 1
+
+    if not class_ids:
+        return None
+
+    teams = []
+    if not remaining_matches:
+        if standings is None:
+            standings = services.calculate_league_standings(sport, league, db)
+        for standing in standings:
+            cid = standing["class_id"]
+            rank = standing["rank"]
+            teams.append({
+                "class_id": cid,
+                "class_name": class_names.get(cid, standing["class_name"]),
+                "points": points[cid],
+                "max_points": points[cid],
+                "remaining_matches": 0,
+                "clinched_first": rank == 1,
+                "eliminated_first": rank > 1,
+                "clinched_tournament": rank <= slots,
+                "eliminated_tournament": rank > slots,
+            })
+    else:
+        for cid in class_ids:
+            teams.append({
+                "class_id": cid,
+                "class_name": class_names.get(cid, ""),
+                "points": points[cid],
+                "max_points": points[cid] + 2 * remaining_count[cid],
+                "remaining_matches": remaining_count[cid],
+                "clinched_first": not can_miss_top(cid, class_ids, points, remaining_matches, 1),
+                "eliminated_first": not can_reach_top(cid, class_ids, points, remaining_matches, 1),
+                "clinched_tournament": not can_miss_top(cid, class_ids, points, remaining_matches, slots),
+                "eliminated_tournament": not can_reach_top(cid, class_ids, points, remaining_matches, slots),
+            })
+        teams.sort(key=lambda t: (t["points"], t["max_points"]), reverse=True)
+
+    return {
+        "sport": sport,
+        "league": league,
+        "tournament_slots": slots,
+        "remaining_matches": len(remaining_matches),
+        "teams": teams,
+    }
+
+
+def get_league_clinch(sport: str, league: str, db: Session):
+    matches = db.query(models.LeagueMatch).filter(
+        models.LeagueMatch.sport == sport,
+        models.LeagueMatch.league == league
+    ).all()
+    class_names = dict(db.query(models.SchoolClass.id, models.SchoolClass.name).all())
+    report = calculate_league_clinch(sport, league, matches, class_names, db)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No matches found for this league")
+    return report
+
+
+def get_all_clinch(db: Session):
+    """Builds the clinch report for every (sport, league) that has matches, from a single match query."""
+    matches_by_league = defaultdict(list)
+    for match in db.query(models.LeagueMatch).all():
+        matches_by_league[(match.sport, match.league)].append(match)
+    class_names = dict(db.query(models.SchoolClass.id, models.SchoolClass.name).all())
+
+    catalog = sportcatalog.for_session(db)
+    # 終了したリーグの順位表は1回の集計クエリでまとめて求める
+    finished = any(all(match.is_finished for match in matches) for matches in matches_by_league.values())
+    all_standings = services.calculate_all_league_standings(db) if finished else {}
+    reports = []
+    for sport, league in sorted(matches_by_league, key=lambda key: catalog.order(*key)):
+        report = calculate_league_clinch(sport, league, matches_by_league[(sport, league)], class_names, db,
+                                         standings=all_standings.get((sport, league), []))
+        if report is not None:
+            reports.append(report)
+    return reports
@@ -0,0 +1,336 @@
+import csv
+import io
+import json
+from sqlalchemy import select, update, insert, bindparam, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, aliased
+import models, events, services, sportcatalog
+
+CLASS_COLUMNS = ["name"]
+TEAM_COLUMNS = ["sport", "league", "class_name"]
+RESULT_COLUMNS = ["sport", "league", "class1", "class2", "class1_score", "class2_score",
+                  "class1_sets_won", "class2_sets_won", "winner", "is_finished"]
+
+RESULT_FIELDS = ["class1_score", "class2_score", "class1_sets_won", "class2_sets_won", "winner_id", "is_finished"]
+
+# 全件エクスポート (/export/) の列。試合はクラスIDとクラス名の両方を出す
+MATCH_EXPORT_COLUMNS = ["class1_id", "class1", "class2_id", "class2", "class1_score", "class2_score",
+                        "class1_sets_won", "class2_sets_won", "winner_id", "winner", "is_finished", "version"]
+LEAGUE_MATCH_EXPORT_COLUMNS = ["id", "sport", "league"] + MATCH_EXPORT_COLUMNS
+TOURNAMENT_MATCH_EXPORT_COLUMNS = ["id", "sport", "match_name"] + MATCH_EXPORT_COLUMNS
+STANDING_EXPORT_COLUMNS = ["sport", "league", "rank", "class_id", "class_name", "points", "wins", "losses", "ties",
+                           "sets_won_points", "league_points"]
+RANKING_EXPORT_COLUMNS = ["rank", "class_id", "class_name", "total_points"]
+
+# DBから一度に取り出す行数と、レスポンスに書き出す1回の大きさ
+EXPORT_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+class CsvImportError(ValueError):
+    pass
+
+
+def _column(row, name, line):
+    if name not in row:
+        raise CsvImportError(f"line {line}: missing column '{name}'")
+    return row[name]
+
+
+def _int_or_none(row, name, line):
+    value = (row.get(name) or "").strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise CsvImportError(f"line {line}: {name} is not a number: '{value}'") from None
+
+
+def _bool(value):
+    return (value or "").strip().lower() in ("1", "true", "yes", "y", "済")
+
+
+def _sport(catalog, value, line):
+    name = (value or "").strip()
+    if name not in catalog.sports:
+        raise CsvImportError(f"line {line}: unknown sport '{value}'")
+    return name
+
+
+def _league(catalog, value, line):
+    name = (value or "").strip()
+    if name not in catalog.leagues:
+        raise CsvImportError(f"line {line}: unknown league '{value}'")
+    return name
+
+
+def _class_ids(db: Session):
+    return {name: cid for cid, name in db.execute(select(models.SchoolClass.id, models.SchoolClass.name))}
+
+
+def _lookup(class_ids, name, line):
+    name = (name or "").strip()
+    if name not in class_ids:
+        raise CsvImportError(f"line {line}: unknown class '{name}'")
+    return class_ids[name]
+
+
+def import_classes(db: Session, rows):
+    """Inserts the classes that do not exist yet (matched by name) with one executemany statement."""
+    names = []
+    for line, row in enumerate(rows, 2):
+        name = (row.get("name") or "").strip()
+        if not name:
+            raise CsvImportError(f"line {line}: class name is empty")
+        names.append({"name": name})
+    if not names:
+        return 0
+    existing = len(_class_ids(db))
+    db.execute(sqlite_insert(models.SchoolClass.__table__).on_conflict_do_nothing(index_elements=["name"]), names)
+    return len(_class_ids(db)) - existing
+
+
+def import_league_teams(db: Session, rows):
+    """Adds the (sport, league, class) assignments that are not registered yet."""
+    class_ids = _class_ids(db)
+    catalog = sportcatalog.for_session(db)
+    existing = set(db.execute(select(models.LeagueTeam.sport, models.LeagueTeam.league, models.LeagueTeam.class_id)).all())
+    new_rows = []
+    for line, row in enumerate(rows, 2):
+        key = (_sport(catalog, _column(row, "sport", line), line), _league(catalog, _column(row, "league", line), line),
+               _lookup(class_ids, _column(row, "class_name", line), line))
+        if key in existing:
+            continue
+        existing.add(key)
+        new_rows.append({"sport": key[0], "league": key[1], "class_id": key[2]})
+    if new_rows:
+        db.execute(insert(models.LeagueTeam.__table__), new_rows)
+    return len(new_rows)
+
+
+def import_results(db: Session, rows):
+    """
+    Upserts league matches keyed by (sport, league, class pair): existing matches get their
+    scores updated, missing ones are created. Both happen as executemany statements and every
+    touched match is written to the event log. A row whose two classes are the same, or whose
+    winner is neither of them, is rejected like update_league_match would; a match repeated in
+    the file is written once, with its last row.
+    """
+    class_ids = _class_ids(db)
+    catalog = sportcatalog.for_session(db)
+    table = models.LeagueMatch.__table__
+    existing = {}
+    for row in db.execute(select(table.c.id, table.c.sport, table.c.league, table.c.class1_id, table.c.class2_id)):
+        existing[(row.sport, row.league, frozenset((row.class1_id, row.class2_id)))] = (row.id, row.class1_id)
+
+    updates, inserts, keys = {}, {}, set()
+    for line, row in enumerate(rows, 2):
+        sport, league = _sport(catalog, _column(row, "sport", line), line), _league(catalog, _column(row, "league", line), line)
+        class1_id = _lookup(class_ids, _column(row, "class1", line), line)
+        class2_id = _lookup(class_ids, _column(row, "class2", line), line)
+        if class1_id == class2_id:
+            raise CsvImportError(f"line {line}: class1 and class2 are the same class")
+        winner = (row.get("winner") or "").strip()
+        values = {
+            "class1_score": _int_or_none(row, "class1_score", line),
+            "class2_score": _int_or_none(row, "class2_score", line),
+            "class1_sets_won": _int_or_none(row, "class1_sets_won", line),
+            "class2_sets_won": _int_or_none(row, "class2_sets_won", line),
+            "winner_id": _lookup(class_ids, winner, line) if winner else None,
+            "is_finished": _bool(row.get("is_finished")),
+        }
+        if values["winner_id"] not in (None, class1_id, class2_id):
+            raise CsvImportError(f"line {line}: winner '{winner}' is neither class1 nor class2")
+        key = (sport, league, frozenset((class1_id, class2_id)))
+        keys.add(key)
+        if key in inserts:
+            # 同じファイル内で同じ対戦が繰り返された場合は後の行を優先する
+            inserts[key] = {"sport": sport, "league": league, "class1_id": class1_id, "class2_id": class2_id, **values}
+        elif key in existing:
+            match_id, stored_class1_id = existing[key]
+            if stored_class1_id != class1_id:
+                # 既存の試合と class1/class2 が逆の場合はスコアも入れ替える
+                values["class1_score"], values["class2_score"] = values["class2_score"], values["class1_score"]
+                values["class1_sets_won"], values["class2_sets_won"] = values["class2_sets_won"], values["class1_sets_won"]
+            # 同じ対戦が繰り返された場合は後の行で上書きし、1回だけ更新する
+            updates[key] = {"match_id": match_id, **values}
+        else:
+            inserts[key] = {"sport": sport, "league": league, "class1_id": class1_id, "class2_id": class2_id, **values}
+
+    if updates:
+        db.execute(
+            update(table).where(table.c.id == bindparam("match_id")).values(
+                {**{field: bindparam(field) for field in RESULT_FIELDS}, "version": table.c.version + 1}
+            ),
+            list(updates.values()),
+        )
+    if inserts:
+        db.execute(insert(table), list(inserts.values()))
+
+    touched = [
+        row for row in db.execute(select(table).where(tuple_(table.c.sport, table.c.league).in_(list({(k[0], k[1]) for k in keys}))))
+        if (row.sport, row.league, frozenset((row.class1_id, row.class2_id))) in keys
+    ]
+    events.record_upserts(db, events.LEAGUE_MATCH, touched)
+    return {"updated": len(updates), "created": len(inserts)}
+
+
+def import_files(db: Session, classes=None, teams=None, results=None):
+    """Imports any combination of the three CSV files in a single transaction."""
+    summary = {}
+    try:
+        if classes is not None:
+            summary["classes_created"] = import_classes(db, csv.DictReader(classes))
+        if teams is not None:
+            summary["league_teams_created"] = import_league_teams(db, csv.DictReader(teams))
+        if results is not None:
+            summary["league_matches"] = import_results(db, csv.DictReader(results))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return summary
+
+
+def _stream(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def export_classes(db: Session):
+    rows = db.execute(select(models.SchoolClass.name).order_by(models.SchoolClass.id))
+    return _stream(CLASS_COLUMNS, ((name,) for name, in rows))
+
+
+def export_league_teams(db: Session):
+    query = select(models.LeagueTeam.sport, models.LeagueTeam.league, models.SchoolClass.name).join(
+        models.SchoolClass, models.LeagueTeam.class_id == models.SchoolClass.id
+    ).order_by(models.LeagueTeam.id)
+    return _stream(TEAM_COLUMNS, ((sport, league, name) for sport, league, name in db.execute(query)))
+
+
+def export_results(db: Session):
+    names = dict(db.execute(select(models.SchoolClass.id, models.SchoolClass.name)).all())
+    table = models.LeagueMatch.__table__
+    rows = db.execute(select(table).order_by(table.c.id)).yield_per(1000)
+    return _stream(RESULT_COLUMNS, (
+        (m.sport, m.league, names.get(m.class1_id, ""), names.get(m.class2_id, ""),
+         m.class1_score, m.class2_score, m.class1_sets_won, m.class2_sets_won,
+         names.get(m.winner_id, ""), int(bool(m.is_finished)))
+        for m in rows
+    ))
+
+
+EXPORTERS = {"classes": export_classes, "teams": export_league_teams, "results": export_results}
+
+
+def _stream_ndjson(records):
+    buffer = io.StringIO()
+    for record in records:
+        buffer.write(json.dumps(record, ensure_ascii=False))
+        buffer.write("\n")
+        if buffer.tell() > CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def _cell(value):
+    return int(value) if isinstance(value, bool) else value
+
+
+def _match_records(db: Session, model, columns, sport=None, league=None):
+    """
+    Rows of one match table with the class names joined in SQL, fetched EXPORT_BATCH_SIZE at a
+    time from the open cursor, so only one batch is ever held in memory.
+    """
+    table = model.__table__
+    class1, class2, winner = (aliased(models.SchoolClass) for _ in range(3))
+    names = {"class1": class1.name, "class2": class2.name, "winner": winner.name}
+    query = select(*(names[column].label(column) if column in names else table.c[column] for column in columns)).select_from(table) \
+        .outerjoin(class1, table.c.class1_id == class1.id) \
+        .outerjoin(class2, table.c.class2_id == class2.id) \
+        .outerjoin(winner, table.c.winner_id == winner.id) \
+        .order_by(table.c.id)
+    if sport is not None:
+        query = query.where(table.c.sport == sport)
+    if league is not None and "league" in table.c:
+        query = query.where(table.c.league == league)
+    result = db.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    return (row._asdict() for row in result)
+
+
+def export_league_match_records(db: Session, sport=None, league=None, snapshot=None):
+    return LEAGUE_MATCH_EXPORT_COLUMNS, _match_records(db, models.LeagueMatch, LEAGUE_MATCH_EXPORT_COLUMNS, sport, league)
+
+
+def export_tournament_match_records(db: Session, sport=None, league=None, snapshot=None):
+    return TOURNAMENT_MATCH_EXPORT_COLUMNS, _match_records(db, models.TournamentMatch, TOURNAMENT_MATCH_EXPORT_COLUMNS, sport)
+
+
+def export_standing_records(db: Session, sport=None, league=None, snapshot=None):
+    """Standings of every league in catalog order, from the read model snapshot when one is given."""
+    standings = snapshot.standings if snapshot is not None else services.calculate_all_league_standings(db, sport=sport, league=league)
+    catalog = sportcatalog.for_session(db)
+    keys = sorted((key for key in standings if (sport is None or key[0] == sport) and (league is None or key[1] == league)),
+                  key=lambda key: catalog.order(*key))
+    records = (
+        {"sport": key[0], "league": key[1], **{column: entry[column] for column in STANDING_EXPORT_COLUMNS[2:]}}
+        for key in keys for entry in standings[key]
+    )
+    return STANDING_EXPORT_COLUMNS, records
+
+
+def export_ranking_records(db: Session, sport=None, league=None, snapshot=None):
+    """
+    The total ranking. NDJSON keeps the per-sport details as objects; the CSV spreads them over
+    one league and one tournament column per sport of the catalog.
+    """
+    if snapshot is not None:
+        rankings = snapshot.total_rankings
+    else:
+        rankings = services.get_total_rankings(db, skip=0, limit=db.query(models.SchoolClass).count())
+    sports = list(sportcatalog.for_session(db).sports)
+    columns = RANKING_EXPORT_COLUMNS + [f"{name}_{kind}_points" for name in sports for kind in ("league", "tournament")]
+    return columns, (dict(entry) for entry in rankings)
+
+
+def _ranking_row(columns, record):
+    row = [record[column] for column in RANKING_EXPORT_COLUMNS]
+    for column in columns[len(RANKING_EXPORT_COLUMNS):]:
+        name, kind, _ = column.rsplit("_", 2)
+        row.append(record[f"{kind}_points_details"].get(name, 0))
+    return row
+
+
+STREAM_EXPORTERS = {
+    "league_matches": export_league_match_records,
+    "tournament_matches": export_tournament_match_records,
+    "standings": export_standing_records,
+    "rankings": export_ranking_records,
+}
+
+
+def stream_export(db: Session, kind, fmt="csv", sport=None, league=None, snapshot=None):
+    """
+    Opens the export (running its query now, so errors surface before the response starts) and
+    returns a generator of CSV or NDJSON text chunks. `sport` / `league` filter the matches and
+    standings; `snapshot` is a read model snapshot to take the standings and rankings from.
+    """
+    columns, records = STREAM_EXPORTERS[kind](db, sport=sport, league=league, snapshot=snapshot)
+    if fmt == "ndjson":
+        return _stream_ndjson(records)
+    if kind == "rankings":
+        return _stream(columns, (_ranking_row(columns, record) for record in records))
+    return _stream(columns, ([_cell(record[column]) for column in columns] for record in records))
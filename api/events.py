@@ -0,0 +1,233 @@
+import enum
+import json
+import uuid
+from sqlalchemy import event, insert, select, create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+import models, services, sportcatalog
+
+LEAGUE_MATCH = "league_match"
+TOURNAMENT_MATCH = "tournament_match"
+
+# イベントに記録する列 (id 以外の全列)
+ENTITY_MODELS = {
+    LEAGUE_MATCH: models.LeagueMatch,
+    TOURNAMENT_MATCH: models.TournamentMatch,
+}
+ENTITY_FIELDS = {
+    LEAGUE_MATCH: ["sport", "league", "class1_id", "class2_id", "class1_score", "class2_score",
+                   "class1_sets_won", "class2_sets_won", "winner_id", "is_finished"],
+    TOURNAMENT_MATCH: ["sport", "match_name", "class1_id", "class2_id", "class1_score", "class2_score",
+                       "class1_sets_won", "class2_sets_won", "winner_id", "is_finished"],
+}
+# カタログができる前のイベントは sport に enum の名前 ("SOCCER" など) を記録している
+LEGACY_SPORT_KEYS = {sport.name: sport.value for sport in models.SportName}
+
+
+def _entity_of(obj):
+    if isinstance(obj, models.LeagueMatch):
+        return LEAGUE_MATCH
+    if isinstance(obj, models.TournamentMatch):
+        return TOURNAMENT_MATCH
+    return None
+
+
+def _snapshot(entity, obj):
+    payload = {}
+    for field in ENTITY_FIELDS[entity]:
+        value = getattr(obj, field)
+        if isinstance(value, enum.Enum):
+            value = value.value
+        payload[field] = value
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def _batch_id(session):
+    return session.info.setdefault("score_event_batch", uuid.uuid4().hex)
+
+
+def _write(session, rows):
+    if rows:
+        session.connection().execute(insert(models.ScoreEvent.__table__), rows)
+
+
+@event.listens_for(models.SessionLocal, "after_flush")
+def _record_flush(session, flush_context):
+    """Appends an event for every league or tournament match the ORM inserted, changed or deleted."""
+    rows = []
+    batch_id = None
+    for obj in list(session.new) + list(session.dirty):
+        entity = _entity_of(obj)
+        if entity is None or (obj not in session.new and not session.is_modified(obj)):
+            continue
+        batch_id = batch_id or _batch_id(session)
+        rows.append({"batch_id": batch_id, "entity": entity, "entity_id": obj.id, "kind": "upsert", "payload": _snapshot(entity, obj)})
+    for obj in session.deleted:
+        entity = _entity_of(obj)
+        if entity is None:
+            continue
+        batch_id = batch_id or _batch_id(session)
+        rows.append({"batch_id": batch_id, "entity": entity, "entity_id": obj.id, "kind": "delete", "payload": None})
+    _write(session, rows)
+
+
+@event.listens_for(models.SessionLocal, "after_commit")
+@event.listens_for(models.SessionLocal, "after_rollback")
+def _end_batch(session):
+    # SAVEPOINT の確定・取り消しでは同じトランザクションが続く
+    if session.in_nested_transaction():
+        return
+    session.info.pop("score_event_batch", None)
+
+
+def record_deletes(db: Session, entity, ids):
+    """Records delete events for rows removed with bulk query deletes, which bypass the flush hook."""
+    batch_id = _batch_id(db)
+    _write(db, [{"batch_id": batch_id, "entity": entity, "entity_id": entity_id, "kind": "delete", "payload": None} for entity_id in ids])
+
+
+def record_upserts(db: Session, entity, rows):
+    """Records upsert events for rows written with Core executemany statements, which also bypass the flush hook."""
+    batch_id = _batch_id(db)
+    _write(db, [{"batch_id": batch_id, "entity": entity, "entity_id": row.id, "kind": "upsert", "payload": _snapshot(entity, row)} for row in rows])
+
+
+def record_baseline(db: Session):
+    """
+    Snapshots the existing match rows as the first events when the log is still empty,
+    so that a database created before the log existed can be replayed.
+    """
+    if db.query(models.ScoreEvent.id).first() is not None:
+        return 0
+    batch_id = _batch_id(db)
+    rows = []
+    for entity, model in ENTITY_MODELS.items():
+        for obj in db.query(model).order_by(model.id):
+            rows.append({"batch_id": batch_id, "entity": entity, "entity_id": obj.id, "kind": "upsert", "payload": _snapshot(entity, obj)})
+    _write(db, rows)
+    db.commit()
+    return len(rows)
+
+
+def fold_events(db: Session, upto: int = None):
+    """
+    Folds the log (up to and including event `upto`) into the final row state of every match.
+    Returns {entity: {entity_id: row_dict}}.
+    """
+    table = models.ScoreEvent.__table__
+    query = select(table.c.entity, table.c.entity_id, table.c.kind, table.c.payload).order_by(table.c.id)
+    if upto is not None:
+        query = query.where(table.c.id <= upto)
+
+    state = {entity: {} for entity in ENTITY_MODELS}
+    for entity, entity_id, kind, payload in db.execute(query).yield_per(5000):
+        if kind == "delete":
+            state[entity].pop(entity_id, None)
+        else:
+            state[entity][entity_id] = payload
+    return {
+        entity: {entity_id: _decode(entity_id, payload) for entity_id, payload in rows.items()}
+        for entity, rows in state.items()
+    }
+
+
+def _decode(entity_id, payload):
+    row = json.loads(payload)
+    if row.get("sport") in LEGACY_SPORT_KEYS:
+        row["sport"] = LEGACY_SPORT_KEYS[row["sport"]]
+    row["id"] = entity_id
+    return row
+
+
+def _load_tables(db: Session, state):
+    """Replaces both match tables with `state` using executemany inserts (no commit)."""
+    for entity, model in ENTITY_MODELS.items():
+        # 版数は引き継いで1つ進める (古い版数を持つクライアントの更新が通らないように)
+        versions = dict(db.execute(select(model.id, model.version)).all())
+        db.execute(model.__table__.delete())
+        rows = [{**row, "version": versions.get(entity_id, 0) + 1} for entity_id, row in state[entity].items()]
+        if rows:
+            db.execute(insert(model.__table__), rows)
+
+
+def rebuild(db: Session, upto: int = None):
+    """Rebuilds the league and tournament match tables from the log in a single transaction."""
+    state = fold_events(db, upto)
+    try:
+        _load_tables(db, state)
+        db.query(models.ScheduleEntry).filter(
+            models.ScheduleEntry.league_match_id.notin_(list(state[LEAGUE_MATCH].keys()))
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {entity: len(rows) for entity, rows in state.items()}
+
+
+def rollback_to(db: Session, event_id: int):
+    """
+    Restores the match tables to their state right after `event_id`. The log stays append-only:
+    compensating events are written for every row that differs from the current state.
+    """
+    target = fold_events(db, event_id)
+    current = fold_events(db)
+    batch_id = _batch_id(db)
+    rows = []
+    for entity, model in ENTITY_MODELS.items():
+        for entity_id in current[entity].keys() - target[entity].keys():
+            rows.append({"batch_id": batch_id, "entity": entity, "entity_id": entity_id, "kind": "delete", "payload": None})
+        for entity_id, row in target[entity].items():
+            if current[entity].get(entity_id) != row:
+                obj = model(**row)
+                rows.append({"batch_id": batch_id, "entity": entity, "entity_id": entity_id, "kind": "upsert", "payload": _snapshot(entity, obj)})
+    _write(db, rows)
+    result = rebuild(db)
+    result["compensating_events"] = len(rows)
+    return result
+
+
+def audit(db: Session, upto: int = None):
+    """
+    Replays the log into a throwaway in-memory database and returns the league standings and
+    total rankings as they were right after event `upto`, without touching the real tables.
+    """
+    state = fold_events(db, upto)
+    memory_engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=memory_engine)
+    replay_db = sessionmaker(bind=memory_engine)()
+    try:
+        num_classes = 0
+        for model in (models.SchoolClass, models.LeagueTeam, models.Sport, models.League):
+            rows = [
+                {column.name: getattr(obj, column.name) for column in model.__table__.columns}
+                for obj in db.query(model)
+            ]
+            if rows:
+                replay_db.execute(insert(model.__table__), rows)
+            if model is models.SchoolClass:
+                num_classes = len(rows)
+        _load_tables(replay_db, state)
+        replay_db.commit()
+
+        league_standings = []
+        leagues = {(row["sport"], row["league"]) for row in state[LEAGUE_MATCH].values()}
+        catalog = sportcatalog.for_session(replay_db)
+        for sport, league in sorted(leagues, key=lambda key: catalog.order(*key)):
+            league_standings.append({
+                "sport": sport,
+                "league": league,
+                "standings": services.calculate_league_standings(sport, league, replay_db),
+            })
+        return {
+            "upto": upto,
+            "league_standings": league_standings,
+            "total_rankings": services.get_total_rankings(replay_db, skip=0, limit=num_classes),
+        }
+    finally:
+        replay_db.close()
+        memory_engine.dispose()
+
+
+def list_events(db: Session, after_id: int = 0, limit: int = 100):
+    return db.query(models.ScoreEvent).filter(models.ScoreEvent.id > after_id).order_by(models.ScoreEvent.id).limit(limit).all()
@@ -0,0 +1,153 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, select
+from sqlalchemy.orm import sessionmaker, declarative_base
+import models, replica
+
+# 大会 (学校・学期ごとの球技大会) の一覧を保持するカタログDB。試合データは大会ごとの別ファイルに置く。
+CATALOG_URL = os.environ.get("FESTIVAL_CATALOG_URL", "sqlite:///../festivals.db")
+FESTIVAL_DIR = os.environ.get("FESTIVAL_DIR", "../festivals")
+POOL_SIZE = int(os.environ.get("FESTIVAL_POOL_SIZE", "8"))
+
+# 大会を指定しないリクエストは従来どおり DATABASE_URL のDBを使う
+DEFAULT_SLUG = "default"
+SLUG_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+CatalogBase = declarative_base()
+
+
+class Festival(CatalogBase):
+    __tablename__ = "festivals"
+    id = Column(Integer, primary_key=True, index=True)
+    slug = Column(String, unique=True, index=True, nullable=False) # URL・ヘッダーで使う識別子 (例: "2025-spring")
+    name = Column(String, nullable=False)
+    db_path = Column(String, nullable=False) # 試合データを保存するSQLiteファイル
+    archived = Column(Boolean, default=False, nullable=False) # 終了した大会は読み取り専用で開く
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+catalog_engine = create_engine(CATALOG_URL)
+CatalogSession = sessionmaker(autocommit=False, autoflush=False, bind=catalog_engine)
+
+
+class EnginePool:
+    """
+    Lazily opened engines, one per festival database, keyed by slug. At most `max_size` engines
+    stay open; the least recently used one is disposed when another festival is opened.
+    """
+
+    def __init__(self, max_size=POOL_SIZE):
+        self.max_size = max_size
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, festival):
+        with self._lock:
+            entry = self._engines.get(festival.slug)
+            if entry is not None and entry[1] == festival.archived:
+                self._engines.move_to_end(festival.slug)
+                return entry[0]
+        engine = _open_engine(festival)
+        with self._lock:
+            stale = self._engines.pop(festival.slug, None)
+            self._engines[festival.slug] = (engine, festival.archived)
+            evicted = [stale[0]] if stale else []
+            while len(self._engines) > self.max_size:
+                evicted.append(self._engines.popitem(last=False)[1][0])
+        for old in evicted:
+            old.dispose()
+        return engine
+
+    def discard(self, slug):
+        with self._lock:
+            entry = self._engines.pop(slug, None)
+        if entry is not None:
+            entry[0].dispose()
+
+    def slugs(self):
+        with self._lock:
+            return list(self._engines)
+
+
+pool = EnginePool()
+
+
+def _open_engine(festival):
+    path = os.path.abspath(festival.db_path)
+    if festival.archived:
+        # 終了した大会は SQLite の読み取り専用モードで開く (書き込みはドライバが拒否する)
+        return create_engine(f"sqlite:///file:{path}?mode=ro&uri=true")
+    engine = create_engine(f"sqlite:///{path}")
+    models.ensure_schema(engine)
+    replica.attach(engine)
+    return engine
+
+
+def ensure_catalog():
+    CatalogBase.metadata.create_all(bind=catalog_engine)
+
+
+def list_festivals():
+    with CatalogSession() as catalog:
+        return catalog.scalars(select(Festival).order_by(Festival.id)).all()
+
+
+def get_festival(slug: str):
+    with CatalogSession() as catalog:
+        festival = catalog.scalars(select(Festival).filter_by(slug=slug)).first()
+    if festival is None:
+        raise HTTPException(status_code=404, detail=f"Festival '{slug}' not found")
+    return festival
+
+
+def create_festival(slug: str, name: str):
+    """Registers a festival and creates its database file with the current schema."""
+    if slug == DEFAULT_SLUG or not SLUG_PATTERN.match(slug):
+        raise HTTPException(status_code=400, detail="Slug must be lowercase letters, digits, '-' or '_' and not 'default'")
+    with CatalogSession() as catalog:
+        if catalog.scalars(select(Festival).filter_by(slug=slug)).first():
+            raise HTTPException(status_code=409, detail=f"Festival '{slug}' already exists")
+        os.makedirs(FESTIVAL_DIR, exist_ok=True)
+        festival = Festival(slug=slug, name=name, db_path=os.path.join(FESTIVAL_DIR, f"{slug}.db"))
+        catalog.add(festival)
+        catalog.commit()
+        catalog.refresh(festival)
+    pool.get(festival)
+    return festival
+
+
+def set_archived(slug: str, archived: bool):
+    """Archives (read-only) or reopens a festival; its pooled engine is reopened in the new mode."""
+    with CatalogSession() as catalog:
+        festival = catalog.scalars(select(Festival).filter_by(slug=slug)).first()
+        if festival is None:
+            raise HTTPException(status_code=404, detail=f"Festival '{slug}' not found")
+        festival.archived = archived
+        catalog.commit()
+        catalog.refresh(festival)
+    pool.discard(slug)
+    return festival
+
+
+def open_session(slug: str = None, write: bool = False, use_replica: bool = False):
+    """
+    Returns a session on the festival's own database (the DATABASE_URL one for the default
+    festival). Sessions come from models.SessionLocal so the score event hooks still apply.
+    With `use_replica`, reads go to the database's read replica when one is fresh enough.
+    """
+    if not slug or slug == DEFAULT_SLUG:
+        engine = models.engine
+    else:
+        festival = get_festival(slug)
+        if write and festival.archived:
+            raise HTTPException(status_code=409, detail=f"Festival '{slug}' is archived and read-only")
+        engine = pool.get(festival)
+    db = replica.read_session(engine) if use_replica else None
+    if db is None:
+        db = models.SessionLocal(bind=engine)
+    db.info["primary"] = engine
+    return db
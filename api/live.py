@@ -0,0 +1,324 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from fastapi import HTTPException, Request
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+import models, schemas, services, events, memstore, writer
+
+# 試合中のスコアはメモリ上で受け付け、この間隔 (秒) でまとめてDBに書き込む
+FLUSH_INTERVAL = float(os.environ.get("TOKUTEN_LIVE_FLUSH_INTERVAL", "1.0"))
+# 速報の配信間隔 (秒)。この間のスコア入力は1回の配信にまとめる
+BROADCAST_INTERVAL = float(os.environ.get("TOKUTEN_LIVE_BROADCAST_INTERVAL", "0.2"))
+# 配信済みの差分を保持する数。これより遅れた購読者には全試合の現在のスコアを送り直す
+FRAME_HISTORY = 64
+# 配信するものが無いときも接続を保つために送るコメントの間隔 (秒)
+KEEPALIVE_INTERVAL = 15.0
+
+LEAGUE_MATCH, TOURNAMENT_MATCH = events.LEAGUE_MATCH, events.TOURNAMENT_MATCH
+SCORE_FIELDS = ("class1_score", "class2_score", "class1_sets_won", "class2_sets_won")
+TICK_FIELDS = {"class1_points": "class1_score", "class2_points": "class2_score",
+               "class1_sets": "class1_sets_won", "class2_sets": "class2_sets_won"}
+
+logger = logging.getLogger(__name__)
+
+
+def _message(seq, payload):
+    return f"id: {seq}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode()
+
+
+class Board:
+    """
+    Live scores of one database's unfinished matches. Ticks only touch memory; `broadcast`
+    turns everything changed since the last frame into one encoded server-sent event that all
+    subscribers share, and `flush` writes the changed scores in one transaction. A board lives in
+    one worker process: ticks and subscribers on other workers do not see it (only the flushed
+    scores in the database), so live scoring must be routed to a single worker.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.ticks = 0
+        self.flushes = 0
+        self.seq = 0
+        self._scores = {}  # (entity, match_id) -> 配信する形の辞書
+        self._final = {}  # 終了した試合の結果 (次の配信で送る)
+        self._dirty = set()  # DBに未反映
+        self._changed = set()  # 未配信
+        self._frames = deque(maxlen=FRAME_HISTORY)
+        self._lock = threading.Lock()
+        # 書き込みと試合終了の処理が重ならないようにする
+        self._flush_lock = threading.Lock()
+
+    def tick(self, entity, row, tick: schemas.LiveScoreTick):
+        key = (entity, row.id)
+        with self._lock:
+            entry = self._scores.get(key)
+            if entry is None:
+                entry = {"entity": entity, "id": row.id, "sport": row.sport,
+                         **{field: getattr(row, field) or 0 for field in SCORE_FIELDS},
+                         "winner_id": None, "is_finished": False}
+            updated = {field: entry[field] + getattr(tick, name) for name, field in TICK_FIELDS.items()}
+            if any(value < 0 for value in updated.values()):
+                raise HTTPException(status_code=400, detail="Scores cannot become negative")
+            entry.update(updated)
+            self._scores[key] = entry
+            self._dirty.add(key)
+            self._changed.add(key)
+            self.ticks += 1
+            return dict(entry)
+
+    def entries(self):
+        with self._lock:
+            return [dict(entry) for _, entry in sorted(self._scores.items())]
+
+    def broadcast(self):
+        with self._lock:
+            if not self._changed:
+                return
+            matches = [dict(self._scores[key]) if key in self._scores else self._final.pop(key, None)
+                       for key in sorted(self._changed)]
+            self._changed.clear()
+            # flush で外された試合には送るものが無い
+            matches = [match for match in matches if match is not None]
+            if not matches:
+                return
+            self.seq += 1
+            self._frames.append((self.seq, _message(self.seq, {"seq": self.seq, "matches": matches})))
+
+    def snapshot(self):
+        """The current scores of every live match as one event, for new or lagging subscribers."""
+        with self._lock:
+            matches = [dict(entry) for _, entry in sorted(self._scores.items())]
+            return self.seq, _message(self.seq, {"seq": self.seq, "snapshot": True, "matches": matches})
+
+    def frames_since(self, seq):
+        """Encoded frames after `seq`, or None when some of them have already been dropped."""
+        with self._lock:
+            if seq == self.seq:
+                return []
+            if not self._frames or self._frames[0][0] > seq + 1:
+                return None
+            return [frame for frame in self._frames if frame[0] > seq]
+
+    def flush(self):
+        """
+        Writes the scores changed since the last flush; matches finished or deleted meanwhile are
+        dropped. The scores are written with a plain UPDATE that leaves `version` alone, so a
+        result entered with the version read before the match went live is not rejected. Like
+        every other write, it goes through writer.run.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending = {key: dict(self._scores[key]) for key in self._dirty}
+                self._dirty.clear()
+            if not pending:
+                return 0
+            db = models.SessionLocal(bind=self.engine)
+            try:
+                written = writer.run(db, lambda session: _write_scores(session, pending))
+            except Exception:
+                with self._lock:
+                    self._dirty.update(key for key in pending if key in self._scores)
+                raise
+            finally:
+                db.close()
+            with self._lock:
+                for key in pending.keys() - written:
+                    self._scores.pop(key, None)
+                    if key not in self._final:
+                        self._changed.discard(key)
+            self.flushes += 1
+            return len(written)
+
+    @contextmanager
+    def finishing(self, key):
+        """
+        Takes the match off the board (yielding its live entry, or None) while the final result is
+        written, so no later flush can overwrite it. The entry is put back if the write fails.
+        """
+        with self._flush_lock:
+            with self._lock:
+                entry = self._scores.pop(key, None)
+                self._dirty.discard(key)
+                self._changed.discard(key)
+            try:
+                yield entry
+            except BaseException:
+                if entry is not None:
+                    with self._lock:
+                        self._scores.setdefault(key, entry)
+                        self._dirty.add(key)
+                raise
+
+    def announce(self, entity, match):
+        """Queues the final result of a finished match for the next broadcast."""
+        with self._lock:
+            self._final[(entity, match.id)] = {
+                "entity": entity, "id": match.id, "sport": match.sport,
+                **{field: getattr(match, field) for field in SCORE_FIELDS},
+                "winner_id": match.winner_id, "is_finished": bool(match.is_finished),
+            }
+            self._changed.add((entity, match.id))
+
+
+def _write_scores(db: Session, pending):
+    """Writes the live scores of `pending` to the matches still unfinished; returns the keys written."""
+    written = set()
+    try:
+        for (entity, match_id), entry in pending.items():
+            table = events.ENTITY_MODELS[entity].__table__
+            result = db.execute(update(table).where(table.c.id == match_id, table.c.is_finished == False)
+                                .values({field: entry[field] for field in SCORE_FIELDS}))
+            if result.rowcount:
+                written.add((entity, match_id))
+        # 種目が分かっているので、順位表の再計算をその種目だけにする
+        db.info.setdefault("readmodel_sports", set()).update(pending[key]["sport"] for key in written)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return written
+
+
+class LiveScores:
+    """The boards of every database, with one background thread that broadcasts and flushes them."""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, broadcast_interval=BROADCAST_INTERVAL):
+        self.flush_interval = flush_interval
+        self.broadcast_interval = broadcast_interval
+        self._boards = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def board(self, engine):
+        key = str(engine.url)
+        with self._lock:
+            board = self._boards.get(key)
+            if board is None:
+                board = self._boards[key] = Board(engine)
+            return board
+
+    def start(self):
+        self._stopping.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="live-scores", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._tick(flush=True)
+
+    def stats(self):
+        with self._lock:
+            boards = list(self._boards.items())
+        return {key: {"live": len(board.entries()), "ticks": board.ticks, "flushes": board.flushes, "seq": board.seq}
+                for key, board in boards}
+
+    def _tick(self, flush):
+        with self._lock:
+            boards = list(self._boards.values())
+        for board in boards:
+            try:
+                board.broadcast()
+            except Exception:
+                logger.exception("live score broadcast failed for %s", board.engine.url)
+            if flush:
+                try:
+                    board.flush()
+                except Exception:
+                    logger.exception("live score flush failed for %s", board.engine.url)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stopping.wait(self.broadcast_interval):
+            flush = time.monotonic() - last_flush >= self.flush_interval
+            self._tick(flush)
+            if flush:
+                last_flush = time.monotonic()
+
+
+scores = LiveScores()
+
+
+def board_for(db: Session):
+    """The board of the database a request's session stands for (its primary, for replica sessions)."""
+    return scores.board(db.info.get("primary") or db.get_bind())
+
+
+def _live_row(db: Session, entity, match_id, sport=None):
+    store = memstore.store_for(db)
+    row = (store.league_matches if entity == LEAGUE_MATCH else store.tournament_matches).get(match_id)
+    if row is None or (sport is not None and row.sport != sport):
+        raise HTTPException(status_code=404, detail="Match not found")
+    if row.is_finished:
+        raise HTTPException(status_code=409, detail="Match is already finished")
+    if row.class1_id is None or row.class2_id is None:
+        raise HTTPException(status_code=409, detail="Both classes must be decided before the match starts")
+    return row
+
+
+def tick(db: Session, entity, match_id: int, data: schemas.LiveScoreTick, sport: str = None):
+    """Applies one score tick in memory; the database is updated by the next flush."""
+    return board_for(db).tick(entity, _live_row(db, entity, match_id, sport), data)
+
+
+def record_result(db: Session, entity, match_id: int, update):
+    """Runs `update` (which writes the final result) with the match taken off the live board, then broadcasts it."""
+    board = board_for(db)
+    with board.finishing((entity, match_id)):
+        match = update()
+    board.announce(entity, match)
+    return match
+
+
+def finish(db: Session, entity, match_id: int, data: schemas.LiveScoreFinish, sport: str = None):
+    """
+    Ends a live match with its current scores through the regular result logic (standings, or
+    tournament advancement), exactly once: a second call finds the match off the board.
+    """
+    board = board_for(db)
+    with board.finishing((entity, match_id)) as entry:
+        if entry is None:
+            raise HTTPException(status_code=409, detail="Match is not live")
+        result = {field: entry[field] for field in SCORE_FIELDS}
+        winner_id = data.winner_id
+        if winner_id is None and entry["class1_score"] != entry["class2_score"]:
+            row = _live_row(db, entity, match_id, sport)
+            winner_id = row.class1_id if entry["class1_score"] > entry["class2_score"] else row.class2_id
+        if entity == LEAGUE_MATCH:
+            update = schemas.LeagueMatchUpdate(**result, winner_id=winner_id)
+            match = writer.run(db, lambda session: services.update_league_match(match_id, update, session))
+        else:
+            if winner_id is None:
+                raise HTTPException(status_code=400, detail="winner_id is required for a tied tournament match")
+            update = schemas.TournamentMatchUpdate(**result, winner_id=winner_id)
+            match = writer.run(db, lambda session: services.update_tournament_match(sport, match_id, update, session))
+    board.announce(entity, match)
+    return match
+
+
+async def stream(board: Board, request: Request):
+    """Server-sent events: the current scores first, then the shared frames as they are broadcast."""
+    seq, message = board.snapshot()
+    yield message
+    last_sent = time.monotonic()
+    while not await request.is_disconnected():
+        await asyncio.sleep(scores.broadcast_interval)
+        frames = board.frames_since(seq)
+        if frames is None:
+            frames = [board.snapshot()]
+        for seq, message in frames:
+            yield message
+            last_sent = time.monotonic()
+        if time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+            yield b": keep-alive\n\n"
+            last_sent = time.monotonic()
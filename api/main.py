@@ -1,18 +1,52 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import os
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Request, Response, Header
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Annotated, List, Literal, Optional
 from fastapi.security import APIKeyHeader
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
-import models, schemas, services
+import models, schemas, services, csv_io, clinch, projection, scheduler, events, festivals, replica, singleflight, readmodel, pagination, memstore, live, writer, profiling, admission, sportcatalog
 from models import SessionLocal, engine
 
-# データベーステーブルを作成
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    festivals.ensure_catalog()
+    # テーブル作成はスキーマのバージョンが古いときだけ行う (毎回の create_all を避ける)
+    if models.ensure_schema():
+        # 変更履歴の導入前に作られたDBは、現在の試合データを最初のイベントとして記録する
+        db = SessionLocal()
+        try:
+            events.record_baseline(db)
+        finally:
+            db.close()
+    # TOKUTEN_READ_REPLICA=1 のときは読み取り用の複製を作成する
+    replica.attach(engine)
+    # TOKUTEN_WARMUP=1 のときはバックグラウンドで集計処理を一度走らせておく
+    if os.environ.get("TOKUTEN_WARMUP") == "1":
+        threading.Thread(target=services.warm_up, daemon=True).start()
+    # 順位表・総合ランキングは書き込みのたびにバックグラウンドで再計算する
+    readmodel.worker.start()
+    readmodel.worker.mark_dirty(engine)
+    # 公開GETで使うメモリ上のテーブルを読み込んでおく
+    memstore.model.get(engine)
+    # 試合中のスコアの配信とDBへのまとめ書き
+    live.scores.start()
+    yield
+    # 速報の最後の書き込みも書き込みスレッドを通るので、先に止める
+    live.scores.stop()
+    # まとめてコミットする書き込みが残っていれば書き込んでから止める
+    writer.stop()
+    readmodel.worker.stop()
+    projection.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 from fastapi.middleware.cors import CORSMiddleware
 
+# 負荷が高いときは公開リクエストを制限し、管理者トークン付きのリクエスト (得点入力など) のスレッドを確保する
+app.add_middleware(admission.AdmissionMiddleware, is_trusted=lambda authorization: authorization == f"Bearer {API_TOKEN}")
 
 origins = [
     "http://localhost:5173",
@@ -26,6 +60,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER, "X-Read-Source", "X-Replica-Staleness", "Retry-After", "X-Cache", "Content-Disposition"],
 )
 
 # --- Authentication ---
@@ -53,149 +88,316 @@ def login(login_data: LoginRequest):
         raise HTTPException(status_code=401, detail="Incorrect password")
 
 # --- データベースセッションの依存関係 ---
-def get_db():
-    db = SessionLocal()
+# X-Festival ヘッダーで大会を指定する (省略時は既定のDB)。終了した大会への書き込みは 409 を返す。
+# 認証なしのGETは読み取り用の複製から読み、その古さ(秒)を X-Replica-Staleness ヘッダーで返す。
+def get_db(request: Request, response: Response, x_festival: Optional[str] = Header(None), authorization: Optional[str] = Depends(api_key_header)):
+    is_read = request.method in ("GET", "HEAD")
+    db = festivals.open_session(x_festival, write=not is_read, use_replica=is_read and authorization is None)
+    if "replica_staleness" in db.info:
+        response.headers["X-Read-Source"] = "replica"
+        response.headers["X-Replica-Staleness"] = f"{db.info['replica_staleness']:.3f}"
+    else:
+        response.headers["X-Read-Source"] = "primary"
     try:
         yield db
     finally:
         db.close()
 
+# 種目・リーグは大会ごとのカタログに登録されているものだけを受け付ける (無ければ 404)
+def catalog_sport(sport: str, db: Session = Depends(get_db)):
+    return sportcatalog.for_session(db).require_sport(sport)
+
+def catalog_league(league: str, db: Session = Depends(get_db)):
+    return sportcatalog.for_session(db).require_league(league)
+
+CatalogSport = Annotated[str, Depends(catalog_sport)]
+CatalogLeague = Annotated[str, Depends(catalog_league)]
+
+# 再計算済みの集計結果。まだ無い (起動直後・初めて開いた大会) 場合はその場で計算し、再計算を依頼する
+def read_snapshot(db: Session):
+    engine = readmodel.primary_engine(db)
+    snapshot = readmodel.worker.get(engine)
+    if snapshot is None:
+        readmodel.worker.mark_dirty(engine)
+    return snapshot
+
+# メモリ上のテーブルから作った辞書をそのまま返す (ORM・Pydanticの変換を通さない)。
+# 複製・本体のDBからは読んでいないので、読み取り元は memory とする
+def json_response(content, response: Response):
+    headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "x-replica-staleness")}
+    headers["x-read-source"] = "memory"
+    return JSONResponse(content, headers=headers)
+
 # --- APIエンドポイント ---
 
 @app.post("/classes/", response_model=schemas.SchoolClass, tags=["Classes"], dependencies=[Depends(verify_token)])
 def create_class(class_data: schemas.SchoolClassCreate, db: Session = Depends(get_db)):
     """新しいクラスを登録する"""
-    db_class = models.SchoolClass(name=class_data.name)
-    db.add(db_class)
-    db.commit()
-    db.refresh(db_class)
-    return db_class
+    return writer.run(db, lambda session: services.create_class(class_data, session))
 
 @app.get("/classes/", response_model=List[schemas.SchoolClass], tags=["Classes"])
-def read_classes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """登録されているクラスの一覧を取得する"""
-    classes = db.query(models.SchoolClass).offset(skip).limit(limit).all()
-    return classes
+def read_classes(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    登録されているクラスの一覧をID順に取得する。
+    続きがある場合は X-Next-Cursor ヘッダーの値を cursor に指定すると次のページを取得できる。
+    """
+    store = memstore.store_for(db)
+    return json_response(pagination.trim_page(store.class_page(pagination.cursor_id(cursor), limit, skip=skip), limit, response), response)
+
+@app.get("/classes/{class_id}/matches", response_model=schemas.ClassMatches, tags=["Classes"])
+def get_class_matches(class_id: int, response: Response, db: Session = Depends(get_db)):
+    """指定されたクラスの全種目の予選リーグ・決勝トーナメントの試合を取得する"""
+    store = memstore.store_for(db)
+    if class_id not in store.classes:
+        raise HTTPException(status_code=404, detail="Class not found")
+    return json_response(store.class_matches(class_id), response)
+
+@app.get("/classes/{class_id}/summary", response_model=schemas.ClassSummary, tags=["Classes"])
+def get_class_summary(class_id: int, db: Session = Depends(get_db)):
+    """指定されたクラスの各リーグでの順位と総合ランキングの順位を取得する"""
+    snapshot = read_snapshot(db)
+    if snapshot is not None:
+        return services.get_class_summary(class_id, db, standings=snapshot.standings, total_rankings=snapshot.total_rankings)
+    return services.get_class_summary(class_id, db)
 
 # === リーグ所属チームの管理 ===
 @app.post("/leagues/teams/", response_model=schemas.LeagueTeam, tags=["League Teams"], dependencies=[Depends(verify_token)])
 def add_team_to_league(team_data: schemas.LeagueTeamCreate, db: Session = Depends(get_db)):
     """リーグにチームを追加する"""
-    db_league_team = models.LeagueTeam(**team_data.dict())
-    db.add(db_league_team)
-    db.commit()
-    db.refresh(db_league_team)
-    return db_league_team
+    return writer.run(db, lambda session: services.add_team_to_league(team_data, session))
 
 @app.get("/leagues/{sport}/{league}/teams/", response_model=List[schemas.SchoolClass], tags=["League Teams"])
-def get_league_teams(sport: models.SportName, league: models.LeagueName, db: Session = Depends(get_db)):
+def get_league_teams(sport: CatalogSport, league: CatalogLeague, response: Response, db: Session = Depends(get_db)):
     """指定されたリーグの全チームを取得する"""
-    league_teams = db.query(models.LeagueTeam).filter_by(sport=sport, league=league).all()
-    if not league_teams:
-        return []
-    return [lt.school_class for lt in league_teams]
+    return json_response(memstore.store_for(db).league_teams(sport, league), response)
 
 
 @app.delete("/leagues/teams/", status_code=200, tags=["League Teams"], dependencies=[Depends(verify_token)])
 def remove_team_from_league_endpoint(team_data: schemas.LeagueTeamDelete, db: Session = Depends(get_db)):
     """リーグからチームを削除する"""
-    return services.remove_team_from_league(team_data, db)
+    return writer.run(db, lambda session: services.remove_team_from_league(team_data, session))
 
 
 # === 予選リーグの試合結果管理 ===
 @app.get("/leagues/{sport}/{league}/matches/", response_model=List[schemas.LeagueMatch], tags=["League Matches"])
-def get_league_matches(sport: models.SportName, league: models.LeagueName, db: Session = Depends(get_db)):
+def get_league_matches(sport: CatalogSport, league: CatalogLeague, response: Response, db: Session = Depends(get_db)):
     """指定されたリーグの全対戦カードを取得する"""
-    matches = db.query(models.LeagueMatch).filter_by(sport=sport, league=league).all()
-    print(f"[Backend] get_league_matches for {sport}-{league}: Found {len(matches)} matches.")
-    return matches
+    return json_response(memstore.store_for(db).league_match_list(sport, league), response)
 
 
 @app.post("/league_matches/", response_model=schemas.LeagueMatch, tags=["League Matches"], dependencies=[Depends(verify_token)])
 def create_league_match(match_data: schemas.LeagueMatchCreate, db: Session = Depends(get_db)):
     """新しい予選リーグの試合を作成する"""
-    db_match = models.LeagueMatch(**match_data.dict(), is_finished=False)
-    db.add(db_match)
-    db.commit()
-    db.refresh(db_match)
-    return db_match
+    return writer.run(db, lambda session: services.create_league_match(match_data, session))
 
 
 @app.put("/leagues/matches/{match_id}/", response_model=schemas.LeagueMatch, tags=["League Matches"], dependencies=[Depends(verify_token)])
 def update_league_match(match_id: int, match_data: schemas.LeagueMatchUpdate, db: Session = Depends(get_db)):
     """予選リーグの試合結果を更新する"""
-    match = db.query(models.LeagueMatch).filter(models.LeagueMatch.id == match_id).first()
-    if not match:
-        raise HTTPException(status_code=404, detail="Match not found")
-    
-    match.class1_score = match_data.class1_score
-    match.class2_score = match_data.class2_score
-    match.class1_sets_won = match_data.class1_sets_won
-    match.class2_sets_won = match_data.class2_sets_won
-    match.winner_id = match_data.winner_id
-    match.is_finished = True # 試合を完了済みにする
-    
-    db.commit()
-    db.refresh(match)
-    return match
+    return live.record_result(db, live.LEAGUE_MATCH, match_id, lambda: writer.run(db, lambda session: services.update_league_match(match_id, match_data, session)))
+
+@app.post("/leagues/matches/{match_id}/live/", response_model=schemas.LiveScore, tags=["Live"], dependencies=[Depends(verify_token)])
+def tick_league_match(match_id: int, tick: schemas.LiveScoreTick, db: Session = Depends(get_db)):
+    """試合中の予選リーグの試合に得点・セットを加算する (DBへの書き込みは一定間隔でまとめて行う)"""
+    return live.tick(db, live.LEAGUE_MATCH, match_id, tick)
+
+@app.post("/leagues/matches/{match_id}/live/finish/", response_model=schemas.LeagueMatch, tags=["Live"], dependencies=[Depends(verify_token)])
+def finish_league_match(match_id: int, data: schemas.LiveScoreFinish, db: Session = Depends(get_db)):
+    """試合中の予選リーグの試合を現在のスコアで終了する"""
+    return live.finish(db, live.LEAGUE_MATCH, match_id, data)
 
 
 @app.delete("/leagues/{sport}/{league}/matches/", status_code=200, tags=["League Matches"], dependencies=[Depends(verify_token)])
-def delete_all_league_matches(sport: models.SportName, league: models.LeagueName, db: Session = Depends(get_db)):
+def delete_all_league_matches(sport: CatalogSport, league: CatalogLeague, db: Session = Depends(get_db)):
     """指定されたリーグの全試合を削除する"""
     result = services.delete_league_matches(sport, league, db)
     return result
 
 
 @app.post("/leagues/{sport}/{league}/generate_matches/", tags=["League Matches"], dependencies=[Depends(verify_token)])
-def generate_league_matches_endpoint(sport: models.SportName, league: models.LeagueName, db: Session = Depends(get_db)):
+def generate_league_matches_endpoint(sport: CatalogSport, league: CatalogLeague, db: Session = Depends(get_db)):
     """
     指定されたリーグの総当たり戦の組み合わせを自動生成します。
     既存の試合はスキップされます。
     """
-    return services.generate_league_matches(sport, league, db)
+    return writer.run(db, lambda session: services.generate_league_matches(sport, league, session))
+
+@app.post("/schedule/generate/", response_model=schemas.Schedule, tags=["Schedule"], dependencies=[Depends(verify_token)])
+def generate_schedule(config: schemas.ScheduleConfig, db: Session = Depends(get_db)):
+    """
+    全種目の予選リーグの試合をコートと時間帯に割り当てます。
+    同じクラスが同時刻に複数の試合に出ないようにし、試合の間に休憩を入れます。
+    """
+    return writer.run(db, lambda session: scheduler.generate_schedule(config, session))
+
+@app.get("/schedule/", response_model=schemas.Schedule, tags=["Schedule"])
+def get_schedule(sport: Optional[str] = None, class_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """保存されている時間割を取得する (種目・クラスで絞り込み可能)"""
+    return scheduler.get_schedule(db, sport=sport, class_id=class_id)
 
 @app.get("/league_matches/", response_model=List[schemas.LeagueMatch], tags=["League Matches"])
-def read_league_matches(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """登録されている予選リーグの試合結果をすべて取得する"""
-    matches = db.query(models.LeagueMatch).offset(skip).limit(limit).all()
-    return matches
+def read_league_matches(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sport: Optional[str] = None,
+    league: Optional[str] = None,
+    class_id: Optional[int] = None,
+    is_finished: Optional[bool] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    登録されている予選リーグの試合結果をID順に取得する (種目・リーグ・クラス・終了済みかで絞り込み可能)。
+    続きがある場合は X-Next-Cursor ヘッダーの値を cursor に指定すると次のページを取得できる。
+    """
+    page = memstore.store_for(db).league_match_page(
+        pagination.cursor_id(cursor), limit, skip=skip, sport=sport, league=league, class_id=class_id, is_finished=is_finished
+    )
+    return json_response(pagination.trim_page(page, limit, response), response)
 
 @app.get("/leagues/{sport}/{league}/standings/", response_model=List[schemas.LeagueStanding], tags=["League Standings"])
-def get_league_standings(sport: models.SportName, league: models.LeagueName, db: Session = Depends(get_db)):
+def get_league_standings(sport: CatalogSport, league: CatalogLeague, db: Session = Depends(get_db)):
     """指定された予選リーグの順位表を計算して取得する"""
-    standings = services.calculate_league_standings(sport, league, db)
+    snapshot = read_snapshot(db)
+    if snapshot is not None:
+        standings = snapshot.standings.get((sport, league), [])
+    else:
+        # 同時に届いた同じリーグの順位表リクエストは1回の計算結果を共有する
+        standings = singleflight.group.do(
+            ("league_standings", singleflight.database_key(db), sport, league),
+            lambda: services.calculate_league_standings(sport, league, db),
+        )
     if not standings:
         raise HTTPException(status_code=404, detail="No matches found for this league")
     return standings
 
+@app.get("/leagues/{sport}/{league}/clinch/", response_model=schemas.LeagueClinch, tags=["League Standings"])
+def get_league_clinch(sport: CatalogSport, league: CatalogLeague, db: Session = Depends(get_db)):
+    """残り試合の結果をすべて考慮して、リーグ1位・決勝トーナメント進出の確定/消滅を判定する"""
+    return clinch.get_league_clinch(sport, league, db)
+
+@app.get("/clinch/", response_model=List[schemas.LeagueClinch], tags=["League Standings"])
+def get_all_clinch(db: Session = Depends(get_db)):
+    """試合が登録されている全リーグについて、1位・進出の確定/消滅を判定する"""
+    return clinch.get_all_clinch(db)
+
 @app.post("/tournaments/{sport}/generate/", response_model=List[schemas.TournamentMatch], tags=["Tournaments"], dependencies=[Depends(verify_token)])
-def generate_tournament(sport: models.SportName, db: Session = Depends(get_db)):
+def generate_tournament(sport: CatalogSport, db: Session = Depends(get_db)):
     """指定された種目の決勝トーナメントの組み合わせを生成する"""
-    return services.generate_tournament_bracket(sport, db)
+    return writer.run(db, lambda session: services.generate_tournament_bracket(sport, session))
 
 @app.get("/tournaments/{sport}/", response_model=List[schemas.TournamentMatch], tags=["Tournaments"])
-def get_tournament_matches(sport: models.SportName, db: Session = Depends(get_db)):
+def get_tournament_matches(sport: CatalogSport, response: Response, db: Session = Depends(get_db)):
     """指定された種目の決勝トーナメントの試合一覧を取得する"""
-    matches = db.query(models.TournamentMatch).filter(models.TournamentMatch.sport == sport).all()
+    matches = memstore.store_for(db).tournament_match_list(sport)
     if not matches:
         raise HTTPException(status_code=404, detail="Tournament not found for this sport.")
-    return matches
+    return json_response(matches, response)
 
 @app.put("/tournaments/{sport}/matches/{match_id}/", response_model=schemas.TournamentMatch, tags=["Tournaments"], dependencies=[Depends(verify_token)])
 def update_tournament_match_result(
-    sport: models.SportName, 
+    sport: CatalogSport, 
     match_id: int, 
     match_update: schemas.TournamentMatchUpdate, 
     db: Session = Depends(get_db)
 ):
     """決勝トーナamentsの特定の試合結果を更新し、勝者と敗者を次の試合へ進める"""
-    return services.update_tournament_match(sport, match_id, match_update, db)
+    return live.record_result(db, live.TOURNAMENT_MATCH, match_id, lambda: writer.run(db, lambda session: services.update_tournament_match(sport, match_id, match_update, session)))
+
+@app.post("/tournaments/{sport}/matches/{match_id}/live/", response_model=schemas.LiveScore, tags=["Live"], dependencies=[Depends(verify_token)])
+def tick_tournament_match(sport: CatalogSport, match_id: int, tick: schemas.LiveScoreTick, db: Session = Depends(get_db)):
+    """試合中の決勝トーナメントの試合に得点・セットを加算する"""
+    return live.tick(db, live.TOURNAMENT_MATCH, match_id, tick, sport=sport)
+
+@app.post("/tournaments/{sport}/matches/{match_id}/live/finish/", response_model=schemas.TournamentMatch, tags=["Live"], dependencies=[Depends(verify_token)])
+def finish_tournament_match(sport: CatalogSport, match_id: int, data: schemas.LiveScoreFinish, db: Session = Depends(get_db)):
+    """試合中の決勝トーナメントの試合を現在のスコアで終了し、勝者と敗者を次の試合へ進める"""
+    return live.finish(db, live.TOURNAMENT_MATCH, match_id, data, sport=sport)
+
+@app.get("/live/", response_model=List[schemas.LiveScore], tags=["Live"])
+def get_live_scores(db: Session = Depends(get_db)):
+    """試合中の全試合の現在のスコアを取得する"""
+    return live.board_for(db).entries()
+
+@app.get("/live/stream/", tags=["Live"])
+def stream_live_scores(request: Request, db: Session = Depends(get_db)):
+    """
+    試合中のスコアを Server-Sent Events で配信する。最初に全試合の現在のスコア、
+    以降は一定間隔ごとに変化した試合 (終了した試合の結果を含む) をまとめて送る。
+    """
+    return StreamingResponse(live.stream(live.board_for(db), request), media_type="text/event-stream")
 
 @app.get("/rankings/total/", response_model=List[schemas.TotalRanking], tags=["Rankings"])
-def get_total_rankings(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """全種目の結果を集計した総合得点ランキングを取得する"""
-    return services.get_total_rankings(db, skip=skip, limit=limit)
+def get_total_rankings(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    全種目の結果を集計した総合得点ランキングを取得する。
+    続きがある場合は X-Next-Cursor ヘッダーの値を cursor に指定すると次のページを取得できる。
+    """
+    snapshot = read_snapshot(db)
+    if snapshot is not None:
+        rankings = snapshot.total_rankings
+    else:
+        rankings = singleflight.group.do(
+            ("total_rankings", singleflight.database_key(db)),
+            lambda: services.get_total_rankings(db, skip=0, limit=db.query(models.SchoolClass).count()),
+        )
+    return pagination.list_page(rankings, "rank", cursor, limit, response, skip=skip)
+
+@app.get("/export/{kind}/", tags=["Export"])
+def export_data(
+    kind: Literal["league_matches", "tournament_matches", "standings", "rankings"],
+    response: Response,
+    fmt: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    sport: Optional[str] = None,
+    league: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    予選リーグ・決勝トーナメントの全試合、全リーグの順位表、総合ランキングを CSV / NDJSON で書き出す。
+    ページ分けせずに DB から少しずつ読みながら送るため、件数が多くてもメモリ使用量は増えない。
+    種目・リーグで絞り込める (総合ランキングを除く)。
+    """
+    snapshot = read_snapshot(db) if kind in ("standings", "rankings") else None
+    chunks = csv_io.stream_export(db, kind, fmt, sport=sport, league=league, snapshot=snapshot)
+    # get_db が付けた読み取り元のヘッダーも返す
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    headers["Content-Disposition"] = f'attachment; filename="{kind}.{fmt}"'
+    return StreamingResponse(chunks, media_type=csv_io.MEDIA_TYPES[fmt], headers=headers)
+
+# 認証なしで実行できるシミュレーション回数の上限 (複数プロセスでの実行は管理者のみ)
+PUBLIC_PROJECTION_SIMULATIONS = 20000
+
+@app.get("/rankings/projection/", response_model=schemas.TotalRankingProjection, tags=["Rankings"])
+def get_ranking_projection(
+    simulations: int = Query(10000, ge=100, le=200000),
+    workers: int = Query(1, ge=1, le=16),
+    seed: Optional[int] = None,
+    authorization: Optional[str] = Depends(api_key_header),
+    db: Session = Depends(get_db)
+):
+    """
+    残りの試合をシミュレーションし、各クラスが最終的に各順位になる確率を取得する。
+    workers > 1 と PUBLIC_PROJECTION_SIMULATIONS 回を超えるシミュレーションには管理者トークンが必要。
+    """
+    if (workers > 1 or simulations > PUBLIC_PROJECTION_SIMULATIONS) and authorization != f"Bearer {API_TOKEN}":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"workers > 1 or more than {PUBLIC_PROJECTION_SIMULATIONS} simulations require the admin token",
+        )
+    return projection.project_total_rankings(db, simulations=simulations, workers=workers, seed=seed)
 
 @app.delete("/all-leagues", status_code=200, tags=["League"], dependencies=[Depends(verify_token)])
 def delete_all_leagues_endpoint(db: Session = Depends(get_db)):
@@ -213,3 +415,105 @@ def delete_all_scores_endpoint(db: Session = Depends(get_db)):
     result = services.delete_all_scores(db)
     return result
 
+
+# === 種目・リーグのカタログ ===
+@app.get("/catalog/", response_model=schemas.Catalog, tags=["Catalog"])
+def get_catalog(db: Session = Depends(get_db)):
+    """登録されている種目 (トーナメントの形式・進出数・得点表などの設定) とリーグを表示順に取得する"""
+    return services.get_catalog(db)
+
+@app.post("/catalog/sports/", response_model=schemas.Catalog, tags=["Catalog"], dependencies=[Depends(verify_token)])
+def save_sport(sport_data: schemas.SportCreate, db: Session = Depends(get_db)):
+    """種目を登録する (同じ名前の種目があれば設定を置き換える)"""
+    return services.save_sport(sport_data, db)
+
+@app.delete("/catalog/sports/{name}", response_model=schemas.Catalog, tags=["Catalog"], dependencies=[Depends(verify_token)])
+def delete_sport(name: str, db: Session = Depends(get_db)):
+    """チーム・試合が登録されていない種目を削除する"""
+    return services.delete_sport(name, db)
+
+@app.post("/catalog/leagues/", response_model=schemas.Catalog, tags=["Catalog"], dependencies=[Depends(verify_token)])
+def save_league(league_data: schemas.LeagueCreate, db: Session = Depends(get_db)):
+    """リーグを登録する (同じ名前のリーグがあれば表示順を置き換える)"""
+    return services.save_league(league_data, db)
+
+@app.delete("/catalog/leagues/{name}", response_model=schemas.Catalog, tags=["Catalog"], dependencies=[Depends(verify_token)])
+def delete_league(name: str, db: Session = Depends(get_db)):
+    """チーム・試合が登録されていないリーグを削除する"""
+    return services.delete_league(name, db)
+
+# === 大会 (開催ごとのDB) の管理 ===
+@app.get("/festivals/", response_model=List[schemas.Festival], tags=["Festivals"])
+def list_festivals():
+    """登録されている大会の一覧を取得する"""
+    return festivals.list_festivals()
+
+@app.post("/festivals/", response_model=schemas.Festival, tags=["Festivals"], dependencies=[Depends(verify_token)])
+def create_festival(festival_data: schemas.FestivalCreate):
+    """新しい大会を登録し、専用のデータベースファイルを作成する"""
+    return festivals.create_festival(festival_data.slug, festival_data.name)
+
+@app.post("/festivals/{slug}/archive/", response_model=schemas.Festival, tags=["Festivals"], dependencies=[Depends(verify_token)])
+def archive_festival(slug: str, archived: bool = True):
+    """大会を終了済み (読み取り専用) にする。archived=false で書き込み可能に戻す"""
+    return festivals.set_archived(slug, archived)
+
+@app.get("/metrics/", tags=["Admin"], dependencies=[Depends(verify_token)])
+def get_metrics():
+    """集計処理の実行回数、同時リクエストの合流によって省略された計算の回数、バックグラウンド再計算・スコア速報の状況を取得する"""
+    return {"singleflight": singleflight.group.stats(), "read_model": readmodel.worker.stats(), "live": live.scores.stats(), "group_commit": writer.stats(), "admission": admission.control.stats()}
+
+# === 管理者用のプロファイリング (計測中のルート以外には何も上乗せしない) ===
+@app.post("/admin/profile/", tags=["Admin"], dependencies=[Depends(verify_token)])
+def start_profile(data: schemas.ProfileRequest):
+    """指定したルートの次の N 回のリクエストを cProfile で計測する"""
+    return profiling.profiler.arm(app, data.path, data.method, data.requests)
+
+@app.get("/admin/profile/", tags=["Admin"], dependencies=[Depends(verify_token)])
+def get_profile(path: str, method: str = "GET", sort: str = "cumulative", limit: int = Query(30, ge=1, le=500)):
+    """計測したリクエストを合算した関数ごとの実行時間を取得する (計測中も途中経過を返す)"""
+    return profiling.profiler.report(path, method, sort, limit)
+
+@app.delete("/admin/profile/", tags=["Admin"], dependencies=[Depends(verify_token)])
+def cancel_profile(path: str, method: str = "GET"):
+    """ルートの計測を途中で止める (それまでの結果は取得できる)"""
+    return profiling.profiler.cancel(path, method)
+
+@app.post("/admin/memory/", tags=["Admin"], dependencies=[Depends(verify_token)])
+def start_memory_trace(data: schemas.MemoryTraceStart = schemas.MemoryTraceStart()):
+    """このワーカーのメモリ確保の記録 (tracemalloc) を開始し、比較の基準とする"""
+    return profiling.memory.start(data.frames)
+
+@app.get("/admin/memory/", tags=["Admin"], dependencies=[Depends(verify_token)])
+def get_memory_diff(group_by: str = "lineno", limit: int = Query(20, ge=1, le=500), reset: bool = False):
+    """基準からのメモリ確保の増減を、確保した場所ごとに大きい順で取得する (reset=true で基準を今に移す)"""
+    return profiling.memory.diff(group_by, limit, reset)
+
+@app.delete("/admin/memory/", tags=["Admin"], dependencies=[Depends(verify_token)])
+def stop_memory_trace():
+    """メモリ確保の記録を終了する"""
+    return profiling.memory.stop()
+
+# === 変更履歴 (イベントログ) ===
+@app.get("/events/", response_model=List[schemas.ScoreEvent], tags=["Events"], dependencies=[Depends(verify_token)])
+def list_score_events(after_id: int = 0, limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
+    """スコア・勝ち上がりの変更履歴を古い順に取得する"""
+    return events.list_events(db, after_id=after_id, limit=limit)
+
+@app.get("/events/audit/", tags=["Events"], dependencies=[Depends(verify_token)])
+def audit_score_events(upto: Optional[int] = None, db: Session = Depends(get_db)):
+    """指定したイベント時点の順位表と総合ランキングを、実際のテーブルを変更せずに再現する"""
+    return events.audit(db, upto=upto)
+
+@app.post("/events/rebuild/", tags=["Events"], dependencies=[Depends(verify_token)])
+def rebuild_from_events(db: Session = Depends(get_db)):
+    """変更履歴から試合テーブルを再構築する"""
+    return events.rebuild(db)
+
+@app.post("/events/rollback/{event_id}/", tags=["Events"], dependencies=[Depends(verify_token)])
+def rollback_to_event(event_id: int, db: Session = Depends(get_db)):
+    """
+    指定したイベント直後の状態に試合データを戻す。
+    履歴は消さず、元に戻すためのイベントを追記する。
+    """
+    return events.rollback_to(db, event_id)
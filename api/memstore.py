@@ -0,0 +1,283 @@
+import bisect
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+import models
+
+# 試合・クラスのテーブルをメモリ上に複製し、公開GETはORMを通さずここから返す。
+# 使う前に change_log を確認し、どのプロセスの書き込みでも変わった行だけを読み直す。
+
+# メモリ上に保持するDB (大会) の数。古いものから破棄し、次に使うときに読み直す
+MAX_STORES = int(os.environ.get("TOKUTEN_MEMSTORE_SIZE", "8"))
+# 前回からこれより多くの行が変わっていたら、行ごとではなくテーブル全体を読み直す
+MAX_CATCH_UP_ROWS = 1000
+
+
+class _Row:
+    __slots__ = ()
+
+    def __init__(self, values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+
+class ClassRow(_Row):
+    __slots__ = ("id", "name")
+
+
+class LeagueTeamRow(_Row):
+    __slots__ = ("id", "sport", "league", "class_id")
+
+
+class LeagueMatchRow(_Row):
+    __slots__ = ("id", "sport", "league", "class1_id", "class2_id", "class1_score", "class2_score",
+                 "class1_sets_won", "class2_sets_won", "winner_id", "is_finished", "version")
+
+
+class TournamentMatchRow(_Row):
+    __slots__ = ("id", "sport", "match_name", "class1_id", "class2_id", "class1_score", "class2_score",
+                 "class1_sets_won", "class2_sets_won", "winner_id", "is_finished", "version")
+
+
+ROW_TYPES = {
+    models.SchoolClass: ClassRow,
+    models.LeagueTeam: LeagueTeamRow,
+    models.LeagueMatch: LeagueMatchRow,
+    models.TournamentMatch: TournamentMatchRow,
+}
+
+
+MODELS_BY_TABLE = {model.__tablename__: model for model in ROW_TYPES}
+
+
+class Store:
+    """
+    One immutable generation of the four tables (id -> row objects) and the indexes the public
+    endpoints need, as of change_log entry `seq`. Catching up builds a new Store and publishes
+    it with a single assignment, so a reader keeps a consistent view for the whole request.
+    """
+    __slots__ = ("tables", "seq", "class_ids", "league_match_ids", "teams_by_league", "matches_by_league",
+                 "matches_by_class", "tournament_by_sport")
+
+    def __init__(self, tables, seq):
+        self.tables = tables
+        self.seq = seq
+        self.class_ids = sorted(tables[models.SchoolClass])
+        self.league_match_ids = sorted(tables[models.LeagueMatch])
+        self.teams_by_league = defaultdict(list)
+        for team_id in sorted(tables[models.LeagueTeam]):
+            team = tables[models.LeagueTeam][team_id]
+            self.teams_by_league[(team.sport, team.league)].append(team.class_id)
+        self.matches_by_league = defaultdict(list)
+        self.matches_by_class = defaultdict(list)
+        for match_id in self.league_match_ids:
+            match = tables[models.LeagueMatch][match_id]
+            self.matches_by_league[(match.sport, match.league)].append(match_id)
+            self.matches_by_class[match.class1_id].append(match_id)
+            if match.class2_id != match.class1_id:
+                self.matches_by_class[match.class2_id].append(match_id)
+        self.tournament_by_sport = defaultdict(list)
+        for match_id in sorted(tables[models.TournamentMatch]):
+            self.tournament_by_sport[tables[models.TournamentMatch][match_id].sport].append(match_id)
+
+    @property
+    def classes(self):
+        return self.tables[models.SchoolClass]
+
+    @property
+    def league_matches(self):
+        return self.tables[models.LeagueMatch]
+
+    @property
+    def tournament_matches(self):
+        return self.tables[models.TournamentMatch]
+
+    # --- レスポンス用の辞書 (schemas と同じ形) ---
+    def class_dict(self, class_id):
+        school_class = self.classes.get(class_id)
+        return {"name": school_class.name, "id": school_class.id} if school_class else None
+
+    def league_match_dict(self, match):
+        return {
+            "sport": match.sport,
+            "league": match.league,
+            "class1_id": match.class1_id,
+            "class2_id": match.class2_id,
+            "class1_score": match.class1_score,
+            "class2_score": match.class2_score,
+            "class1_sets_won": match.class1_sets_won,
+            "class2_sets_won": match.class2_sets_won,
+            "winner_id": match.winner_id,
+            "id": match.id,
+            "is_finished": bool(match.is_finished),
+            "class1": self.class_dict(match.class1_id),
+            "class2": self.class_dict(match.class2_id),
+            "winner": self.class_dict(match.winner_id),
+            "version": match.version,
+        }
+
+    def tournament_match_dict(self, match):
+        return {
+            "sport": match.sport,
+            "match_name": match.match_name,
+            "id": match.id,
+            "class1": self.class_dict(match.class1_id),
+            "class2": self.class_dict(match.class2_id),
+            "winner": self.class_dict(match.winner_id),
+            "class1_score": match.class1_score,
+            "class2_score": match.class2_score,
+            "class1_sets_won": match.class1_sets_won,
+            "class2_sets_won": match.class2_sets_won,
+            "is_finished": bool(match.is_finished),
+            "version": match.version,
+        }
+
+    # --- 読み取り ---
+    def league_teams(self, sport, league):
+        return [self.class_dict(class_id) for class_id in self.teams_by_league.get((sport, league), ())]
+
+    def league_match_list(self, sport, league):
+        return [self.league_match_dict(self.league_matches[i]) for i in self.matches_by_league.get((sport, league), ())]
+
+    def tournament_match_list(self, sport):
+        return [self.tournament_match_dict(self.tournament_matches[i]) for i in self.tournament_by_sport.get(sport, ())]
+
+    def class_matches(self, class_id):
+        return {
+            "school_class": self.class_dict(class_id),
+            "league_matches": [self.league_match_dict(self.league_matches[i]) for i in self.matches_by_class.get(class_id, ())],
+            "tournament_matches": [
+                self.tournament_match_dict(self.tournament_matches[i])
+                for sport_ids in self.tournament_by_sport.values() for i in sport_ids
+                if class_id in (self.tournament_matches[i].class1_id, self.tournament_matches[i].class2_id)
+            ],
+        }
+
+    def class_page(self, after_id, limit, skip=0):
+        start = bisect.bisect_right(self.class_ids, after_id) if after_id is not None else skip
+        ids = self.class_ids[start:start + limit + 1]
+        return [self.class_dict(class_id) for class_id in ids]
+
+    def league_match_page(self, after_id, limit, skip=0, sport=None, league=None, class_id=None, is_finished=None):
+        """
+        Up to limit + 1 matches after `after_id` in id order. Starts from the narrowest index
+        for the given filters and checks the remaining filters while walking it.
+        """
+        if class_id is not None:
+            candidates = self.matches_by_class.get(class_id, [])
+        elif sport is not None and league is not None:
+            candidates = self.matches_by_league.get((sport, league), [])
+        else:
+            candidates = self.league_match_ids
+        start = bisect.bisect_right(candidates, after_id) if after_id is not None else 0
+        page = []
+        for match_id in candidates[start:]:
+            match = self.league_matches[match_id]
+            if ((sport is not None and match.sport != sport) or (league is not None and match.league != league)
+                    or (is_finished is not None and bool(match.is_finished) != is_finished)):
+                continue
+            if skip:
+                skip -= 1
+                continue
+            page.append(self.league_match_dict(match))
+            if len(page) > limit:
+                break
+        return page
+
+
+def _load(conn):
+    # 先に change_log の位置を読むので、その後に書き込まれた行は次の確認で読み直される (取りこぼしはない)
+    seq = conn.execute(select(func.max(models.ChangeLog.seq))).scalar() or 0
+    tables = {}
+    for model, row_type in ROW_TYPES.items():
+        tables[model] = {row.id: row_type(row._mapping) for row in conn.execute(select(model.__table__))}
+    return Store(tables, seq)
+
+
+def _catch_up(conn, store):
+    """
+    The store with every row written since its change_log position re-read from the database
+    (deleted rows dropped), or reloaded whole when too much changed or the log no longer goes
+    back that far. Returns `store` itself when nothing changed.
+    """
+    log = models.ChangeLog.__table__
+    entries = conn.execute(
+        select(log.c.seq, log.c.table_name, log.c.row_id).where(log.c.seq > store.seq).order_by(log.c.seq).limit(MAX_CATCH_UP_ROWS + 1)
+    ).all()
+    if not entries:
+        return store
+    # 番号は1ずつ増えるので、最初の番号が続いていなければ古い記録が既に削除されている
+    if entries[0].seq != store.seq + 1 or len(entries) > MAX_CATCH_UP_ROWS:
+        return _load(conn)
+    changed = defaultdict(set)
+    for entry in entries:
+        if entry.table_name in MODELS_BY_TABLE:
+            changed[MODELS_BY_TABLE[entry.table_name]].add(entry.row_id)
+    tables = {model: (dict(rows) if model in changed else rows) for model, rows in store.tables.items()}
+    for model, ids in changed.items():
+        rows = tables[model]
+        for row_id in ids:
+            rows.pop(row_id, None)
+        for row in conn.execute(select(model.__table__).where(model.__table__.c.id.in_(ids))):
+            rows[row.id] = ROW_TYPES[model](row._mapping)
+    return Store(tables, entries[-1].seq)
+
+
+class _Entry:
+    __slots__ = ("store", "lock")
+
+    def __init__(self):
+        self.store = None
+        self.lock = threading.Lock()
+
+
+class MemoryModel:
+    """
+    Per-database Stores, loaded on first use and brought up to date from change_log on every
+    use, so writes of other workers and of the command-line scripts are seen as well. A use
+    that finds change_log unchanged only reads its last seq; loading and catching up take the
+    lock of that database's store alone, never the lock shared by every database.
+    """
+
+    def __init__(self, max_stores=MAX_STORES):
+        self.max_stores = max_stores
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, engine):
+        key = str(engine.url)
+        with self._lock:
+            entry = self._stores.get(key)
+            if entry is None:
+                entry = self._stores[key] = _Entry()
+                while len(self._stores) > self.max_stores:
+                    self._stores.popitem(last=False)
+            else:
+                self._stores.move_to_end(key)
+        with engine.connect() as conn:
+            store = entry.store
+            latest = None
+            if store is not None:
+                latest = conn.execute(select(func.max(models.ChangeLog.seq))).scalar() or 0
+                if latest <= store.seq:
+                    return store
+            with entry.lock:
+                # 待っている間に他のスレッドが読み直していれば、それを使う
+                if entry.store is None:
+                    entry.store = _load(conn)
+                elif latest is None or entry.store.seq < latest:
+                    entry.store = _catch_up(conn, entry.store)
+                return entry.store
+
+    def loaded(self):
+        return list(self._stores)
+
+
+model = MemoryModel()
+
+
+def store_for(db: Session):
+    """The Store of the database a request's session stands for (its primary, for replica sessions)."""
+    return model.get(db.info.get("primary") or db.get_bind())
@@ -1,9 +1,12 @@
 import enum
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Enum,Boolean
+import os
+from datetime import datetime
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Boolean, DateTime, Text, Index, insert
 from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.ext.declarative import declarative_base
 
-DATABASE_URL = "sqlite:///../class_match.db"
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///../class_match.db")
 Base = declarative_base()
 
 class SportName(str, enum.Enum):
@@ -24,6 +27,39 @@ class LeagueName(str, enum.Enum):
     D = "D"
 
 
+# 種目・リーグはDBごとのカタログ (sports / leagues テーブル) に登録する。上の2つは新しいDBに登録する既定の内容で、
+# 試合・チームの sport / league 列にはカタログの名前 (例: "サッカー", "A") をそのまま保存する
+DEFAULT_SPORTS = [
+    # (種目, 種類, 決勝トーナメントの形式, 各リーグから進出するチーム数, 試合結果のサマリーに含めるか)
+    (SportName.VOLLEYBALL, "ball", "top4", 1, True),
+    (SportName.MEN_BASKETBALL, "ball", "top4", 1, True),
+    (SportName.WOMEN_BASKETBALL, "ball", "top4", 1, True),
+    (SportName.SOFTBALL, "ball", "top4", 1, True),
+    (SportName.SOCCER, "ball", "top4", 1, True),
+    (SportName.TABLE_TENNIS, "racket", "top8", 2, True),
+    (SportName.BADMINTON, "racket", "top8", 2, True),
+    (SportName.EXTRA, "other", "top8", 2, False),
+]
+
+
+class Sport(Base):
+    __tablename__ = "sports"
+    name = Column(String, primary_key=True)
+    position = Column(Integer, nullable=False, default=0) # 表示順
+    kind = Column(String, nullable=False, default="ball") # "ball" (球技) / "racket" (ラケット競技) / "other"
+    bracket = Column(String, nullable=False, default="top4") # 決勝トーナメントの形式 ("top4" / "top8" / "none")
+    advancing = Column(Integer, nullable=False, default=1) # 各リーグから決勝トーナメントに進むチーム数
+    league_points = Column(Text) # リーグ順位 -> 総合ポイント (JSON)。NULL なら既定の表
+    tournament_points = Column(Text) # トーナメントの順位 ("優勝" など) -> 総合ポイント (JSON)。NULL なら既定の表
+    in_reports = Column(Boolean, nullable=False, default=True) # 試合結果のサマリーに含めるか
+
+
+class League(Base):
+    __tablename__ = "leagues"
+    name = Column(String, primary_key=True)
+    position = Column(Integer, nullable=False, default=0) # 表示順
+
+
 class SchoolClass(Base):
     __tablename__ = "classes"
     id = Column(Integer, primary_key=True, index=True)
@@ -33,9 +69,9 @@ class SchoolClass(Base):
 class LeagueTeam(Base):
     __tablename__ = "league_teams"
     id = Column(Integer, primary_key=True, index=True)
-    sport = Column(Enum(SportName), nullable=False)
-    league = Column(Enum(LeagueName), nullable=False)
-    class_id = Column(Integer, ForeignKey("classes.id"), nullable=False)
+    sport = Column(String, nullable=False)
+    league = Column(String, nullable=False)
+    class_id = Column(Integer, ForeignKey("classes.id"), nullable=False, index=True)
 
     school_class = relationship("SchoolClass")
 
@@ -44,11 +80,11 @@ class LeagueMatch(Base):
     """予選リーグの'対戦の組み合わせ'と'結果'を保存するテーブル"""
     __tablename__ = "league_matches"
     id = Column(Integer, primary_key=True, index=True)
-    sport = Column(Enum(SportName))
-    league = Column(Enum(LeagueName))
+    sport = Column(String)
+    league = Column(String)
 
-    class1_id = Column(Integer, ForeignKey("classes.id"))
-    class2_id = Column(Integer, ForeignKey("classes.id"))
+    class1_id = Column(Integer, ForeignKey("classes.id"), index=True)
+    class2_id = Column(Integer, ForeignKey("classes.id"), index=True)
 
     # --- ここから修正 ---
     # 試合結果は後から入力されるので、最初はNULLでも良い
@@ -56,26 +92,32 @@ class LeagueMatch(Base):
     class2_score = Column(Integer, nullable=True)
     class1_sets_won = Column(Integer, nullable=True)
     class2_sets_won = Column(Integer, nullable=True)
-    winner_id = Column(Integer, ForeignKey("classes.id"), nullable=True)
+    winner_id = Column(Integer, ForeignKey("classes.id"), nullable=True, index=True)
     # --- ここまで修正 ---
 
     # 試合が完了したかどうかのフラグ
     is_finished = Column(Boolean, default=False)
+    # 更新のたびに増える版数。UPDATE は読み込んだときの版数を条件に行い、他の更新と競合したら失敗する
+    version = Column(Integer, nullable=False, server_default="1")
 
     class1 = relationship("SchoolClass", foreign_keys=[class1_id])
     class2 = relationship("SchoolClass", foreign_keys=[class2_id])
     winner = relationship("SchoolClass", foreign_keys=[winner_id])
 
+    # リーグ単位の一覧をID順にページングするための索引
+    __table_args__ = (Index("ix_league_matches_sport_league_id", "sport", "league", "id"),)
+    __mapper_args__ = {"version_id_col": version}
+
 #決勝
 class TournamentMatch(Base):
     __tablename__ = "tournament_matches"
     id = Column(Integer, primary_key=True, index=True)
-    sport = Column(Enum(SportName)) # 種目名
+    sport = Column(String) # 種目名
     match_name = Column(String) # 試合名 (例: "E1", "E7", "3位決定戦")
 
     # 対戦クラス
-    class1_id = Column(Integer, ForeignKey("classes.id"), nullable=True)
-    class2_id = Column(Integer, ForeignKey("classes.id"), nullable=True)
+    class1_id = Column(Integer, ForeignKey("classes.id"), nullable=True, index=True)
+    class2_id = Column(Integer, ForeignKey("classes.id"), nullable=True, index=True)
 
     # --- ここから追加 ---
     class1_score = Column(Integer, nullable=True)
@@ -85,22 +127,125 @@ class TournamentMatch(Base):
     # --- ここまで追加 ---
 
     # どのクラスが勝ったか
-    winner_id = Column(Integer, ForeignKey("classes.id"), nullable=True)
+    winner_id = Column(Integer, ForeignKey("classes.id"), nullable=True, index=True)
 
     # 試合が完了したかどうかのフラグ
     is_finished = Column(Boolean, default=False)
+    # 更新のたびに増える版数 (LeagueMatch と同じ)
+    version = Column(Integer, nullable=False, server_default="1")
     
     class1 = relationship("SchoolClass", foreign_keys=[class1_id])
     class2 = relationship("SchoolClass", foreign_keys=[class2_id])
     winner = relationship("SchoolClass", foreign_keys=[winner_id])
 
+    __mapper_args__ = {"version_id_col": version}
+
+
+# 試合の時間割 (コート・時間帯の割り当て)
+class ScheduleEntry(Base):
+    __tablename__ = "schedule_entries"
+    id = Column(Integer, primary_key=True, index=True)
+    league_match_id = Column(Integer, ForeignKey("league_matches.id"), unique=True, nullable=False)
+    court = Column(Integer, nullable=False) # 種目内のコート番号 (1始まり)
+    slot = Column(Integer, nullable=False, index=True) # 時間帯の番号 (0始まり)
+    start_time = Column(String) # 開始時刻 (例: "09:15")
+
+    match = relationship("LeagueMatch")
+
+
+# スコア・勝ち上がりの変更履歴 (追記のみ。試合テーブルはこの履歴から再構築できる)
+class ScoreEvent(Base):
+    __tablename__ = "score_events"
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    batch_id = Column(String, index=True) # 同じトランザクションで記録されたイベントは同じ値
+    entity = Column(String, nullable=False) # "league_match" または "tournament_match"
+    entity_id = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False) # "upsert" (変更後の行全体) または "delete"
+    payload = Column(Text) # upsert の場合の行データ (JSON)
+
+
+# 下の CHANGE_LOG_TABLES への書き込みの記録。トリガーで追記されるので、ORMを通さない書き込みや
+# 他のプロセス (別のワーカー・CLI) の書き込みも残る。各プロセスはメモリ上の複製をこれで最新にする
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+    __table_args__ = {"sqlite_autoincrement": True} # 削除した番号を再利用しない
+    seq = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    row_id = Column(Integer)
+
 
 # dbの生成
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# テーブル構成を変更したら1つ上げる (PRAGMA user_version に保存される)
+SCHEMA_VERSION = 9
+# sport 列に enum の名前 ("SOCCER" など) を保存していた最後のバージョン
+ENUM_KEYS_VERSION = 7
+
+def _migrate_enum_keys(conn):
+    """sport 列の値を enum の名前から種目名 (カタログの name) に書き換える。league 列は名前と値が同じ"""
+    for table in (LeagueTeam.__table__, LeagueMatch.__table__, TournamentMatch.__table__):
+        for sport in SportName:
+            conn.execute(table.update().where(table.c.sport == sport.name).values(sport=sport.value))
+
+def _seed_catalog(conn):
+    """カタログが空なら既定の種目・リーグを登録する"""
+    if conn.execute(Sport.__table__.select().limit(1)).first() is None:
+        conn.execute(insert(Sport.__table__), [
+            {"name": sport.value, "position": position, "kind": kind, "bracket": bracket, "advancing": advancing, "in_reports": in_reports}
+            for position, (sport, kind, bracket, advancing, in_reports) in enumerate(DEFAULT_SPORTS)
+        ])
+    if conn.execute(League.__table__.select().limit(1)).first() is None:
+        conn.execute(insert(League.__table__), [{"name": league.value, "position": position} for position, league in enumerate(LeagueName)])
+
+# change_log に記録するテーブルとその行のID列。カタログ (種目・リーグ) は表ごと読み直すので行は記録しない (row_id は NULL)
+CHANGE_LOG_TABLES = {"classes": "id", "league_teams": "id", "league_matches": "id", "tournament_matches": "id",
+                     "sports": None, "leagues": None}
+# change_log に残す件数。これより前の変更を読めなかったプロセスはテーブル全体を読み直す
+CHANGE_LOG_KEEP = 10000
+
+def _create_change_log_triggers(conn):
+    for table, key in CHANGE_LOG_TABLES.items():
+        for operation, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS change_log_{table}_{operation.lower()} AFTER {operation} ON {table} BEGIN "
+                f"INSERT INTO change_log (table_name, row_id) VALUES ('{table}', {f'{row}.{key}' if key else 'NULL'}); "
+                f"DELETE FROM change_log WHERE seq <= last_insert_rowid() - {CHANGE_LOG_KEEP}; "
+                f"END"
+            )
+
+def ensure_schema(bind=engine):
+    """
+    user_version が SCHEMA_VERSION 以上ならテーブルの確認を省略する。
+    古い(または新規の)DBの場合のみ create_all を実行し、バージョンを記録する。
+    """
+    with bind.begin() as conn:
+        current_version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        if current_version >= SCHEMA_VERSION:
+            return False
+        Base.metadata.create_all(bind=conn)
+        # create_all は既存のテーブルに後から追加した列も作らないので ALTER TABLE で追加する
+        for table in Base.metadata.sorted_tables:
+            existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}")
+        # create_all は既存のテーブルに後から追加した索引を作らないので個別に作成する
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+        if current_version <= ENUM_KEYS_VERSION:
+            _migrate_enum_keys(conn)
+            # カタログができる前のDB (と新しいDB) には既定の種目・リーグを登録する。後から全て削除した場合は登録し直さない
+            _seed_catalog(conn)
+        _create_change_log_triggers(conn)
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return True
+
 def create_db():
-    Base.metadata.create_all(bind=engine)
+    ensure_schema()
 
 if __name__ == "__main__":
     create_db()
@@ -0,0 +1,59 @@
+import base64
+import json
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values):
+    """Opaque cursor for the sort key of the last row on a page."""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """The sort key of a cursor made by encode_cursor: a one-element list."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != 1:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def trim_page(rows, limit: int, response: Response):
+    """Cuts a page fetched with limit + 1 rows (objects or dicts with an id) and sets the next cursor."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([last["id"] if isinstance(last, dict) else last.id])
+    return rows
+
+
+def cursor_id(cursor: str):
+    """The last id of the previous page, or None for the first page."""
+    if not cursor:
+        return None
+    (last_id,) = decode_cursor(cursor)
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+
+def list_page(items, key, cursor: str, limit: int, response: Response, skip: int = 0):
+    """
+    The same cursor contract over an already sorted in-memory list whose `key` values are
+    1..n in order (e.g. ranks), so the page start is found by index instead of by scanning.
+    """
+    start = skip
+    if cursor:
+        (last,) = decode_cursor(cursor)
+        if not isinstance(last, int) or isinstance(last, bool) or last < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        start = last
+    page = items[start : start + limit]
+    if start + limit < len(items):
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([page[-1][key]])
+    return page
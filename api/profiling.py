@@ -0,0 +1,299 @@
+import contextvars
+import cProfile
+import functools
+import inspect
+import pstats
+import threading
+import time
+import tracemalloc
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+
+SORT_KEYS = ("cumulative", "tottime", "ncalls")
+
+
+def _function_name(func):
+    filename, line, name = func
+    return name if filename == "~" else f"{filename}:{line}({name})"
+
+
+# 計測中のリクエストがスレッドプールで実行する部分 (同期のエンドポイント・依存関係) のプロファイル
+_thread_profiles = contextvars.ContextVar("thread_profiles", default=None)
+# イベントループのスレッドでは1つのプロファイラしか動かせないので、計測するリクエストは同時に1つ
+_loop_profiling = threading.Lock()
+
+
+def _dependants(dependant):
+    yield dependant
+    for sub_dependant in dependant.dependencies:
+        yield from _dependants(sub_dependant)
+
+
+def _runs_in_thread(call):
+    # FastAPI は同期の関数・ジェネレーターをスレッドプールで実行する (クラスのインスタンスなどは対象外)
+    return inspect.isfunction(call) and not inspect.iscoroutinefunction(call) and not inspect.isasyncgenfunction(call)
+
+
+def _in_thread(func, *args):
+    """Runs `func` under a profiler of its own when the current request is being profiled."""
+    profiles = _thread_profiles.get()
+    if profiles is None:
+        return func(*args)
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return func(*args)
+    try:
+        return func(*args)
+    finally:
+        profile.disable()
+        profiles.append(profile)
+
+
+def _thread_wrapper(original):
+    if inspect.isgeneratorfunction(original):
+        @functools.wraps(original)
+        def call(**values):
+            # yield のたびに別のスレッドで再開されるので、1ステップずつ計測する
+            steps = original(**values)
+            try:
+                value = _in_thread(next, steps)
+            except StopIteration:
+                return
+            try:
+                yield value
+            except BaseException as exc:
+                try:
+                    _in_thread(steps.throw, exc)
+                except StopIteration:
+                    return
+                raise
+            try:
+                _in_thread(next, steps)
+            except StopIteration:
+                return
+    else:
+        @functools.wraps(original)
+        def call(**values):
+            return _in_thread(lambda: original(**values))
+    return call
+
+
+class RouteProfile:
+    """
+    cProfile statistics of one route, aggregated over the next `requests` calls. The whole route
+    handler is measured: dependencies, request parsing, the endpoint, response serialization and
+    sending. Parts FastAPI runs in the threadpool are profiled in their thread and merged into the
+    same request; time the event loop spends on other requests meanwhile is included as well.
+    """
+
+    def __init__(self, route: APIRoute, method, requests):
+        self.route = route
+        self.method = method
+        self.requested = requests
+        self.profiled = 0
+        self.seconds = 0.0
+        self.started_at = time.time()
+        self.stats = None
+        self._started = 0
+        self._lock = threading.Lock()
+        self._app = route.app
+        self._calls = [(dependant, dependant.call) for dependant in _dependants(route.dependant)
+                       if _runs_in_thread(dependant.call)]
+
+    @property
+    def done(self):
+        return self.profiled >= self.requested
+
+    def install(self):
+        original = self._app
+
+        async def app(scope, receive, send):
+            profile = self._begin()
+            if profile is None:
+                return await original(scope, receive, send)
+            start = time.perf_counter()
+            profiles = [profile]
+            token = _thread_profiles.set(profiles)
+            try:
+                return await original(scope, receive, send)
+            finally:
+                profile.disable()
+                _thread_profiles.reset(token)
+                _loop_profiling.release()
+                self._end(profiles, start)
+
+        wrappers = {}
+        for dependant, call in self._calls:
+            # 同じ関数 (get_db など) はすべて同じラッパーにする
+            dependant.call = wrappers.setdefault(call, _thread_wrapper(call))
+        self.route.app = app
+
+    def uninstall(self):
+        # 元のハンドラーに戻すので、計測が終わった後のリクエストには何も上乗せされない
+        self.route.app = self._app
+        for dependant, call in self._calls:
+            dependant.call = call
+
+    def _begin(self):
+        if not _loop_profiling.acquire(blocking=False):
+            return None
+        with self._lock:
+            if self._started >= self.requested:
+                _loop_profiling.release()
+                return None
+            self._started += 1
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # 同じスレッドで別のプロファイラが動いている
+            with self._lock:
+                self._started -= 1
+            _loop_profiling.release()
+            return None
+        return profile
+
+    def _end(self, profiles, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            for profile in profiles:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+            self.profiled += 1
+            self.seconds += elapsed
+            if self.done:
+                self.uninstall()
+
+    def cancel(self):
+        with self._lock:
+            self.requested = self.profiled
+            self.uninstall()
+
+    def report(self, sort="cumulative", limit=30):
+        with self._lock:
+            rows = []
+            if self.stats is not None:
+                stats = self.stats.stats
+                key = {"cumulative": lambda f: stats[f][3], "tottime": lambda f: stats[f][2], "ncalls": lambda f: stats[f][1]}[sort]
+                for func in sorted(stats, key=key, reverse=True)[:limit]:
+                    primitive_calls, calls, tottime, cumtime, _ = stats[func]
+                    rows.append({"function": _function_name(func), "ncalls": calls, "primitive_calls": primitive_calls,
+                                 "tottime": round(tottime, 6), "cumtime": round(cumtime, 6)})
+            return {
+                "path": self.route.path, "method": self.method, "requested": self.requested,
+                "profiled": self.profiled, "done": self.done, "started_at": self.started_at,
+                "mean_ms": round(self.seconds / self.profiled * 1000, 3) if self.profiled else None,
+                "sort": sort, "functions": rows,
+            }
+
+
+class Profiler:
+    """
+    Profiles routes on demand. Arming a route swaps its request handler (and the functions it
+    runs in the threadpool) for profiling wrappers, which put the originals back after the
+    requested number of calls, so routes that are not being profiled run exactly as before.
+    Routes are armed in the worker process that handles the arming request only.
+    """
+
+    def __init__(self):
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def arm(self, app, path, method, requests):
+        method = method.upper()
+        route = self._find_route(app, path, method)
+        key = (route.path, method)
+        with self._lock:
+            current = self._profiles.get(key)
+            if current is not None and not current.done:
+                raise HTTPException(status_code=409, detail="This route is already being profiled")
+            profile = self._profiles[key] = RouteProfile(route, method, requests)
+            profile.install()
+        return profile.report(limit=0)
+
+    def report(self, path, method, sort="cumulative", limit=30):
+        if sort not in SORT_KEYS:
+            raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(SORT_KEYS)}")
+        return self._get(path, method).report(sort, limit)
+
+    def cancel(self, path, method):
+        """Stops profiling the route; the statistics collected so far stay readable."""
+        profile = self._get(path, method)
+        profile.cancel()
+        return profile.report(limit=0)
+
+    def _get(self, path, method):
+        with self._lock:
+            profile = self._profiles.get((path, method.upper()))
+        if profile is None:
+            raise HTTPException(status_code=404, detail="This route has not been profiled")
+        return profile
+
+    @staticmethod
+    def _find_route(app, path, method):
+        for route in app.routes:
+            if isinstance(route, APIRoute) and route.path == path and method in route.methods:
+                return route
+        raise HTTPException(status_code=404, detail=f"No route {method} {path}")
+
+
+def _take_snapshot():
+    # tracemalloc 自身の確保は除く
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+
+
+class MemoryTracer:
+    """tracemalloc snapshots of this worker, compared with the one taken when tracing started."""
+
+    def __init__(self):
+        self._baseline = None
+        self._lock = threading.Lock()
+
+    def start(self, frames=1):
+        with self._lock:
+            if tracemalloc.is_tracing():
+                raise HTTPException(status_code=409, detail="Memory tracing is already running")
+            tracemalloc.start(frames)
+            self._baseline = _take_snapshot()
+            return self._status()
+
+    def diff(self, group_by="lineno", limit=20, reset=False):
+        if group_by not in ("lineno", "filename", "traceback"):
+            raise HTTPException(status_code=400, detail="group_by must be one of lineno, filename, traceback")
+        with self._lock:
+            if not tracemalloc.is_tracing() or self._baseline is None:
+                raise HTTPException(status_code=409, detail="Memory tracing is not running")
+            snapshot = _take_snapshot()
+            differences = snapshot.compare_to(self._baseline, group_by)
+            if reset:
+                self._baseline = snapshot
+            return {
+                **self._status(),
+                "allocations": [
+                    {"location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                     "size_kib": round(stat.size / 1024, 1), "size_diff_kib": round(stat.size_diff / 1024, 1),
+                     "count": stat.count, "count_diff": stat.count_diff}
+                    for stat in differences[:limit]
+                ],
+            }
+
+    def stop(self):
+        with self._lock:
+            status = self._status()
+            tracemalloc.stop()
+            self._baseline = None
+            return {**status, "tracing": False}
+
+    def _status(self):
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": tracemalloc.is_tracing(), "traced_kib": round(current / 1024, 1), "peak_kib": round(peak / 1024, 1)}
+
+
+profiler = Profiler()
+memory = MemoryTracer()
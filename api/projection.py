@@ -0,0 +1,302 @@
+import multiprocessing
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.orm import Session
+import models, services, sportcatalog
+
+# 1回のバッチで同時にシミュレートする最大数 (メモリ使用量の上限)
+BATCH_SIZE = 20000
+
+# 引き分け率の事前分布 (完了した試合が少ないうちはこの値に近くなる)
+PRIOR_TIE_RATE = 0.1
+PRIOR_WEIGHT = 10
+
+# シミュレーションを分担するプロセス数の上限。プロセスは最初に使うときに一度だけ起動し、以降は使い回す
+MAX_WORKERS = int(os.environ.get("TOKUTEN_PROJECTION_WORKERS", str(os.cpu_count() or 1)))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    """
+    The shared worker pool. Processes are spawned rather than forked, since the server that
+    asks for them has threads (the read model, live scores, the request thread pool).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def _is_final(match_name):
+    return "決勝" in match_name and "準" not in match_name and "3位決定戦" not in match_name
+
+
+def _is_third_place(match_name):
+    return "3位決定戦" in match_name
+
+
+def load_projection_state(db: Session, tie_rate=None):
+    """
+    Loads everything the simulation needs into plain, picklable Python structures
+    using one query per table, so worker processes never touch the database.
+    """
+    catalog = sportcatalog.for_session(db)
+    classes = db.query(models.SchoolClass.id, models.SchoolClass.name).order_by(models.SchoolClass.id).all()
+    class_index = {cid: i for i, (cid, _) in enumerate(classes)}
+
+    matches_by_league = defaultdict(list)
+    for match in db.query(models.LeagueMatch).all():
+        if match.class1_id in class_index and match.class2_id in class_index:
+            matches_by_league[(match.sport, match.league)].append(match)
+
+    ties = defaultdict(int)
+    finished = defaultdict(int)
+    for (sport, _), matches in matches_by_league.items():
+        for match in matches:
+            if match.is_finished:
+                finished[sport] += 1
+                if (match.class1_score or 0) == (match.class2_score or 0):
+                    ties[sport] += 1
+
+    leagues = []
+    for (sport, league), matches in matches_by_league.items():
+        entry = {"sport": sport, "league": league, "points_map": catalog.sport(sport).league_points}
+        if all(match.is_finished for match in matches):
+            # 完了済みのリーグは実際の順位表(タイブレーク込み)をそのまま使う
+            standings = services.calculate_league_standings(sport, league, db)
+            entry["final_order"] = [class_index[s["class_id"]] for s in standings]
+        else:
+            team_ids = sorted({m.class1_id for m in matches} | {m.class2_id for m in matches})
+            local = {cid: i for i, cid in enumerate(team_ids)}
+            points = [0] * len(team_ids)
+            remaining = []
+            for match in matches:
+                if match.is_finished:
+                    score1 = match.class1_score or 0
+                    score2 = match.class2_score or 0
+                    gain1 = 2 if score1 > score2 else (1 if score1 == score2 else 0)
+                    points[local[match.class1_id]] += gain1
+                    points[local[match.class2_id]] += 2 - gain1
+                else:
+                    remaining.append((local[match.class1_id], local[match.class2_id]))
+            if tie_rate is None:
+                sport_tie_rate = (ties[sport] + PRIOR_TIE_RATE * PRIOR_WEIGHT) / (finished[sport] + PRIOR_WEIGHT)
+            else:
+                sport_tie_rate = tie_rate
+            entry.update({
+                "teams": [class_index[cid] for cid in team_ids],
+                "points": points,
+                "remaining": remaining,
+                "tie_rate": sport_tie_rate,
+            })
+        leagues.append(entry)
+
+    tournaments = []
+    brackets = defaultdict(dict)
+    for match in db.query(models.TournamentMatch).all():
+        brackets[match.sport][match.match_name] = match
+    leagues_by_sport = defaultdict(set)
+    for sport, league in matches_by_league:
+        leagues_by_sport[sport].add(league)
+
+    # 試合のある種目だけを見る
+    for sport in sorted(brackets.keys() | leagues_by_sport.keys(), key=catalog.order):
+        existing = brackets.get(sport)
+        # 今のカタログでは組み合わせを決められない種目 (None) も見込みから外す
+        bracket = services.bracket_for(sport, db) or []
+        seeded_leagues = {slot[0] for _, slot1, slot2 in bracket for slot in (slot1, slot2) if slot}
+        if not bracket or (not existing and not leagues_by_sport[sport] >= seeded_leagues):
+            # リーグが揃っていない種目はトーナメントを生成できないので得点も発生しない
+            continue
+        rounds = []
+        for name, slot1, slot2 in bracket:
+            match = existing.get(name) if existing else None
+            rounds.append({
+                "name": name,
+                "seed1": slot1,
+                "seed2": slot2,
+                "class1": class_index.get(match.class1_id, -1) if match else -1,
+                "class2": class_index.get(match.class2_id, -1) if match else -1,
+                "winner": class_index.get(match.winner_id, -1) if match and match.is_finished else -1,
+            })
+        tournaments.append({
+            "sport": sport,
+            "generated": bool(existing),
+            "rounds": rounds,
+            "advancement": services.advancement_map_for(sport, db),
+            "points_map": catalog.sport(sport).tournament_points,
+        })
+
+    return {
+        "class_ids": [cid for cid, _ in classes],
+        "class_names": [name for _, name in classes],
+        "leagues": leagues,
+        "tournaments": tournaments,
+    }
+
+
+def _simulate_batch(state, simulations, rng):
+    """
+    Simulates `simulations` completions of the event at once and returns the final total points
+    as a (simulations, classes) array. Every step works on whole columns of the batch.
+    """
+    import numpy as np
+
+    num_classes = len(state["class_ids"])
+    rows = np.arange(simulations)
+    totals = np.zeros((simulations, num_classes), dtype=np.int32)
+    # (sport, league) -> (simulations, teams) のリーグ内順位順のクラス番号
+    league_orders = {}
+
+    for entry in state["leagues"]:
+        key = (entry["sport"], entry["league"])
+        if "final_order" in entry:
+            order = np.asarray(entry["final_order"], dtype=np.int64)
+            league_orders[key] = np.broadcast_to(order, (simulations, len(order)))
+            league_points = np.array([entry["points_map"].get(rank, 0) for rank in range(1, len(order) + 1)], dtype=np.int32)
+            totals[:, order] += league_points
+            continue
+
+        teams = np.asarray(entry["teams"], dtype=np.int64)
+        num_teams = len(teams)
+        points = np.broadcast_to(np.asarray(entry["points"], dtype=np.float64), (simulations, num_teams)).copy()
+
+        remaining = entry["remaining"]
+        if remaining:
+            side1 = np.zeros((len(remaining), num_teams))
+            side2 = np.zeros((len(remaining), num_teams))
+            for i, (a, b) in enumerate(remaining):
+                side1[i, a] = 1
+                side2[i, b] = 1
+            draws = rng.random((simulations, len(remaining)))
+            tie_rate = entry["tie_rate"]
+            gain1 = np.where(draws < tie_rate, 1.0, np.where(draws < tie_rate + (1 - tie_rate) / 2, 2.0, 0.0))
+            points += gain1 @ side1 + (2.0 - gain1) @ side2
+
+        # 勝ち点が並んだ場合の順位は乱数で決める (残り試合のセット数は予測できないため)
+        keys = points + rng.random((simulations, num_teams)) * 0.5
+        local_order = np.argsort(-keys, axis=1)
+        order = teams[local_order]
+        league_orders[key] = order
+        league_points = np.array([entry["points_map"].get(rank, 0) for rank in range(1, num_teams + 1)], dtype=np.int32)
+        totals[rows[:, None], order] += league_points
+
+    for tournament in state["tournaments"]:
+        sport = tournament["sport"]
+        points_map = tournament["points_map"]
+        slots = {}
+        for match in tournament["rounds"]:
+            slots.setdefault(match["name"], {})
+            for position, seed_key, fixed in (("class1_id", "seed1", match["class1"]), ("class2_id", "seed2", match["class2"])):
+                if fixed >= 0:
+                    slots[match["name"]][position] = np.full(simulations, fixed, dtype=np.int64)
+                elif not tournament["generated"] and match[seed_key] is not None:
+                    league, rank = match[seed_key]
+                    order = league_orders[(sport, league)]
+                    if rank <= order.shape[1]:
+                        slots[match["name"]][position] = order[:, rank - 1]
+
+        for match in tournament["rounds"]:
+            name = match["name"]
+            class1 = slots[name].get("class1_id")
+            class2 = slots[name].get("class2_id")
+            if class1 is None or class2 is None:
+                continue
+            if match["winner"] >= 0:
+                winner = np.full(simulations, match["winner"], dtype=np.int64)
+            else:
+                winner = np.where(rng.random(simulations) < 0.5, class1, class2)
+            loser = np.where(winner == class1, class2, class1)
+
+            rules = tournament["advancement"].get(name, {})
+            if "winner_to" in rules:
+                next_name, position = rules["winner_to"]
+                slots.setdefault(next_name, {})[position] = winner
+            if "loser_to" in rules:
+                next_name, position = rules["loser_to"]
+                slots.setdefault(next_name, {})[position] = loser
+
+            if _is_final(name):
+                totals[rows, winner] += points_map.get("優勝", 0)
+                totals[rows, loser] += points_map.get("準優勝", 0)
+            elif _is_third_place(name):
+                totals[rows, winner] += points_map.get("3位", 0)
+                totals[rows, loser] += points_map.get("4位", 0)
+
+    return totals
+
+
+def simulate_rank_counts(state, simulations, seed=None):
+    """
+    Returns (rank_counts, points_sum): how often each class finished at each total rank,
+    and the sum of its total points over all simulations.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    num_classes = len(state["class_ids"])
+    rank_counts = np.zeros((num_classes, num_classes), dtype=np.int64)
+    points_sum = np.zeros(num_classes, dtype=np.int64)
+
+    done = 0
+    while done < simulations:
+        batch = min(BATCH_SIZE, simulations - done)
+        totals = _simulate_batch(state, batch, rng)
+        # get_total_rankings と同じく、同点の場合はクラスIDの順 (安定ソート)
+        order = np.argsort(-totals, axis=1, kind="stable")
+        ranks = np.empty_like(order)
+        ranks[np.arange(batch)[:, None], order] = np.arange(num_classes)
+        flat = np.arange(num_classes)[None, :] * num_classes + ranks
+        rank_counts += np.bincount(flat.ravel(), minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+        points_sum += totals.sum(axis=0)
+        done += batch
+
+    return rank_counts, points_sum
+
+
+def project_total_rankings(db: Session, simulations: int = 10000, workers: int = 1, seed=None, tie_rate=None):
+    """
+    Monte Carlo projection of the final total ranking. Remaining league matches are decided
+    by the per-sport tie rate and otherwise 50/50, tournament matches are 50/50, and the
+    results are scored with the same points maps as get_total_rankings.
+    """
+    import numpy as np
+
+    state = load_projection_state(db, tie_rate=tie_rate)
+    num_classes = len(state["class_ids"])
+    if num_classes == 0:
+        return {"simulations": simulations, "classes": []}
+
+    workers = max(1, min(workers, MAX_WORKERS, simulations))
+    if workers == 1:
+        rank_counts, points_sum = simulate_rank_counts(state, simulations, seed)
+    else:
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        chunks = [simulations // workers + (1 if i < simulations % workers else 0) for i in range(workers)]
+        results = list(_executor().map(simulate_rank_counts, [state] * workers, chunks, seeds))
+        rank_counts = sum(counts for counts, _ in results)
+        points_sum = sum(points for _, points in results)
+
+    classes = []
+    for i in range(num_classes):
+        classes.append({
+            "class_id": state["class_ids"][i],
+            "class_name": state["class_names"][i],
+            "expected_total_points": float(points_sum[i]) / simulations,
+            "rank_probabilities": (rank_counts[i] / simulations).tolist(),
+        })
+    classes.sort(key=lambda c: c["expected_total_points"], reverse=True)
+    return {"simulations": simulations, "classes": classes}
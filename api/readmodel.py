@@ -0,0 +1,275 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+import models, services, sharedmodel
+
+# 書き込みが途切れてから再計算を始めるまでの待ち時間 (秒)。連続した入力は1回の再計算にまとめる
+DEBOUNCE = float(os.environ.get("TOKUTEN_RECOMPUTE_DEBOUNCE", "0.2"))
+# 書き込みが続いても、最初の通知からこの時間 (秒) が経てば再計算する
+MAX_DELAY = float(os.environ.get("TOKUTEN_RECOMPUTE_MAX_DELAY", "2.0"))
+# 他のプロセス (別のワーカー・スクリプト) の書き込みを見つけるために change_log を確認する間隔 (秒)
+POLL_INTERVAL = float(os.environ.get("TOKUTEN_RECOMPUTE_POLL_INTERVAL", "1.0"))
+# 前回からこれより多くの変更があれば、変わった種目を調べずに全種目を再計算する
+MAX_LOG_ENTRIES = 1000
+
+logger = logging.getLogger(__name__)
+
+ALL_SPORTS = None
+
+
+class Snapshot:
+    """Derived state of one database, published as a whole and never modified afterwards."""
+    __slots__ = ("version", "computed_at", "seq", "standings", "total_rankings")
+
+    def __init__(self, version, standings, total_rankings, seq=0):
+        self.version = version
+        self.computed_at = time.time()
+        self.seq = seq # 反映済みの change_log の位置
+        self.standings = standings # (sport, league) -> 順位表
+        self.total_rankings = total_rankings
+
+
+def build_snapshot(db: Session, previous: Snapshot = None, sports=ALL_SPORTS, seq=0):
+    """
+    Recomputes the standings of `sports` (every sport when None, reusing the rest from `previous`)
+    and the total ranking, all from one session, as of change_log entry `seq`. Only leagues that
+    have data get an entry; lookups of the others are empty. Tournament brackets are not derived
+    data and are read from memstore.
+    """
+    if previous is None or sports is ALL_SPORTS:
+        standings = {}
+        computed = services.calculate_all_league_standings(db)
+    else:
+        sports = set(sports)
+        standings = {key: table for key, table in previous.standings.items() if key[0] not in sports}
+        # 1種目だけの変更ならその種目、それ以外は全リーグを1回の集計クエリで求める
+        if len(sports) == 1:
+            computed = services.calculate_all_league_standings(db, sport=next(iter(sports)))
+        else:
+            computed = {key: table for key, table in services.calculate_all_league_standings(db).items() if key[0] in sports}
+    standings.update(computed)
+    num_classes = db.query(models.SchoolClass).count()
+    total_rankings = services.get_total_rankings(db, skip=0, limit=num_classes)
+    return Snapshot((previous.version + 1) if previous else 1, standings, total_rankings, seq)
+
+
+# 行の種目が分かるテーブル。それ以外 (クラス名・カタログ) の変更は全種目に影響する
+SPORT_TABLES = {model.__tablename__: model for model in (models.LeagueMatch, models.TournamentMatch, models.LeagueTeam)}
+
+
+def last_seq(db):
+    return db.execute(select(func.max(models.ChangeLog.seq))).scalar() or 0
+
+
+def changed_sports(db: Session, since, until):
+    """
+    The sports whose rows change_log records as written after `since` (up to `until`), or
+    ALL_SPORTS when that cannot be told: classes or the catalog changed, a row is gone, too much
+    changed, or the entries have already been pruned.
+    """
+    log = models.ChangeLog.__table__
+    entries = db.execute(
+        select(log.c.seq, log.c.table_name, log.c.row_id).where(log.c.seq > since, log.c.seq <= until)
+        .order_by(log.c.seq).limit(MAX_LOG_ENTRIES + 1)
+    ).all()
+    if not entries:
+        return frozenset()
+    # 番号は1ずつ増えるので、最初の番号が続いていなければ古い記録が既に削除されている
+    if entries[0].seq != since + 1 or len(entries) > MAX_LOG_ENTRIES:
+        return ALL_SPORTS
+    ids = defaultdict(set)
+    for entry in entries:
+        if entry.table_name not in SPORT_TABLES:
+            return ALL_SPORTS
+        ids[SPORT_TABLES[entry.table_name]].add(entry.row_id)
+    sports = set()
+    for model, row_ids in ids.items():
+        rows = db.execute(select(model.id, model.sport).where(model.id.in_(row_ids))).all()
+        # 削除された行は元の種目が分からない
+        if len(rows) < len(row_ids):
+            return ALL_SPORTS
+        sports.update(sport for _, sport in rows)
+    return frozenset(sports)
+
+
+class Recomputer:
+    """
+    Background thread that keeps a Snapshot per database. Writers report what they changed with
+    mark_dirty; bursts are debounced and the affected parts are recomputed off the request path,
+    then the new snapshot replaces the old one in a single assignment. When idle, the thread
+    checks change_log of every known database every `poll_interval` seconds, so writes of other
+    workers and of the command-line scripts are picked up too; the sports to recompute are read
+    from the log entries since the snapshot's `seq`. For file-backed databases the snapshot is
+    published as the next generation of the shared file (see sharedmodel) that every worker maps,
+    instead of being kept in this process, and a worker finding the shared snapshot already past
+    the log skips its own recompute.
+    """
+
+    def __init__(self, debounce=DEBOUNCE, max_delay=MAX_DELAY, poll_interval=POLL_INTERVAL):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.recomputations = 0
+        self._snapshots = {}
+        self._engines = {}
+        self._pending = {}
+        self._first_notified = None
+        self._last_notified = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def start(self):
+        with self._cond:
+            self._stopping = False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="readmodel-recompute", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def mark_dirty(self, engine, sports=ALL_SPORTS):
+        key = str(engine.url)
+        with self._cond:
+            self._engines[key] = engine
+            if sports is ALL_SPORTS or self._pending.get(key, ()) is ALL_SPORTS:
+                self._pending[key] = ALL_SPORTS
+            else:
+                self._pending[key] = self._pending.get(key, frozenset()) | frozenset(sports)
+            now = time.monotonic()
+            self._first_notified = self._first_notified or now
+            self._last_notified = now
+            self._cond.notify_all()
+
+    def get(self, engine):
+        mapped = sharedmodel.model.get(engine)
+        return mapped if mapped is not None else self._snapshots.get(str(engine.url))
+
+    def stats(self):
+        with self._cond:
+            return {
+                "recomputations": self.recomputations,
+                "snapshots": {key: snapshot.version for key, snapshot in self._snapshots.items()},
+                "pending": len(self._pending),
+                "shared": sharedmodel.model.stats(),
+            }
+
+    def _take_pending(self):
+        """
+        Waits for notifications to go quiet for `debounce` seconds (at most `max_delay`). Returns
+        an empty list when nothing was notified within `poll_interval`, and None when stopping.
+        """
+        with self._cond:
+            if not self._pending and not self._stopping:
+                self._cond.wait(self.poll_interval)
+            if not self._pending and not self._stopping:
+                return []
+            while not self._stopping:
+                now = time.monotonic()
+                remaining = min(self._last_notified + self.debounce, self._first_notified + self.max_delay) - now
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._stopping:
+                return None
+            pending, self._pending = self._pending, {}
+            self._first_notified = self._last_notified = None
+            return [(self._engines[key], sports) for key, sports in pending.items()]
+
+    def _poll(self):
+        """Marks the databases whose change_log has moved past their snapshot."""
+        with self._cond:
+            engines = list(self._engines.values())
+        for engine in engines:
+            try:
+                with engine.connect() as conn:
+                    seq = last_seq(conn)
+                snapshot = self.get(engine)
+                if snapshot is None or snapshot.seq < seq:
+                    # 何が変わったかは再計算のときに change_log から調べる
+                    self.mark_dirty(engine, frozenset())
+            except Exception:
+                logger.exception("read model poll failed for %s", engine.url)
+
+    def _recompute(self, engine, sports):
+        key = str(engine.url)
+        db = models.SessionLocal(bind=engine)
+        try:
+            # 他のワーカーの新しい世代を上書きしないよう、前の世代の読み込みから書き出しまでを排他する
+            with sharedmodel.model.writing(engine):
+                previous = self.get(engine)
+                # 先に change_log の位置を読むので、その後の書き込みは次の確認で再計算される
+                seq = last_seq(db)
+                if previous is not None and previous.seq >= seq:
+                    # 他のワーカーが既にここまでの変更を反映している
+                    return
+                if previous is not None and sports is not ALL_SPORTS:
+                    changed = changed_sports(db, previous.seq, seq)
+                    sports = ALL_SPORTS if changed is ALL_SPORTS else sports | changed
+                snapshot = build_snapshot(db, previous, sports, seq)
+                if sharedmodel.model.publish(engine, snapshot):
+                    self._snapshots.pop(key, None)
+                else:
+                    self._snapshots[key] = snapshot
+            self.recomputations += 1
+        except Exception:
+            logger.exception("read model recompute failed for %s", key)
+        finally:
+            db.close()
+
+    def _run(self):
+        while True:
+            pending = self._take_pending()
+            if pending is None:
+                return
+            if not pending:
+                self._poll()
+            for engine, sports in pending:
+                self._recompute(engine, sports)
+
+
+worker = Recomputer()
+
+
+def primary_engine(db: Session):
+    """The database a request's session stands for (its primary, even when reading the replica)."""
+    return db.info.get("primary") or db.get_bind()
+
+
+@event.listens_for(models.SessionLocal, "after_flush")
+def _collect_sports(session, flush_context):
+    sports = session.info.setdefault("readmodel_sports", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (models.LeagueMatch, models.TournamentMatch, models.LeagueTeam)) and obj.sport is not None:
+            sports.add(obj.sport)
+        elif isinstance(obj, models.SchoolClass):
+            # クラス名は全種目の順位表に含まれる
+            session.info["readmodel_all"] = True
+
+
+@event.listens_for(models.SessionLocal, "after_commit")
+def _notify_commit(session):
+    # SAVEPOINT の確定ではまだコミットされていない。取り消しでは集めた種目を残す (余分に再計算するだけ)
+    if session.in_nested_transaction():
+        return
+    sports = session.info.pop("readmodel_sports", None)
+    everything = session.info.pop("readmodel_all", False)
+    # ORMを通さない一括更新・削除で分からなかった種目は、再計算のときに change_log から調べる
+    worker.mark_dirty(session.get_bind(), ALL_SPORTS if everything else sports or frozenset())
+
+
+@event.listens_for(models.SessionLocal, "after_rollback")
+def _discard(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("readmodel_sports", None)
+    session.info.pop("readmodel_all", None)
@@ -0,0 +1,138 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from sqlalchemy import create_engine, event
+import models
+
+# TOKUTEN_READ_REPLICA=1 のとき、認証なしのGETはコミット後に更新される読み取り専用の複製から読む
+ENABLED = os.environ.get("TOKUTEN_READ_REPLICA") == "1"
+# 書き込みから複製の更新までの待ち時間 (秒)。この間の書き込みはまとめて1回で反映される
+DEBOUNCE = float(os.environ.get("TOKUTEN_REPLICA_DEBOUNCE", "0.5"))
+# 複製がこれより古い場合は本体のDBから読む (秒)
+MAX_STALENESS = float(os.environ.get("TOKUTEN_REPLICA_MAX_STALENESS", "2.0"))
+
+logger = logging.getLogger(__name__)
+
+_replicas = {}
+_registry_lock = threading.Lock()
+
+
+class Replica:
+    """
+    A read-only copy of one SQLite database file, refreshed with SQLite's online backup API
+    shortly after committed writes (debounced, so a burst of writes costs one copy).
+    `staleness()` is the age in seconds of the oldest commit the copy does not contain yet.
+    """
+
+    def __init__(self, primary, path, debounce=DEBOUNCE, max_staleness=MAX_STALENESS):
+        self.primary = primary
+        self.path = path
+        self.debounce = debounce
+        self.max_staleness = max_staleness
+        self.refresh_count = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._timer = None
+        self._dirty_since = None
+        self._inflight_since = None
+        self.refresh()
+        self.engine = create_engine(f"sqlite:///file:{path}?mode=ro&uri=true", connect_args={"timeout": 5})
+
+    def mark_dirty(self):
+        with self._lock:
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce, self._refresh_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def staleness(self):
+        with self._lock:
+            pending = [t for t in (self._dirty_since, self._inflight_since) if t is not None]
+        return time.monotonic() - min(pending) if pending else 0.0
+
+    def refresh(self):
+        """Copies the primary database into the replica file; commits made meanwhile stay pending."""
+        with self._refresh_lock:
+            with self._lock:
+                self._timer = None
+                self._inflight_since, self._dirty_since = self._dirty_since, None
+            source = self.primary.raw_connection()
+            try:
+                target = sqlite3.connect(self.path)
+                try:
+                    source.driver_connection.backup(target)
+                finally:
+                    target.close()
+            except Exception:
+                with self._lock:
+                    # 失敗した分は次の書き込み (または次回の更新) で再度反映する
+                    if self._inflight_since is not None:
+                        self._dirty_since = min(t for t in (self._dirty_since, self._inflight_since) if t is not None)
+                    self._inflight_since = None
+                raise
+            finally:
+                source.close()
+            with self._lock:
+                self._inflight_since = None
+            self.refresh_count += 1
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("read replica refresh failed for %s", self.path)
+
+
+def replica_path(engine):
+    database = engine.url.database
+    root, ext = os.path.splitext(os.path.abspath(database))
+    return f"{root}.replica{ext or '.db'}"
+
+
+def attach(engine):
+    """Starts keeping a replica of a file-backed SQLite engine; returns None when disabled or in-memory."""
+    if not ENABLED or not engine.url.database or engine.url.database == ":memory:":
+        return None
+    path = replica_path(engine)
+    with _registry_lock:
+        replica = _replicas.get(path)
+        if replica is not None:
+            replica.primary = engine
+            return replica
+        replica = _replicas[path] = Replica(engine, path)
+    return replica
+
+
+def for_engine(engine):
+    if not ENABLED or not engine.url.database:
+        return None
+    return _replicas.get(replica_path(engine))
+
+
+@event.listens_for(models.SessionLocal, "after_commit")
+def _schedule_refresh(session):
+    if session.in_nested_transaction():
+        return
+    replica = for_engine(session.get_bind())
+    if replica is not None:
+        replica.mark_dirty()
+
+
+def read_session(engine):
+    """
+    A session on the engine's replica when it exists and is fresh enough, otherwise None. The
+    staleness at open time is stored in `session.info["replica_staleness"]`.
+    """
+    replica = for_engine(engine)
+    if replica is None:
+        return None
+    staleness = replica.staleness()
+    if staleness > replica.max_staleness:
+        return None
+    db = models.SessionLocal(bind=replica.engine)
+    db.info["replica_staleness"] = staleness
+    return db
@@ -0,0 +1,173 @@
+import csv
+import html
+import io
+from collections import defaultdict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+import models, services, sportcatalog
+
+FORMATS = ("text", "csv", "html")
+
+
+def load_report_data(db: Session):
+    """
+    Loads everything the match summary needs with one query per table.
+    No ORM objects are built, so nothing is lazy-loaded while printing.
+    """
+    classes = dict(db.execute(select(models.SchoolClass.id, models.SchoolClass.name)).all())
+
+    teams = defaultdict(list)
+    for sport, league, class_id in db.execute(select(models.LeagueTeam.sport, models.LeagueTeam.league, models.LeagueTeam.class_id)):
+        teams[(sport, league)].append(class_id)
+
+    matches = defaultdict(list)
+    league_table = models.LeagueMatch.__table__
+    for row in db.execute(select(league_table).order_by(league_table.c.id)):
+        matches[(row.sport, row.league)].append(row)
+
+    return {"classes": classes, "teams": teams, "matches": matches, "catalog": sportcatalog.for_session(db)}
+
+
+def iter_leagues(data):
+    """
+    Yields (sport, leagues) for every sport of the catalog, where leagues lists (league, records,
+    finished_matches) of the sport's leagues with teams.
+    """
+    catalog = data["catalog"]
+    leagues_by_sport = defaultdict(list)
+    for sport, league in sorted(data["teams"], key=lambda key: catalog.order(*key)):
+        leagues_by_sport[sport].append(league)
+    for sport in sorted(catalog.sports.keys() | leagues_by_sport.keys(), key=catalog.order):
+        # '臨時得点'などサマリーに含めない種目は除外
+        if not catalog.sport(sport).in_reports:
+            continue
+        leagues = []
+        for league in leagues_by_sport[sport]:
+            team_ids = data["teams"][(sport, league)]
+            records = {cid: {"wins": 0, "losses": 0, "ties": 0, "name": data["classes"].get(cid, "")} for cid in team_ids}
+            finished = [m for m in data["matches"].get((sport, league), []) if m.is_finished]
+            for match in finished:
+                score1 = match.class1_score if match.class1_score is not None else 0
+                score2 = match.class2_score if match.class2_score is not None else 0
+                for cid in (match.class1_id, match.class2_id):
+                    records.setdefault(cid, {"wins": 0, "losses": 0, "ties": 0, "name": data["classes"].get(cid, "")})
+                if score1 > score2:
+                    records[match.class1_id]["wins"] += 1
+                    records[match.class2_id]["losses"] += 1
+                elif score2 > score1:
+                    records[match.class2_id]["wins"] += 1
+                    records[match.class1_id]["losses"] += 1
+                else:
+                    records[match.class1_id]["ties"] += 1
+                    records[match.class2_id]["ties"] += 1
+            leagues.append((league, sorted(records.values(), key=lambda r: r["name"]), finished))
+        yield sport, leagues
+
+
+def league_standings(data, sport, league):
+    points_map = data["catalog"].sport(sport).league_points
+    return services.compute_league_standings(data["matches"].get((sport, league), []), data["classes"], points_map)
+
+
+def iter_text(data, standings=False):
+    names = data["classes"]
+    yield "=" * 40 + "\n"
+    yield "== 全種目の試合結果サマリー ==\n"
+    yield "=" * 40 + "\n\n"
+
+    for sport, leagues in iter_leagues(data):
+        yield f"--- {sport} ---\n"
+        yield "\n[リーグ戦]\n"
+        if not leagues:
+            yield "  まだ試合がありません。\n"
+        for league, records, finished in leagues:
+            yield f"\n  - {league}リーグ -\n"
+            yield "    [勝敗表]\n"
+            for record in records:
+                yield f"      {record['name']}: {record['wins']}勝 {record['losses']}敗 {record['ties']}分\n"
+
+            yield "\n    [試合結果]\n"
+            if not finished:
+                yield "      まだ完了した試合がありません。\n"
+            for match in finished:
+                yield f"      - {names.get(match.class1_id, '')} vs {names.get(match.class2_id, '')}  ->  {match.class1_score} - {match.class2_score}\n"
+
+            if standings:
+                yield "\n    [順位表]\n"
+                for s in league_standings(data, sport, league):
+                    yield f"      {s['rank']}位 {s['class_name']}  勝ち点 {s['points']}  セット {s['sets_won_points']}  総合ポイント {s['league_points']}\n"
+
+        yield "\n" + "=" * 30 + "\n\n"
+
+
+CSV_COLUMNS = ["section", "sport", "league", "rank", "class1", "class2", "wins", "losses", "ties",
+               "class1_score", "class2_score", "points", "league_points"]
+
+
+def iter_csv(data, standings=False):
+    """One CSV with a `section` column: record (win/loss table), match (finished match) and standing."""
+    names = data["classes"]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value
+
+    writer.writeheader()
+    yield flush()
+    for sport, leagues in iter_leagues(data):
+        for league, records, finished in leagues:
+            base = {"sport": sport, "league": league}
+            for record in records:
+                writer.writerow({**base, "section": "record", "class1": record["name"],
+                                 "wins": record["wins"], "losses": record["losses"], "ties": record["ties"]})
+            for match in finished:
+                writer.writerow({**base, "section": "match", "class1": names.get(match.class1_id, ""), "class2": names.get(match.class2_id, ""),
+                                 "class1_score": match.class1_score, "class2_score": match.class2_score})
+            if standings:
+                for s in league_standings(data, sport, league):
+                    writer.writerow({**base, "section": "standing", "rank": s["rank"], "class1": s["class_name"],
+                                     "wins": s["wins"], "losses": s["losses"], "ties": s["ties"],
+                                     "points": s["points"], "league_points": s["league_points"]})
+            yield flush()
+
+
+def iter_html(data, standings=False):
+    names = data["classes"]
+    e = html.escape
+    yield "<!DOCTYPE html>\n<html lang=\"ja\">\n<head><meta charset=\"utf-8\"><title>全種目の試合結果サマリー</title></head>\n<body>\n"
+    yield "<h1>全種目の試合結果サマリー</h1>\n"
+    for sport, leagues in iter_leagues(data):
+        yield f"<h2>{e(sport)}</h2>\n"
+        if not leagues:
+            yield "<p>まだ試合がありません。</p>\n"
+        for league, records, finished in leagues:
+            yield f"<h3>{e(league)}リーグ</h3>\n<table>\n<tr><th>クラス</th><th>勝</th><th>敗</th><th>分</th></tr>\n"
+            for record in records:
+                yield f"<tr><td>{e(record['name'])}</td><td>{record['wins']}</td><td>{record['losses']}</td><td>{record['ties']}</td></tr>\n"
+            yield "</table>\n"
+            if finished:
+                yield "<table>\n<tr><th>対戦</th><th>スコア</th></tr>\n"
+                for match in finished:
+                    yield (f"<tr><td>{e(names.get(match.class1_id, ''))} vs {e(names.get(match.class2_id, ''))}</td>"
+                           f"<td>{match.class1_score} - {match.class2_score}</td></tr>\n")
+                yield "</table>\n"
+            else:
+                yield "<p>まだ完了した試合がありません。</p>\n"
+            if standings:
+                yield "<table>\n<tr><th>順位</th><th>クラス</th><th>勝ち点</th><th>セット</th><th>総合ポイント</th></tr>\n"
+                for s in league_standings(data, sport, league):
+                    yield (f"<tr><td>{s['rank']}</td><td>{e(s['class_name'])}</td><td>{s['points']}</td>"
+                           f"<td>{s['sets_won_points']}</td><td>{s['league_points']}</td></tr>\n")
+                yield "</table>\n"
+    yield "</body>\n</html>\n"
+
+
+RENDERERS = {"text": iter_text, "csv": iter_csv, "html": iter_html}
+
+
+def iter_report(db: Session, fmt: str = "text", standings: bool = False):
+    return RENDERERS[fmt](load_report_data(db), standings=standings)
@@ -0,0 +1,172 @@
+import random
+from collections import defaultdict
+from sqlalchemy.orm import Session
+import models, schemas
+from fastapi import HTTPException
+
+
+def _format_time(start_time: str, minutes: int):
+    hours, mins = (int(part) for part in start_time.split(":"))
+    total = hours * 60 + mins + minutes
+    return f"{total // 60 % 24:02d}:{total % 60:02d}"
+
+
+def lower_bound(fixtures, courts, rest_slots):
+    """
+    No timetable can be shorter than the busiest sport (matches / courts) or the busiest
+    class (its matches plus the rest gaps between them).
+    """
+    per_sport = defaultdict(int)
+    per_class = defaultdict(int)
+    for _, sport, class1_id, class2_id in fixtures:
+        per_sport[sport] += 1
+        per_class[class1_id] += 1
+        per_class[class2_id] += 1
+    sport_bound = max((-(-count // courts[sport]) for sport, count in per_sport.items()), default=0)
+    class_bound = max((count + (count - 1) * rest_slots for count in per_class.values()), default=0)
+    return max(sport_bound, class_bound)
+
+
+def _greedy_schedule(fixtures, courts, rest_slots, rng=None):
+    """
+    List scheduling, one time slot at a time. Every match whose classes are rested is a
+    candidate; candidates are taken in order of the longest remaining chain they belong to
+    (the class with the most matches left, or the sport with the most matches per court),
+    as long as the sport still has a free court and neither class already plays in that slot.
+    """
+    remaining_per_class = defaultdict(int)
+    remaining_per_sport = defaultdict(int)
+    for _, sport, class1_id, class2_id in fixtures:
+        remaining_per_class[class1_id] += 1
+        remaining_per_class[class2_id] += 1
+        remaining_per_sport[sport] += 1
+
+    next_free = defaultdict(int)
+    unscheduled = list(range(len(fixtures)))
+    noise = [rng.random() if rng else 0.0 for _ in fixtures]
+    assignments = {}
+    slot = 0
+
+    while unscheduled:
+        def priority(i):
+            _, sport, class1_id, class2_id = fixtures[i]
+            class_chain = max(remaining_per_class[class1_id], remaining_per_class[class2_id]) * (rest_slots + 1)
+            sport_chain = remaining_per_sport[sport] / courts[sport]
+            return (-max(class_chain, sport_chain), -min(remaining_per_class[class1_id], remaining_per_class[class2_id]), noise[i], i)
+
+        ready = [i for i in unscheduled if next_free[fixtures[i][2]] <= slot and next_free[fixtures[i][3]] <= slot]
+        ready.sort(key=priority)
+
+        used_courts = defaultdict(int)
+        busy = set()
+        placed = set()
+        for i in ready:
+            match_id, sport, class1_id, class2_id = fixtures[i]
+            if used_courts[sport] >= courts[sport] or class1_id in busy or class2_id in busy:
+                continue
+            used_courts[sport] += 1
+            busy.add(class1_id)
+            busy.add(class2_id)
+            placed.add(i)
+            assignments[match_id] = (slot, used_courts[sport])
+
+        for i in placed:
+            _, sport, class1_id, class2_id = fixtures[i]
+            next_free[class1_id] = slot + 1 + rest_slots
+            next_free[class2_id] = slot + 1 + rest_slots
+            remaining_per_class[class1_id] -= 1
+            remaining_per_class[class2_id] -= 1
+            remaining_per_sport[sport] -= 1
+        if placed:
+            unscheduled = [i for i in unscheduled if i not in placed]
+        slot += 1
+
+    total_slots = max((s for s, _ in assignments.values()), default=-1) + 1
+    return total_slots, assignments
+
+
+def build_schedule(fixtures, courts, rest_slots, iterations=20, seed=0):
+    """
+    Runs the greedy scheduler once deterministically and then with randomized tie-breaks,
+    keeping the shortest timetable. Stops early when the lower bound is reached.
+    """
+    bound = lower_bound(fixtures, courts, rest_slots)
+    best_slots, best = _greedy_schedule(fixtures, courts, rest_slots)
+    rng = random.Random(seed)
+    for _ in range(iterations):
+        if best_slots <= bound:
+            break
+        total_slots, assignments = _greedy_schedule(fixtures, courts, rest_slots, rng)
+        if total_slots < best_slots:
+            best_slots, best = total_slots, assignments
+    return best_slots, bound, best
+
+
+def generate_schedule(config: schemas.ScheduleConfig, db: Session):
+    """Builds a conflict-free timetable for the league matches and replaces the stored one."""
+    try:
+        _format_time(config.start_time, 0)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="start_time must be in HH:MM format.")
+
+    query = db.query(models.LeagueMatch)
+    if not config.include_finished:
+        query = query.filter(models.LeagueMatch.is_finished == False)
+    matches = query.order_by(models.LeagueMatch.id).all()
+    fixtures = [(m.id, m.sport, m.class1_id, m.class2_id) for m in matches if m.class1_id and m.class2_id]
+    if not fixtures:
+        raise HTTPException(status_code=404, detail="No matches to schedule.")
+
+    courts = defaultdict(lambda: 1)
+    courts.update(config.courts)
+
+    total_slots, bound, assignments = build_schedule(fixtures, courts, config.rest_slots, iterations=config.iterations)
+    if config.max_slots is not None and total_slots > config.max_slots:
+        raise HTTPException(
+            status_code=422,
+            detail=f"The matches need {total_slots} time slots but only {config.max_slots} are available.",
+        )
+
+    db.query(models.ScheduleEntry).delete(synchronize_session=False)
+    db.bulk_insert_mappings(models.ScheduleEntry, [
+        {
+            "league_match_id": match_id,
+            "court": court,
+            "slot": slot,
+            "start_time": _format_time(config.start_time, slot * config.slot_minutes),
+        }
+        for match_id, (slot, court) in assignments.items()
+    ])
+    db.commit()
+    return get_schedule(db, total_slots=total_slots, bound=bound)
+
+
+def get_schedule(db: Session, sport: str = None, class_id: int = None, total_slots=None, bound=None):
+    query = db.query(models.ScheduleEntry, models.LeagueMatch).join(
+        models.LeagueMatch, models.ScheduleEntry.league_match_id == models.LeagueMatch.id
+    )
+    if sport is not None:
+        query = query.filter(models.LeagueMatch.sport == sport)
+    if class_id is not None:
+        query = query.filter((models.LeagueMatch.class1_id == class_id) | (models.LeagueMatch.class2_id == class_id))
+    rows = query.order_by(models.ScheduleEntry.slot, models.LeagueMatch.sport, models.ScheduleEntry.court).all()
+    class_names = dict(db.query(models.SchoolClass.id, models.SchoolClass.name).all())
+
+    entries = []
+    for entry, match in rows:
+        entries.append({
+            "match_id": match.id,
+            "sport": match.sport,
+            "league": match.league,
+            "court": entry.court,
+            "slot": entry.slot,
+            "start_time": entry.start_time,
+            "class1_id": match.class1_id,
+            "class1_name": class_names.get(match.class1_id, ""),
+            "class2_id": match.class2_id,
+            "class2_name": class_names.get(match.class2_id, ""),
+            "is_finished": bool(match.is_finished),
+        })
+    if total_slots is None:
+        total_slots = max((e["slot"] for e in entries), default=-1) + 1
+    return {"total_slots": total_slots, "lower_bound": bound, "matches": entries}
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Optional
-from models import SportName, LeagueName
+from pydantic import BaseModel, conint, constr
+from datetime import datetime
+from typing import Dict, List, Literal, Optional
 
 class SchoolClassBase(BaseModel):
     name: str
@@ -17,8 +17,8 @@ class SchoolClass(SchoolClassBase):
 
 # --- リーグ所属チーム ---
 class LeagueTeamBase(BaseModel):
-    sport: SportName
-    league: LeagueName
+    sport: str
+    league: str
     class_id: int
 
 class LeagueTeamCreate(LeagueTeamBase):
@@ -33,15 +33,15 @@ class LeagueTeam(LeagueTeamBase):
 
 
 class LeagueTeamDelete(BaseModel):
-    sport: SportName
-    league: LeagueName
+    sport: str
+    league: str
     class_id: int
 
 
 # --- 予選リーグの試合結果 ---
 class LeagueMatchBase(BaseModel):
-    sport: SportName
-    league: LeagueName
+    sport: str
+    league: str
     class1_id: int
     class2_id: int
     class1_score: Optional[int] = 0
@@ -59,6 +59,7 @@ class LeagueMatch(LeagueMatchBase):
     class1: SchoolClass
     class2: SchoolClass
     winner: Optional[SchoolClass] = None
+    version: int
 
     class Config:
         orm_mode = True
@@ -79,7 +80,7 @@ class LeagueStanding(BaseModel):
 
 # 結晶
 class TournamentMatchBase(BaseModel):
-    sport: SportName
+    sport: str
     match_name: str
 
 class TournamentMatchCreate(TournamentMatchBase):
@@ -96,6 +97,7 @@ class TournamentMatch(TournamentMatchBase):
     class1_sets_won: Optional[int] = None
     class2_sets_won: Optional[int] = None
     is_finished: bool
+    version: int
 
     class Config:
         orm_mode = True
@@ -106,6 +108,7 @@ class TournamentMatchUpdate(BaseModel):
     class2_score: Optional[int] = None
     class1_sets_won: Optional[int] = None
     class2_sets_won: Optional[int] = None
+    version: Optional[int] = None # 指定した場合、その版数から変更されていなければ更新する (変更されていたら 409)
 
 class TotalRanking(BaseModel):
     rank: int
@@ -120,4 +123,172 @@ class LeagueMatchUpdate(BaseModel):
     class2_score: int
     class1_sets_won: int
     class2_sets_won: int
-    winner_id: Optional[int] = None
\ No newline at end of file
+    winner_id: Optional[int] = None
+    version: Optional[int] = None # 指定した場合、その版数から変更されていなければ更新する (変更されていたら 409)
+
+# --- 優勝・進出の確定判定 ---
+class ClinchStatus(BaseModel):
+    class_id: int
+    class_name: str
+    points: int
+    max_points: int
+    remaining_matches: int
+    clinched_first: bool
+    eliminated_first: bool
+    clinched_tournament: bool
+    eliminated_tournament: bool
+
+class LeagueClinch(BaseModel):
+    sport: str
+    league: str
+    tournament_slots: int
+    remaining_matches: int
+    teams: List[ClinchStatus]
+
+# --- 総合順位の予測 ---
+class RankProjection(BaseModel):
+    class_id: int
+    class_name: str
+    expected_total_points: float
+    rank_probabilities: List[float]
+
+class TotalRankingProjection(BaseModel):
+    simulations: int
+    classes: List[RankProjection]
+
+# --- 時間割 ---
+class ScheduleConfig(BaseModel):
+    courts: Dict[str, conint(ge=1)] = {} # 種目ごとのコート数 (指定がなければ1面)
+    start_time: str = "09:00" # 最初の時間帯の開始時刻 (HH:MM)
+    slot_minutes: conint(ge=1) = 15
+    rest_slots: conint(ge=0) = 1 # 同じクラスの試合の間に空ける時間帯の数
+    max_slots: Optional[conint(ge=1)] = None
+    include_finished: bool = False
+    iterations: conint(ge=0, le=200) = 20
+
+class ScheduleEntry(BaseModel):
+    match_id: int
+    sport: str
+    league: str
+    court: int
+    slot: int
+    start_time: Optional[str] = None
+    class1_id: int
+    class1_name: str
+    class2_id: int
+    class2_name: str
+    is_finished: bool
+
+class Schedule(BaseModel):
+    total_slots: int
+    lower_bound: Optional[int] = None
+    matches: List[ScheduleEntry]
+
+# --- クラスごとの試合・成績 ---
+class ClassMatches(BaseModel):
+    school_class: SchoolClass
+    league_matches: List[LeagueMatch]
+    tournament_matches: List[TournamentMatch]
+
+class ClassLeagueStanding(BaseModel):
+    sport: str
+    league: str
+    standing: Optional[LeagueStanding] = None # まだ試合結果が無い場合は None
+
+class ClassSummary(BaseModel):
+    school_class: SchoolClass
+    league_standings: List[ClassLeagueStanding]
+    total_ranking: Optional[TotalRanking] = None
+
+# --- 変更履歴 ---
+class ScoreEvent(BaseModel):
+    id: int
+    created_at: datetime
+    batch_id: Optional[str] = None
+    entity: str
+    entity_id: int
+    kind: str
+    payload: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+
+# --- 大会 (開催ごとのDB) ---
+class FestivalCreate(BaseModel):
+    slug: str
+    name: str
+
+class Festival(BaseModel):
+    id: int
+    slug: str
+    name: str
+    archived: bool
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+# --- 試合中のスコア速報 ---
+class LiveScoreTick(BaseModel):
+    # 現在のスコアへの加算量 (訂正は負の値)
+    class1_points: int = 0
+    class2_points: int = 0
+    class1_sets: int = 0
+    class2_sets: int = 0
+
+class LiveScoreFinish(BaseModel):
+    winner_id: Optional[int] = None # 省略時は得点の多い方 (同点なら引き分け)
+
+class LiveScore(BaseModel):
+    entity: str
+    id: int
+    sport: str
+    class1_score: int
+    class2_score: int
+    class1_sets_won: int
+    class2_sets_won: int
+    winner_id: Optional[int] = None
+    is_finished: bool
+
+# --- 種目・リーグのカタログ ---
+class SportCreate(BaseModel):
+    name: constr(min_length=1)
+    position: int = 0 # 表示順
+    kind: Literal["ball", "racket", "other"] = "ball"
+    bracket: Optional[str] = None # 決勝トーナメントの形式 ("top4" / "top8" / "none")。省略時は球技 top4、ラケット競技 top8
+    advancing: Optional[conint(ge=1)] = None # 各リーグから進出するチーム数。省略時は球技 1、ラケット競技 2
+    league_points: Optional[Dict[conint(ge=1), int]] = None # リーグ順位 -> 総合ポイント。省略時は既定の表
+    tournament_points: Optional[Dict[str, int]] = None # "優勝" / "準優勝" / "3位" / "4位" -> 総合ポイント
+    in_reports: bool = True
+
+class Sport(BaseModel):
+    name: str
+    position: int
+    kind: str
+    bracket: str
+    advancing: int
+    league_points: Dict[int, int]
+    tournament_points: Dict[str, int]
+    in_reports: bool
+
+class LeagueCreate(BaseModel):
+    name: constr(min_length=1)
+    position: int = 0
+
+class League(BaseModel):
+    name: str
+    position: int
+
+class Catalog(BaseModel):
+    sports: List[Sport]
+    leagues: List[League]
+
+# --- 管理者用のプロファイリング ---
+class ProfileRequest(BaseModel):
+    path: str # ルートのパス (例: /leagues/{sport}/{league}/standings/)
+    method: str = "GET"
+    requests: conint(ge=1, le=1000) = 10 # 計測するリクエスト数
+
+class MemoryTraceStart(BaseModel):
+    frames: conint(ge=1, le=64) = 1 # 確保元として記録するスタックの深さ
@@ -1,28 +1,102 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import not_
+from sqlalchemy.orm import Session, configure_mappers
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import not_, or_, select, func, case, union_all, bindparam
+from functools import lru_cache
 from collections import defaultdict
-import models, schemas
+import json
+import models, schemas, events, memstore, sportcatalog
 from fastapi import HTTPException
 
-def calculate_league_standings(sport: models.SportName, league: models.LeagueName, db: Session):
-    matches = db.query(models.LeagueMatch).filter(
-        models.LeagueMatch.sport == sport,
-        models.LeagueMatch.league == league
-    ).all()
-
+# 各リーグから決勝トーナメントに進むチーム数は種目ごとにカタログで決める (球技は1位のみ、ラケット競技は上位2チームが既定)
+def tournament_slots_per_league(sport: str, db: Session):
+    return sportcatalog.for_session(db).sport(sport).advancing
+
+# リーグ順位・トーナメント順位ごとの総合ポイント (種目ごとに指定がない場合の表)
+LEAGUE_POINTS_MAP = sportcatalog.DEFAULT_LEAGUE_POINTS
+TOURNAMENT_POINTS_MAP = sportcatalog.DEFAULT_TOURNAMENT_POINTS
+
+# トーナメントの勝者・敗者の進出先 (試合名, 枠)
+ADVANCEMENT_BALL = {
+    "E1 (準決勝)": {"winner_to": ("E3 (決勝)", "class1_id"), "loser_to": ("E4 (3位決定戦)", "class1_id")},
+    "E2 (準決勝)": {"winner_to": ("E3 (決勝)", "class2_id"), "loser_to": ("E4 (3位決定戦)", "class2_id")},
+}
+ADVANCEMENT_RACKET = {
+    "E1 (1回戦)": {"winner_to": ("E6 (準決勝)", "class1_id")},
+    "E2 (1回戦)": {"winner_to": ("E6 (準決勝)", "class2_id")},
+    "E3 (1回戦)": {"winner_to": ("E5 (準決勝)", "class1_id")},
+    "E4 (1回戦)": {"winner_to": ("E5 (準決勝)", "class2_id")},
+    "E5 (準決勝)": {"winner_to": ("E7 (決勝)", "class1_id"), "loser_to": ("E8 (3位決定戦)", "class1_id")},
+    "E6 (準決勝)": {"winner_to": ("E7 (決勝)", "class2_id"), "loser_to": ("E8 (3位決定戦)", "class2_id")},
+}
+
+# 決勝トーナメントの形式 (カタログの bracket 列の値) -> (1回戦の試合名, それ以降の試合名, 勝者・敗者の進出先)。
+# 1回戦の組み合わせは、カタログのリーグと種目の advancing から seed_first_round で決める
+TOURNAMENT_FORMATS = {
+    "top4": (["E1 (準決勝)", "E2 (準決勝)"], ["E3 (決勝)", "E4 (3位決定戦)"], ADVANCEMENT_BALL),
+    "top8": (["E1 (1回戦)", "E2 (1回戦)", "E3 (1回戦)", "E4 (1回戦)"], ["E5 (準決勝)", "E6 (準決勝)", "E7 (決勝)", "E8 (3位決定戦)"], ADVANCEMENT_RACKET),
+    "none": ([], [], {}),
+}
+
+def seed_first_round(leagues: list, advancing: int, num_matches: int):
+    """
+    The ((league, rank), (league, rank)) pairs of the first round, in match order, or None when
+    `advancing` teams from each of `leagues` do not fill exactly `num_matches` matches. With one
+    team per league, neighbouring leagues meet; with two, each league winner meets the runner-up
+    of the next league, and winners of neighbouring leagues start in opposite halves, so teams
+    of the same league can only meet in the final. A-D gives the traditional layouts.
+    """
+    if len(leagues) * advancing != num_matches * 2:
+        return None
+    if advancing == 1:
+        return [((leagues[i], 1), (leagues[i + 1], 1)) for i in range(0, len(leagues), 2)]
+    if advancing == 2:
+        order = list(range(0, len(leagues), 2)) + list(range(1, len(leagues), 2))
+        return [((leagues[i], 1), (leagues[(i + 1) % len(leagues)], 2)) for i in order]
+    return None
+
+def _tournament_format(sport: str, db: Session):
+    return TOURNAMENT_FORMATS.get(sportcatalog.for_session(db).sport(sport).bracket, TOURNAMENT_FORMATS["none"])
+
+def bracket_for(sport: str, db: Session):
+    """
+    The (match name, class1 seed, class2 seed) rows of the sport's bracket, a seed being a
+    (league, rank) or None for later rounds. [] when the sport has no tournament, None when the
+    catalog's leagues and the sport's `advancing` cannot seed its format.
+    """
+    first_round, later_rounds, _ = _tournament_format(sport, db)
+    if not first_round:
+        return []
+    catalog = sportcatalog.for_session(db)
+    seeds = seed_first_round(catalog.leagues, catalog.sport(sport).advancing, len(first_round))
+    if seeds is None:
+        return None
+    return [(name, slot1, slot2) for name, (slot1, slot2) in zip(first_round, seeds)] + [(name, None, None) for name in later_rounds]
+
+def advancement_map_for(sport: str, db: Session):
+    return _tournament_format(sport, db)[2]
+
+def calculate_league_standings(sport: str, league: str, db: Session):
+    return calculate_all_league_standings(db, sport=sport, league=league).get((sport, league), [])
+
+def compute_league_standings(matches, class_names: dict, points_map: dict = LEAGUE_POINTS_MAP):
+    """
+    Standings for one league from its matches (ORM objects or rows with the LeagueMatch columns)
+    and an id -> name map. Matches whose classes are unknown are ignored.
+    """
     stats = defaultdict(lambda: {"points": 0, "wins": 0, "losses": 0, "ties": 0, "sets_won": 0, "class_name": ""})
     
     all_class_ids = set()
     for match in matches:
-        if not match.class1 or not match.class2:
+        if match.class1_id not in class_names or match.class2_id not in class_names:
             continue
         all_class_ids.add(match.class1_id)
         all_class_ids.add(match.class2_id)
         
         if not stats[match.class1_id]["class_name"]:
-            stats[match.class1_id]["class_name"] = match.class1.name
+            stats[match.class1_id]["class_name"] = class_names[match.class1_id]
         if not stats[match.class2_id]["class_name"]:
-            stats[match.class2_id]["class_name"] = match.class2.name
+            stats[match.class2_id]["class_name"] = class_names[match.class2_id]
             
         if match.is_finished:
             score1 = match.class1_score if match.class1_score is not None else 0
@@ -47,6 +121,21 @@ def calculate_league_standings(sport: models.SportName, league: models.LeagueNam
             if match.class2_sets_won is not None:
                 stats[match.class2_id]["sets_won"] += match.class2_sets_won
 
+    head_to_head = _head_to_head((m.class1_id, m.class2_id, m.winner_id) for m in matches if m.is_finished)
+    return rank_league_standings(stats, all_class_ids, head_to_head, points_map)
+
+def _head_to_head(finished_matches):
+    """Winner of the first finished match of each pair, from (class1_id, class2_id, winner_id) in match order."""
+    winners = {}
+    for class1_id, class2_id, winner_id in finished_matches:
+        winners.setdefault(frozenset((class1_id, class2_id)), winner_id)
+    return winners
+
+def rank_league_standings(stats: dict, all_class_ids: set, head_to_head: dict, points_map: dict = LEAGUE_POINTS_MAP):
+    """
+    Orders a league's per-class totals by points and sets won, applies the head-to-head
+    tie-break and maps ranks to league points with the sport's `points_map`.
+    """
     sorted_class_ids = sorted(list(all_class_ids), key=lambda cid: (stats[cid]["points"], stats[cid]["sets_won"]), reverse=True)
 
     # Tie-breaking for teams with the same points
@@ -56,17 +145,13 @@ def calculate_league_standings(sport: models.SportName, league: models.LeagueNam
             id2 = sorted_class_ids[j]
 
             if stats[id1]["points"] == stats[id2]["points"]:
-                for m in matches:
-                    if m.is_finished and {m.class1_id, m.class2_id} == {id1, id2}:
-                        if m.winner_id == id2:
-                            sorted_class_ids[i], sorted_class_ids[j] = sorted_class_ids[j], sorted_class_ids[i]
-                        break
+                if head_to_head.get(frozenset((id1, id2)), id1) == id2:
+                    sorted_class_ids[i], sorted_class_ids[j] = sorted_class_ids[j], sorted_class_ids[i]
 
-    league_points_map = {1: 12, 2: 10, 3: 8, 4: 6, 5: 4}
     standings = []
     for rank, class_id in enumerate(sorted_class_ids, 1):
         class_stats = stats[class_id]
-        assigned_points = league_points_map.get(rank, 0)
+        assigned_points = points_map.get(rank, 0)
             
         standings.append({
             "rank": rank,
@@ -82,48 +167,117 @@ def calculate_league_standings(sport: models.SportName, league: models.LeagueNam
         
     return standings
 
+@lru_cache(maxsize=None)
+def league_standings_query(by_sport: bool = False, by_league: bool = False):
+    """
+    One GROUP BY over both sides of every league match (UNION ALL of the class1 and class2
+    columns) giving per (sport, league, class) wins, losses, ties, points and sets won.
+    Matches with an unknown class are skipped, as in compute_league_standings. With
+    `by_sport`/`by_league` the statement takes :sport / :league parameters. The statement is
+    built once per variant since constructing it costs more than running it on small leagues.
+    """
+    m = models.LeagueMatch.__table__
+    c1 = models.SchoolClass.__table__.alias("c1")
+    c2 = models.SchoolClass.__table__.alias("c2")
+
+    filters = []
+    if by_sport:
+        filters.append(m.c.sport == bindparam("sport"))
+    if by_league:
+        filters.append(m.c.league == bindparam("league"))
+
+    def side(own, other, own_class, own_sets):
+        return select(
+            m.c.sport, m.c.league, m.c.is_finished,
+            own_class.label("class_id"),
+            func.coalesce(own, 0).label("own_score"),
+            func.coalesce(other, 0).label("other_score"),
+            func.coalesce(own_sets, 0).label("sets_won"),
+        ).select_from(m.join(c1, c1.c.id == m.c.class1_id).join(c2, c2.c.id == m.c.class2_id)).where(*filters)
+
+    sides = union_all(
+        side(m.c.class1_score, m.c.class2_score, m.c.class1_id, m.c.class1_sets_won),
+        side(m.c.class2_score, m.c.class1_score, m.c.class2_id, m.c.class2_sets_won),
+    ).subquery("sides")
+
+    finished = sides.c.is_finished == True
+    wins = func.sum(case((finished & (sides.c.own_score > sides.c.other_score), 1), else_=0))
+    losses = func.sum(case((finished & (sides.c.own_score < sides.c.other_score), 1), else_=0))
+    ties = func.sum(case((finished & (sides.c.own_score == sides.c.other_score), 1), else_=0))
+    return select(
+        sides.c.sport, sides.c.league, sides.c.class_id, models.SchoolClass.name,
+        wins.label("wins"), losses.label("losses"), ties.label("ties"),
+        (wins * 2 + ties).label("points"),
+        func.sum(case((finished, sides.c.sets_won), else_=0)).label("sets_won"),
+    ).join(models.SchoolClass, models.SchoolClass.id == sides.c.class_id).group_by(
+        sides.c.sport, sides.c.league, sides.c.class_id, models.SchoolClass.name
+    )
+
+def calculate_all_league_standings(db: Session, sport: str = None, league: str = None):
+    """
+    Standings of every league (or of one sport / one league) keyed by (sport, league), from
+    the aggregate query above and the finished matches needed for the head-to-head tie-break.
+    """
+    stats_by_league = defaultdict(dict)
+    class_ids_by_league = defaultdict(set)
+    params = {"sport": sport, "league": league}
+    for row in db.execute(league_standings_query(sport is not None, league is not None), {k: v for k, v in params.items() if v is not None}):
+        key = (row.sport, row.league)
+        stats_by_league[key][row.class_id] = {
+            "points": row.points, "wins": row.wins, "losses": row.losses, "ties": row.ties,
+            "sets_won": row.sets_won, "class_name": row.name,
+        }
+        class_ids_by_league[key].add(row.class_id)
+
+    m = models.LeagueMatch.__table__
+    finished = select(m.c.sport, m.c.league, m.c.class1_id, m.c.class2_id, m.c.winner_id).where(m.c.is_finished == True)
+    if sport is not None:
+        finished = finished.where(m.c.sport == sport)
+    if league is not None:
+        finished = finished.where(m.c.league == league)
+    finished_by_league = defaultdict(list)
+    for row in db.execute(finished.order_by(m.c.id)):
+        finished_by_league[(row.sport, row.league)].append((row.class1_id, row.class2_id, row.winner_id))
+
+    catalog = sportcatalog.for_session(db)
+    return {
+        key: rank_league_standings(stats, class_ids_by_league[key], _head_to_head(finished_by_league[key]), catalog.sport(key[0]).league_points)
+        for key, stats in stats_by_league.items()
+    }
 
-
-def generate_tournament_bracket(sport: models.SportName, db: Session):
+def generate_tournament_bracket(sport: str, db: Session):
     existing_matches = db.query(models.TournamentMatch).filter(models.TournamentMatch.sport == sport).first()
     if existing_matches:
-        raise HTTPException(status_code=400, detail=f"{sport.value} tournament already generated.")
-
+        raise HTTPException(status_code=400, detail=f"{sport} tournament already generated.")
+    bracket = bracket_for(sport, db)
+    if bracket is None:
+        catalog = sportcatalog.for_session(db)
+        raise HTTPException(status_code=400, detail=(
+            f"{sport} cannot be seeded: {len(catalog.leagues)} leagues x {catalog.sport(sport).advancing} advancing "
+            f"do not fill the {catalog.sport(sport).bracket} bracket."))
+    if not bracket:
+        raise HTTPException(status_code=400, detail=f"{sport} has no tournament.")
+
+    # 組み合わせに出てくるリーグだけを、この種目の1回の集計クエリで求める
+    all_standings = calculate_all_league_standings(db, sport=sport)
     standings = {}
-    for league in models.LeagueName:
-        standings[league.value] = calculate_league_standings(sport, league, db)
-        if not standings[league.value]:
-            raise HTTPException(status_code=404, detail=f"League {league.value} standings not available.")
+    for league in sorted({slot[0] for _, slot1, slot2 in bracket for slot in (slot1, slot2) if slot}):
+        standings[league] = all_standings.get((sport, league))
+        if not standings[league]:
+            raise HTTPException(status_code=404, detail=f"League {league} standings not available.")
+    for _, slot1, slot2 in bracket:
+        for league, rank in filter(None, (slot1, slot2)):
+            if len(standings[league]) < rank:
+                raise HTTPException(status_code=400, detail=f"League {league} has fewer than {rank} teams.")
+
+    def seed(slot):
+        if slot is None:
+            return None
+        league, rank = slot
+        return standings[league][rank - 1]["class_id"]
 
     tournament_matches = []
-    if sport in [models.SportName.SOCCER, models.SportName.VOLLEYBALL, models.SportName.MEN_BASKETBALL, models.SportName.WOMEN_BASKETBALL, models.SportName.SOFTBALL]:
-        a1 = standings["A"][0]["class_id"]
-        b1 = standings["B"][0]["class_id"]
-        c1 = standings["C"][0]["class_id"]
-        d1 = standings["D"][0]["class_id"]
-        
-        schedule = [
-            {"name": "E1 (準決勝)", "c1": a1, "c2": b1},
-            {"name": "E2 (準決勝)", "c1": c1, "c2": d1},
-            {"name": "E3 (決勝)", "c1": None, "c2": None},
-            {"name": "E4 (3位決定戦)", "c1": None, "c2": None},
-        ]
-    else:
-        a1, a2 = standings["A"][0]["class_id"], standings["A"][1]["class_id"]
-        b1, b2 = standings["B"][0]["class_id"], standings["B"][1]["class_id"]
-        c1, c2 = standings["C"][0]["class_id"], standings["C"][1]["class_id"]
-        d1, d2 = standings["D"][0]["class_id"], standings["D"][1]["class_id"]
-
-        schedule = [
-            {"name": "E1 (1回戦)", "c1": a1, "c2": b2},
-            {"name": "E2 (1回戦)", "c1": c1, "c2": d2},
-            {"name": "E3 (1回戦)", "c1": b1, "c2": c2},
-            {"name": "E4 (1回戦)", "c1": d1, "c2": a2},
-            {"name": "E5 (準決勝)", "c1": None, "c2": None},
-            {"name": "E6 (準決勝)", "c1": None, "c2": None},
-            {"name": "E7 (決勝)", "c1": None, "c2": None},
-            {"name": "E8 (3位決定戦)", "c1": None, "c2": None},
-        ]
+    schedule = [{"name": name, "c1": seed(slot1), "c2": seed(slot2)} for name, slot1, slot2 in bracket]
 
     for match_info in schedule:
         db_match = models.TournamentMatch(
@@ -141,140 +295,189 @@ def generate_tournament_bracket(sport: models.SportName, db: Session):
         
     return tournament_matches
 
-def update_tournament_match(sport: models.SportName, match_id: int, match_data: schemas.TournamentMatchUpdate, db: Session):
-    match_to_update = db.query(models.TournamentMatch).filter(
-        models.TournamentMatch.id == match_id,
-        models.TournamentMatch.sport == sport
-    ).first()
-
-    if not match_to_update:
-        raise HTTPException(status_code=404, detail="Match not found.")
-
-    # Update scores and winner
-    match_to_update.class1_score = match_data.class1_score
-    match_to_update.class2_score = match_data.class2_score
-    match_to_update.class1_sets_won = match_data.class1_sets_won
-    match_to_update.class2_sets_won = match_data.class2_sets_won
-    match_to_update.winner_id = match_data.winner_id
-    match_to_update.is_finished = True
-    
-    # Determine loser
-    winner_id = match_data.winner_id
-    if winner_id == match_to_update.class1_id:
-        loser_id = match_to_update.class2_id
-    elif winner_id == match_to_update.class2_id:
-        loser_id = match_to_update.class1_id
-    else:
-        # This case might happen if participants are not yet decided for the match
-        loser_id = None
-
-    # Define advancement maps
-    advancement_ball = {
-        "E1 (準決勝)": {"winner_to": ("E3 (決勝)", "class1_id"), "loser_to": ("E4 (3位決定戦)", "class1_id")},
-        "E2 (準決勝)": {"winner_to": ("E3 (決勝)", "class2_id"), "loser_to": ("E4 (3位決定戦)", "class2_id")},
-    }
-    advancement_racket = {
-        "E1 (1回戦)": {"winner_to": ("E6 (準決勝)", "class1_id")},
-        "E2 (1回戦)": {"winner_to": ("E6 (準決勝)", "class2_id")},
-        "E3 (1回戦)": {"winner_to": ("E5 (準決勝)", "class1_id")},
-        "E4 (1回戦)": {"winner_to": ("E5 (準決勝)", "class2_id")},
-        "E5 (準決勝)": {"winner_to": ("E7 (決勝)", "class1_id"), "loser_to": ("E8 (3位決定戦)", "class1_id")},
-        "E6 (準決勝)": {"winner_to": ("E7 (決勝)", "class2_id"), "loser_to": ("E8 (3位決定戦)", "class2_id")},
-    }
-
-    # Choose the correct map based on sport
-    is_ball_game = sport in [models.SportName.SOCCER, models.SportName.VOLLEYBALL, models.SportName.MEN_BASKETBALL, models.SportName.WOMEN_BASKETBALL, models.SportName.SOFTBALL]
-    advancement_map = advancement_ball if is_ball_game else advancement_racket
-
-    # Process advancement if the match is in the map
-    if match_to_update.match_name in advancement_map:
-        rules = advancement_map[match_to_update.match_name]
-        
-        # Advance winner
-        if "winner_to" in rules:
-            next_match_name, position = rules["winner_to"]
-            next_match = db.query(models.TournamentMatch).filter_by(sport=sport, match_name=next_match_name).first()
-            if next_match:
-                setattr(next_match, position, winner_id)
-
-        # Advance loser (for semi-finals)
-        if "loser_to" in rules and loser_id:
-            next_match_name, position = rules["loser_to"]
-            next_match = db.query(models.TournamentMatch).filter_by(sport=sport, match_name=next_match_name).first()
-            if next_match:
-                setattr(next_match, position, loser_id)
+def _match_loser(match):
+    if match.winner_id is None:
+        return None
+    if match.winner_id == match.class1_id:
+        return match.class2_id
+    if match.winner_id == match.class2_id:
+        return match.class1_id
+    # This case might happen if participants are not yet decided for the match
+    return None
+
+def _reset_match_result(match):
+    match.class1_score = None
+    match.class2_score = None
+    match.class1_sets_won = None
+    match.class2_sets_won = None
+    match.winner_id = None
+    match.is_finished = False
+
+def propagate_tournament_result(match, matches_by_name: dict, advancement_map: dict):
+    """
+    Pushes the winner and loser of `match` into the slots they advance to. When a slot changes
+    and the downstream match was already played, that result is no longer valid: it is reset and
+    its own downstream slots are cleared in turn. Unaffected matches are left untouched.
+    """
+    rules = advancement_map.get(match.match_name)
+    if not rules:
+        return
+
+    outcomes = []
+    if "winner_to" in rules:
+        outcomes.append((rules["winner_to"], match.winner_id if match.is_finished else None))
+    if "loser_to" in rules:
+        loser_id = _match_loser(match) if match.is_finished else None
+        # Advance loser (for semi-finals) only when it is known
+        if loser_id or not match.is_finished:
+            outcomes.append((rules["loser_to"], loser_id))
+
+    for (next_match_name, position), class_id in outcomes:
+        next_match = matches_by_name.get(next_match_name)
+        if not next_match or getattr(next_match, position) == class_id:
+            continue
+        setattr(next_match, position, class_id)
+        if next_match.is_finished:
+            _reset_match_result(next_match)
+            propagate_tournament_result(next_match, matches_by_name, advancement_map)
+
+# 勝ち上がり先の試合だけが他の更新と競合した場合に、読み直してやり直す回数
+CONFLICT_RETRIES = 3
+
+def match_conflict(model, match_id: int, db: Session):
+    """409 carrying the match as it is now, so the client can show it and retry with its version."""
+    db.rollback()
+    match = db.get(model, match_id)
+    if match is None:
+        return HTTPException(status_code=404, detail="Match not found")
+    store = memstore.store_for(db)
+    current = store.league_match_dict(match) if model is models.LeagueMatch else store.tournament_match_dict(match)
+    return HTTPException(status_code=409, detail={"message": "Match was changed by another update", "current": current})
+
+def update_league_match(match_id: int, match_data: schemas.LeagueMatchUpdate, db: Session):
+    match = db.query(models.LeagueMatch).filter(models.LeagueMatch.id == match_id).first()
+    if not match:
+        raise HTTPException(status_code=404, detail="Match not found")
+    if match_data.version is not None and match.version != match_data.version:
+        raise match_conflict(models.LeagueMatch, match_id, db)
+
+    match.class1_score = match_data.class1_score
+    match.class2_score = match_data.class2_score
+    match.class1_sets_won = match_data.class1_sets_won
+    match.class2_sets_won = match_data.class2_sets_won
+    match.winner_id = match_data.winner_id
+    match.is_finished = True # 試合を完了済みにする
+    # 値が変わらなくても UPDATE して版数を確認する (読み込んだ後の他の更新を取り消さないように)
+    flag_modified(match, "is_finished")
+
+    try:
+        # UPDATE ... WHERE version = (読み込んだ版数)。その間に他の更新があれば失敗する
+        db.commit()
+    except StaleDataError:
+        raise match_conflict(models.LeagueMatch, match_id, db)
+    db.refresh(match)
+    return match
+
+def update_tournament_match(sport: str, match_id: int, match_data: schemas.TournamentMatchUpdate, db: Session):
+    """
+    Every written match is checked against the version it was read at. A conflict on the match
+    itself is a 409; a conflict only on a downstream match (e.g. both semi-finals advancing into
+    the final at once) is retried on freshly read rows.
+    """
+    expected_version = match_data.version
+    for _ in range(CONFLICT_RETRIES):
+        matches_by_name = {
+            match.match_name: match
+            for match in db.query(models.TournamentMatch).filter(models.TournamentMatch.sport == sport)
+        }
+        match_to_update = next((match for match in matches_by_name.values() if match.id == match_id), None)
+
+        if not match_to_update:
+            raise HTTPException(status_code=404, detail="Match not found.")
+        if expected_version is None:
+            expected_version = match_to_update.version
+        elif match_to_update.version != expected_version:
+            raise match_conflict(models.TournamentMatch, match_id, db)
+
+        # Update scores and winner
+        match_to_update.class1_score = match_data.class1_score
+        match_to_update.class2_score = match_data.class2_score
+        match_to_update.class1_sets_won = match_data.class1_sets_won
+        match_to_update.class2_sets_won = match_data.class2_sets_won
+        match_to_update.winner_id = match_data.winner_id
+        match_to_update.is_finished = True
+        flag_modified(match_to_update, "is_finished")
+
+        # Advance winner/loser and, for corrections, re-run every downstream match whose participants changed
+        propagate_tournament_result(match_to_update, matches_by_name, advancement_map_for(sport, db))
+
+        try:
+            db.commit()
+        except StaleDataError:
+            db.rollback()
+            continue
+        db.refresh(match_to_update)
+        return match_to_update
+    raise match_conflict(models.TournamentMatch, match_id, db)
 
-    db.commit()
-    db.refresh(match_to_update)
-    return match_to_update
+def _final_loser(match):
+    if match.class1_id and match.class2_id:
+        return match.class2_id if match.winner_id == match.class1_id else match.class1_id
+    return None
 
 def get_total_rankings(db: Session, skip: int = 0, limit: int = 100):
+    """
+    Totals the league and tournament points of every class. Only the leagues and tournaments that
+    have matches are read (one query each for the finished state, the standings and the deciding
+    tournament matches), so the cost does not grow with the size of the catalog.
+    """
     all_classes = db.query(models.SchoolClass).all()
+    catalog = sportcatalog.for_session(db)
     class_points = defaultdict(lambda: {
         "total": 0,
         "league_details": defaultdict(int),
         "tournament_details": defaultdict(int)
     })
 
-    # 1. Calculate League Points
-    for sport in models.SportName:
-        for league in models.LeagueName:
-            matches = db.query(models.LeagueMatch).filter(
-                models.LeagueMatch.sport == sport,
-                models.LeagueMatch.league == league
-            ).all()
-            
-            all_matches_finished = all(match.is_finished for match in matches) if matches else False
-
-            if all_matches_finished:
-                try:
-                    standings = calculate_league_standings(sport, league, db)
-                    for standing in standings:
-                        class_id = standing["class_id"]
-                        points = standing["league_points"]
-                        class_points[class_id]["total"] += points
-                        class_points[class_id]["league_details"][sport.value] += points
-                except HTTPException as e:
-                    if e.status_code == 404:
-                        continue
-                    raise e
-
-    # 2. Calculate Tournament Points
-    tournament_points_map = {"優勝": 10, "準優勝": 8, "3位": 6, "4位": 4}
-    for sport in models.SportName:
-        final_match = db.query(models.TournamentMatch).filter(
-            models.TournamentMatch.sport == sport,
-            models.TournamentMatch.match_name.contains("決勝"),
-            not_(models.TournamentMatch.match_name.contains("準"))
-        ).first()
-        third_place_match = db.query(models.TournamentMatch).filter(models.TournamentMatch.sport == sport, models.TournamentMatch.match_name.contains("3位決定戦")).first()
-
-        if final_match and final_match.is_finished and final_match.winner_id:
-            winner_id = final_match.winner_id
-            loser_id = None
-            if final_match.class1_id and final_match.class2_id:
-                loser_id = final_match.class2_id if winner_id == final_match.class1_id else final_match.class1_id
-
-            if winner_id:
-                class_points[winner_id]["total"] += tournament_points_map["優勝"]
-                class_points[winner_id]["tournament_details"][sport.value] = tournament_points_map["優勝"]
-            if loser_id:
-                class_points[loser_id]["total"] += tournament_points_map["準優勝"]
-                class_points[loser_id]["tournament_details"][sport.value] = tournament_points_map["準優勝"]
-
-        if third_place_match and third_place_match.is_finished and third_place_match.winner_id:
-            winner_id = third_place_match.winner_id
-            loser_id = None
-            if third_place_match.class1_id and third_place_match.class2_id:
-                loser_id = third_place_match.class2_id if winner_id == third_place_match.class1_id else third_place_match.class1_id
-
-            if winner_id:
-                class_points[winner_id]["total"] += tournament_points_map["3位"]
-                class_points[winner_id]["tournament_details"][sport.value] = tournament_points_map["3位"]
+    # 1. Calculate League Points (全試合が終わったリーグのみ)
+    m = models.LeagueMatch.__table__
+    unfinished = func.sum(case((m.c.is_finished == True, 0), else_=1))
+    finished_leagues = {
+        (sport, league)
+        for sport, league, remaining in db.execute(select(m.c.sport, m.c.league, unfinished).group_by(m.c.sport, m.c.league))
+        if not remaining
+    }
+    if finished_leagues:
+        all_standings = calculate_all_league_standings(db)
+        for sport, league in sorted(finished_leagues, key=lambda key: catalog.order(*key)):
+            for standing in all_standings.get((sport, league), []):
+                class_id = standing["class_id"]
+                points = standing["league_points"]
+                class_points[class_id]["total"] += points
+                class_points[class_id]["league_details"][sport] += points
+
+    # 2. Calculate Tournament Points (決勝と3位決定戦がある種目のみ)
+    name = models.TournamentMatch.match_name
+    deciding_matches = db.query(models.TournamentMatch).filter(or_(
+        name.contains("決勝") & not_(name.contains("準")),
+        name.contains("3位決定戦"),
+    )).order_by(models.TournamentMatch.id)
+    finals, third_place_matches = {}, {}
+    for match in deciding_matches:
+        (third_place_matches if "3位決定戦" in match.match_name else finals).setdefault(match.sport, match)
+
+    for sport in sorted(finals.keys() | third_place_matches.keys(), key=catalog.order):
+        points_map = catalog.sport(sport).tournament_points
+        for match, (winner_place, loser_place) in ((finals.get(sport), ("優勝", "準優勝")), (third_place_matches.get(sport), ("3位", "4位"))):
+            if not (match and match.is_finished and match.winner_id):
+                continue
+            winner_id, loser_id = match.winner_id, _final_loser(match)
+            class_points[winner_id]["total"] += points_map.get(winner_place, 0)
+            class_points[winner_id]["tournament_details"][sport] = points_map.get(winner_place, 0)
             if loser_id:
-                class_points[loser_id]["total"] += tournament_points_map["4位"]
-                class_points[loser_id]["tournament_details"][sport.value] = tournament_points_map["4位"]
-            
+                class_points[loser_id]["total"] += points_map.get(loser_place, 0)
+                class_points[loser_id]["tournament_details"][sport] = points_map.get(loser_place, 0)
+
     # 3. Format and Sort Rankings
     rankings_data = []
     for cls in all_classes:
@@ -333,7 +536,7 @@ def generate_round_robin_pairs(teams):
                 
     return interleaved_pairs
 
-def generate_league_matches(sport: models.SportName, league: models.LeagueName, db: Session):
+def generate_league_matches(sport: str, league: str, db: Session):
     league_teams_query = db.query(models.LeagueTeam).filter_by(sport=sport, league=league).all()
     teams = [{'id': lt.class_id} for lt in league_teams_query]
 
@@ -366,6 +569,34 @@ def generate_league_matches(sport: models.SportName, league: models.LeagueName,
     
     return {"message": f"Successfully created {created_count} new matches.", "created_count": created_count}
 
+def create_class(class_data: schemas.SchoolClassCreate, db: Session):
+    db_class = models.SchoolClass(name=class_data.name)
+    db.add(db_class)
+    db.commit()
+    db.refresh(db_class)
+    return db_class
+
+def _require_league(sport: str, league: str, db: Session):
+    catalog = sportcatalog.for_session(db)
+    catalog.require_sport(sport)
+    catalog.require_league(league)
+
+def add_team_to_league(team_data: schemas.LeagueTeamCreate, db: Session):
+    _require_league(team_data.sport, team_data.league, db)
+    db_league_team = models.LeagueTeam(**team_data.dict())
+    db.add(db_league_team)
+    db.commit()
+    db.refresh(db_league_team)
+    return db_league_team
+
+def create_league_match(match_data: schemas.LeagueMatchCreate, db: Session):
+    _require_league(match_data.sport, match_data.league, db)
+    db_match = models.LeagueMatch(**match_data.dict(), is_finished=False)
+    db.add(db_match)
+    db.commit()
+    db.refresh(db_match)
+    return db_match
+
 def remove_team_from_league(team_data: schemas.LeagueTeamDelete, db: Session):
     team_to_delete = db.query(models.LeagueTeam).filter_by(
         sport=team_data.sport,
@@ -380,8 +611,17 @@ def remove_team_from_league(team_data: schemas.LeagueTeamDelete, db: Session):
     db.commit()
     return {"ok": True}
 
-def delete_league_matches(sport: models.SportName, league: models.LeagueName, db: Session):
+def delete_league_matches(sport: str, league: str, db: Session):
     """Deletes all matches and team associations for a given sport and league."""
+    league_match_ids = db.query(models.LeagueMatch.id).filter(
+        models.LeagueMatch.sport == sport,
+        models.LeagueMatch.league == league
+    )
+    db.query(models.ScheduleEntry).filter(
+        models.ScheduleEntry.league_match_id.in_(league_match_ids.scalar_subquery())
+    ).delete(synchronize_session=False)
+    events.record_deletes(db, events.LEAGUE_MATCH, [match_id for match_id, in league_match_ids])
+
     num_matches_deleted = db.query(models.LeagueMatch).filter(
         models.LeagueMatch.sport == sport,
         models.LeagueMatch.league == league
@@ -397,6 +637,9 @@ def delete_league_matches(sport: models.SportName, league: models.LeagueName, db
 
 def delete_all_league_data(db: Session):
     """Deletes all league matches, tournament matches, and team associations from the database."""
+    db.query(models.ScheduleEntry).delete(synchronize_session=False)
+    events.record_deletes(db, events.LEAGUE_MATCH, [match_id for match_id, in db.query(models.LeagueMatch.id)])
+    events.record_deletes(db, events.TOURNAMENT_MATCH, [match_id for match_id, in db.query(models.TournamentMatch.id)])
     num_matches_deleted = db.query(models.LeagueMatch).delete(synchronize_session=False)
     num_teams_deleted = db.query(models.LeagueTeam).delete(synchronize_session=False)
     num_tournament_matches_deleted = db.query(models.TournamentMatch).delete(synchronize_session=False)
@@ -409,6 +652,9 @@ def delete_all_league_data(db: Session):
 
 def delete_all_scores(db: Session):
     """Deletes all league and tournament matches, but keeps team associations."""
+    db.query(models.ScheduleEntry).delete(synchronize_session=False)
+    events.record_deletes(db, events.LEAGUE_MATCH, [match_id for match_id, in db.query(models.LeagueMatch.id)])
+    events.record_deletes(db, events.TOURNAMENT_MATCH, [match_id for match_id, in db.query(models.TournamentMatch.id)])
     num_league_matches_deleted = db.query(models.LeagueMatch).delete(synchronize_session=False)
     num_tournament_matches_deleted = db.query(models.TournamentMatch).delete(synchronize_session=False)
     db.commit()
@@ -416,267 +662,107 @@ def delete_all_scores(db: Session):
         "num_league_matches_deleted": num_league_matches_deleted,
         "num_tournament_matches_deleted": num_tournament_matches_deleted,
     }
-    match_to_update = db.query(models.TournamentMatch).filter(
-        models.TournamentMatch.id == match_id,
-        models.TournamentMatch.sport == sport
-    ).first()
 
-    if not match_to_update:
-        raise HTTPException(status_code=404, detail="Match not found.")
-
-    # Update scores and winner
-    match_to_update.class1_score = match_data.class1_score
-    match_to_update.class2_score = match_data.class2_score
-    match_to_update.class1_sets_won = match_data.class1_sets_won
-    match_to_update.class2_sets_won = match_data.class2_sets_won
-    match_to_update.winner_id = match_data.winner_id
-    match_to_update.is_finished = True
-    
-    # Determine loser
-    winner_id = match_data.winner_id
-    if winner_id == match_to_update.class1_id:
-        loser_id = match_to_update.class2_id
-    elif winner_id == match_to_update.class2_id:
-        loser_id = match_to_update.class1_id
-    else:
-        # This case might happen if participants are not yet decided for the match
-        loser_id = None
-
-    # Define advancement maps
-    advancement_ball = {
-        "E1 (準決勝)": {"winner_to": ("E3 (決勝)", "class1_id"), "loser_to": ("E4 (3位決定戦)", "class1_id")},
-        "E2 (準決勝)": {"winner_to": ("E3 (決勝)", "class2_id"), "loser_to": ("E4 (3位決定戦)", "class2_id")},
-    }
-    advancement_racket = {
-        "E1 (1回戦)": {"winner_to": ("E6 (準決勝)", "class1_id")},
-        "E2 (1回戦)": {"winner_to": ("E6 (準決勝)", "class2_id")},
-        "E3 (1回戦)": {"winner_to": ("E5 (準決勝)", "class1_id")},
-        "E4 (1回戦)": {"winner_to": ("E5 (準決勝)", "class2_id")},
-        "E5 (準決勝)": {"winner_to": ("E7 (決勝)", "class1_id"), "loser_to": ("E8 (3位決定戦)", "class1_id")},
-        "E6 (準決勝)": {"winner_to": ("E7 (決勝)", "class2_id"), "loser_to": ("E8 (3位決定戦)", "class2_id")},
+def _get_class_or_404(class_id: int, db: Session):
+    school_class = db.get(models.SchoolClass, class_id)
+    if school_class is None:
+        raise HTTPException(status_code=404, detail="Class not found")
+    return school_class
+
+def _involving(model, class_id: int):
+    return or_(model.class1_id == class_id, model.class2_id == class_id)
+
+def get_class_summary(class_id: int, db: Session, standings=None, total_rankings=None):
+    """
+    The class's row in the standings of every league it plays in and its total-ranking entry.
+    `standings` ((sport, league) -> standings) and `total_rankings` are the precomputed read
+    model when available; whatever is missing is computed here for this class's leagues only.
+    """
+    school_class = _get_class_or_404(class_id, db)
+    leagues = set(db.query(models.LeagueTeam.sport, models.LeagueTeam.league).filter(models.LeagueTeam.class_id == class_id))
+    leagues |= set(db.query(models.LeagueMatch.sport, models.LeagueMatch.league).filter(_involving(models.LeagueMatch, class_id)))
+
+    league_standings = []
+    catalog = sportcatalog.for_session(db)
+    for sport, league in sorted(leagues, key=lambda key: catalog.order(*key)):
+        table = standings.get((sport, league), []) if standings is not None else calculate_league_standings(sport, league, db)
+        row = next((standing for standing in table if standing["class_id"] == class_id), None)
+        league_standings.append({"sport": sport, "league": league, "standing": row})
+
+    if total_rankings is None:
+        total_rankings = get_total_rankings(db, skip=0, limit=db.query(models.SchoolClass).count())
+    total = next((ranking for ranking in total_rankings if ranking["class_id"] == class_id), None)
+    return {"school_class": school_class, "league_standings": league_standings, "total_ranking": total}
+
+# === 種目・リーグのカタログ ===
+def get_catalog(db: Session):
+    return sportcatalog.for_session(db).as_dict()
+
+def _sport_in_use(name: str, db: Session):
+    return any(
+        db.query(model.id).filter(model.sport == name).first() is not None
+        for model in (models.LeagueTeam, models.LeagueMatch, models.TournamentMatch)
+    )
+
+def save_sport(sport_data: schemas.SportCreate, db: Session):
+    """Registers a sport or replaces its configuration. Unset bracket/advancing follow the kind."""
+    racket = sport_data.kind == "racket"
+    bracket = sport_data.bracket or ("top8" if racket else "top4")
+    if bracket not in TOURNAMENT_FORMATS:
+        raise HTTPException(status_code=422, detail=f"bracket must be one of {', '.join(TOURNAMENT_FORMATS)}")
+    values = {
+        "position": sport_data.position,
+        "kind": sport_data.kind,
+        "bracket": bracket,
+        "advancing": sport_data.advancing or (2 if racket else 1),
+        "league_points": json.dumps(sport_data.league_points) if sport_data.league_points is not None else None,
+        "tournament_points": json.dumps(sport_data.tournament_points, ensure_ascii=False) if sport_data.tournament_points is not None else None,
+        "in_reports": sport_data.in_reports,
     }
-
-    # Choose the correct map based on sport
-    is_ball_game = sport in [models.SportName.SOCCER, models.SportName.VOLLEYBALL, models.SportName.MEN_BASKETBALL, models.SportName.WOMEN_BASKETBALL, models.SportName.SOFTBALL]
-    advancement_map = advancement_ball if is_ball_game else advancement_racket
-
-    # Process advancement if the match is in the map
-    if match_to_update.match_name in advancement_map:
-        rules = advancement_map[match_to_update.match_name]
-        
-        # Advance winner
-        if "winner_to" in rules:
-            next_match_name, position = rules["winner_to"]
-            next_match = db.query(models.TournamentMatch).filter_by(sport=sport, match_name=next_match_name).first()
-            if next_match:
-                setattr(next_match, position, winner_id)
-
-        # Advance loser (for semi-finals)
-        if "loser_to" in rules and loser_id:
-            next_match_name, position = rules["loser_to"]
-            next_match = db.query(models.TournamentMatch).filter_by(sport=sport, match_name=next_match_name).first()
-            if next_match:
-                setattr(next_match, position, loser_id)
-
-    db.commit()
-    db.refresh(match_to_update)
-    return match_to_update
-
-def get_total_rankings(db: Session, skip: int = 0, limit: int = 100):
-    all_classes = db.query(models.SchoolClass).all()
-    class_points = defaultdict(lambda: {
-        "total": 0,
-        "league_details": defaultdict(int),
-        "tournament_details": defaultdict(int)
-    })
-
-    # 1. Calculate League Points
-    for sport in models.SportName:
-        for league in models.LeagueName:
-            matches = db.query(models.LeagueMatch).filter(
-                models.LeagueMatch.sport == sport,
-                models.LeagueMatch.league == league
-            ).all()
-            
-            all_matches_finished = all(match.is_finished for match in matches) if matches else False
-
-            if all_matches_finished:
-                try:
-                    standings = calculate_league_standings(sport, league, db)
-                    for standing in standings:
-                        class_id = standing["class_id"]
-                        points = standing["league_points"]
-                        class_points[class_id]["total"] += points
-                        class_points[class_id]["league_details"][sport.value] += points
-                except HTTPException as e:
-                    if e.status_code == 404:
-                        continue
-                    raise e
-
-    # 2. Calculate Tournament Points
-    tournament_points_map = {"優勝": 10, "準優勝": 8, "3位": 6, "4位": 4}
-    for sport in models.SportName:
-        final_match = db.query(models.TournamentMatch).filter(
-            models.TournamentMatch.sport == sport,
-            models.TournamentMatch.match_name.contains("決勝"),
-            not_(models.TournamentMatch.match_name.contains("準"))
-        ).first()
-        third_place_match = db.query(models.TournamentMatch).filter(models.TournamentMatch.sport == sport, models.TournamentMatch.match_name.contains("3位決定戦")).first()
-
-        if final_match and final_match.is_finished and final_match.winner_id:
-            winner_id = final_match.winner_id
-            loser_id = None
-            if final_match.class1_id and final_match.class2_id:
-                loser_id = final_match.class2_id if winner_id == final_match.class1_id else final_match.class1_id
-
-            if winner_id:
-                class_points[winner_id]["total"] += tournament_points_map["優勝"]
-                class_points[winner_id]["tournament_details"][sport.value] = tournament_points_map["優勝"]
-            if loser_id:
-                class_points[loser_id]["total"] += tournament_points_map["準優勝"]
-                class_points[loser_id]["tournament_details"][sport.value] = tournament_points_map["準優勝"]
-
-        if third_place_match and third_place_match.is_finished and third_place_match.winner_id:
-            winner_id = third_place_match.winner_id
-            loser_id = None
-            if third_place_match.class1_id and third_place_match.class2_id:
-                loser_id = third_place_match.class2_id if winner_id == third_place_match.class1_id else third_place_match.class1_id
-
-            if winner_id:
-                class_points[winner_id]["total"] += tournament_points_map["3位"]
-                class_points[winner_id]["tournament_details"][sport.value] = tournament_points_map["3位"]
-            if loser_id:
-                class_points[loser_id]["total"] += tournament_points_map["4位"]
-                class_points[loser_id]["tournament_details"][sport.value] = tournament_points_map["4位"]
-            
-    # 3. Format and Sort Rankings
-    rankings_data = []
-    for cls in all_classes:
-        points_info = class_points[cls.id]
-        rankings_data.append({
-            "class_id": cls.id,
-            "class_name": cls.name,
-            "total_points": points_info["total"],
-            "league_points_details": dict(points_info["league_details"]),
-            "tournament_points_details": dict(points_info["tournament_details"])
-        })
-        
-    sorted_rankings = sorted(rankings_data, key=lambda x: x["total_points"], reverse=True)
-    
-    final_rankings = []
-    for i, data in enumerate(sorted_rankings, 1):
-        final_rankings.append({"rank": i, **data})
-        
-    return final_rankings[skip : skip + limit]
-
-def generate_round_robin_pairs(teams):
-    """Generates match pairs using the round-robin (circle) method, interleaved to maximize rest time."""
-    if not teams:
-        return []
-
-    # If odd number of teams, add a dummy team for byes
-    if len(teams) % 2:
-        teams.append(None)
-    
-    n = len(teams)
-    rounds = []
-    for _ in range(n - 1):
-        round_pairs = []
-        for i in range(n // 2):
-            team1 = teams[i]
-            team2 = teams[n - 1 - i]
-            if team1 and team2: # Ensure no Nones are paired
-                pair = tuple(sorted((team1['id'], team2['id'])))
-                round_pairs.append(pair)
-        rounds.append(round_pairs) # Keep rounds separate
-        
-        # Rotate teams for next round, keeping first team fixed
-        teams.insert(1, teams.pop())
-        
-    # Interleave the matches to spread them out
-    interleaved_pairs = []
-    if not rounds:
-        return []
-        
-    num_matches_per_round = max(len(r) for r in rounds) if rounds else 0
-    
-    for i in range(num_matches_per_round):
-        for j in range(len(rounds)):
-            if i < len(rounds[j]):
-                interleaved_pairs.append(rounds[j][i])
-                
-    return interleaved_pairs
-
-def generate_league_matches(sport: models.SportName, league: models.LeagueName, db: Session):
-    league_teams_query = db.query(models.LeagueTeam).filter_by(sport=sport, league=league).all()
-    teams = [{'id': lt.class_id} for lt in league_teams_query]
-
-    if len(teams) < 2:
-        return {"message": "Not enough teams in the league to generate matches.", "created_count": 0}
-
-    existing_matches_query = db.query(models.LeagueMatch).filter_by(sport=sport, league=league).all()
-    existing_pairs = set()
-    for match in existing_matches_query:
-        pair = tuple(sorted((match.class1_id, match.class2_id)))
-        existing_pairs.add(pair)
-
-    scheduled_pairs = generate_round_robin_pairs(list(teams))
-
-    created_count = 0
-    for team1_id, team2_id in scheduled_pairs:
-        pair = tuple(sorted((team1_id, team2_id)))
-        if pair not in existing_pairs:
-            new_match = models.LeagueMatch(
-                sport=sport,
-                league=league,
-                class1_id=team1_id,
-                class2_id=team2_id,
-                is_finished=False
-            )
-            db.add(new_match)
-            created_count += 1
-    
+    sport = db.get(models.Sport, sport_data.name)
+    if sport is None:
+        db.add(models.Sport(name=sport_data.name, **values))
+    else:
+        for key, value in values.items():
+            setattr(sport, key, value)
     db.commit()
-    
-    return {"message": f"Successfully created {created_count} new matches.", "created_count": created_count}
-
-def remove_team_from_league(team_data: schemas.LeagueTeamDelete, db: Session):
-    team_to_delete = db.query(models.LeagueTeam).filter_by(
-        sport=team_data.sport,
-        league=team_data.league,
-        class_id=team_data.class_id
-    ).first()
-
-    if not team_to_delete:
-        raise HTTPException(status_code=404, detail="Team not found in this league")
-
-    db.delete(team_to_delete)
+    return get_catalog(db)
+
+def delete_sport(name: str, db: Session):
+    sport = db.get(models.Sport, name)
+    if sport is None:
+        raise HTTPException(status_code=404, detail=f"Sport '{name}' not found")
+    if _sport_in_use(name, db):
+        raise HTTPException(status_code=409, detail=f"Sport '{name}' still has teams or matches")
+    db.delete(sport)
     db.commit()
-    return {"ok": True}
-
-def delete_league_matches(sport: models.SportName, league: models.LeagueName, db: Session):
-    """Deletes all matches and team associations for a given sport and league."""
-    num_matches_deleted = db.query(models.LeagueMatch).filter(
-        models.LeagueMatch.sport == sport,
-        models.LeagueMatch.league == league
-    ).delete(synchronize_session=False)
-
-    num_teams_deleted = db.query(models.LeagueTeam).filter(
-        models.LeagueTeam.sport == sport,
-        models.LeagueTeam.league == league
-    ).delete(synchronize_session=False)
+    return get_catalog(db)
 
+def save_league(league_data: schemas.LeagueCreate, db: Session):
+    league = db.get(models.League, league_data.name)
+    if league is None:
+        db.add(models.League(name=league_data.name, position=league_data.position))
+    else:
+        league.position = league_data.position
     db.commit()
-    return {"num_matches_deleted": num_matches_deleted, "num_teams_deleted": num_teams_deleted}
-
-def delete_all_league_data(db: Session):
-    """Deletes all league matches, tournament matches, and team associations from the database."""
-    num_matches_deleted = db.query(models.LeagueMatch).delete(synchronize_session=False)
-    num_teams_deleted = db.query(models.LeagueTeam).delete(synchronize_session=False)
-    num_tournament_matches_deleted = db.query(models.TournamentMatch).delete(synchronize_session=False)
+    return get_catalog(db)
+
+def delete_league(name: str, db: Session):
+    league = db.get(models.League, name)
+    if league is None:
+        raise HTTPException(status_code=404, detail=f"League '{name}' not found")
+    in_use = any(db.query(model.id).filter(model.league == name).first() is not None for model in (models.LeagueTeam, models.LeagueMatch))
+    if in_use:
+        raise HTTPException(status_code=409, detail=f"League '{name}' still has teams or matches")
+    db.delete(league)
     db.commit()
-    return {
-        "num_matches_deleted": num_matches_deleted,
-        "num_teams_deleted": num_teams_deleted,
-        "num_tournament_matches_deleted": num_tournament_matches_deleted,
-    }
\ No newline at end of file
+    return get_catalog(db)
+
+def warm_up():
+    """Configures the ORM mappers and runs the ranking query once so the first real request does not pay for it."""
+    configure_mappers()
+    db = models.SessionLocal()
+    try:
+        get_total_rankings(db)
+    finally:
+        db.close()
@@ -0,0 +1,301 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 集計結果 (順位表・総合ランキング) をDBの横のバイナリファイルに書き出し、
+# 全ワーカーが同じファイルをメモリマップして読む。TOKUTEN_SHARED_READMODEL=0 で無効 (プロセスごとに保持)
+ENABLED = os.environ.get("TOKUTEN_SHARED_READMODEL", "1") == "1"
+
+MAGIC = b"TKRM"
+FORMAT_VERSION = 4
+NO_STRING = 0xFFFFFFFF  # 文字列の None
+
+logger = logging.getLogger(__name__)
+
+# このプロセスの起動前に書かれたファイルは、停止中にDBが変更されているかもしれないので使わない
+_STARTED = time.time()
+
+# ファイルの構成: ヘッダー, セクション表 (offset, count), 各セクションの固定長レコード
+_HEADER = struct.Struct("<4sHxxQdQQ")  # magic, format, generation, written_at, change_log seq, file size
+_SECTION = struct.Struct("<II")
+SECTIONS = ("strings", "blob", "groups", "standings", "rankings", "details")
+_STRING = struct.Struct("<II")  # blob 内の offset, length (UTF-8)
+_GROUP = struct.Struct("<BxxxIIII")  # kind, key1, key2, start, count
+_STANDING = struct.Struct("<IiIiiiiii")  # rank, class_id, class_name, points, wins, losses, ties, sets_won_points, league_points
+_RANKING = struct.Struct("<IiIiIHH")  # rank, class_id, class_name, total_points, details start, league count, tournament count
+_DETAIL = struct.Struct("<Ii")  # sport, points
+RECORDS = {"strings": _STRING, "blob": struct.Struct("<B"), "groups": _GROUP, "standings": _STANDING,
+           "rankings": _RANKING, "details": _DETAIL}
+STANDINGS = 0
+_DATA_START = _HEADER.size + _SECTION.size * len(SECTIONS)
+
+
+def _key(value):
+    return getattr(value, "value", value)
+
+
+class _StringTable:
+    def __init__(self):
+        self.index = {}
+        self.entries = []
+        self.blob = bytearray()
+
+    def add(self, text):
+        if text is None:
+            return NO_STRING
+        number = self.index.get(text)
+        if number is None:
+            data = text.encode()
+            number = self.index[text] = len(self.entries)
+            self.entries.append((len(self.blob), len(data)))
+            self.blob += data
+        return number
+
+
+def encode(snapshot, generation):
+    """Serializes a readmodel.Snapshot (or MappedSnapshot) into the binary file format."""
+    strings = _StringTable()
+    groups, standings, rankings, details = [], [], [], []
+
+    for (sport, league), table in snapshot.standings.items():
+        groups.append((STANDINGS, strings.add(_key(sport)), strings.add(_key(league)), len(standings), len(table)))
+        for row in table:
+            standings.append((row["rank"], row["class_id"], strings.add(row["class_name"]), row["points"], row["wins"],
+                              row["losses"], row["ties"], row["sets_won_points"], row["league_points"]))
+
+    for ranking in snapshot.total_rankings:
+        league_details, tournament_details = ranking["league_points_details"], ranking["tournament_points_details"]
+        rankings.append((ranking["rank"], ranking["class_id"], strings.add(ranking["class_name"]), ranking["total_points"],
+                         len(details), len(league_details), len(tournament_details)))
+        for sport, points in list(league_details.items()) + list(tournament_details.items()):
+            details.append((strings.add(sport), points))
+
+    records = {"strings": strings.entries, "groups": groups, "standings": standings,
+               "rankings": rankings, "details": details}
+    sections, chunks, offset = [], [], _DATA_START
+    for name in SECTIONS:
+        if name == "blob":
+            chunk, count = bytes(strings.blob), len(strings.blob)
+        else:
+            record = RECORDS[name]
+            chunk, count = b"".join(record.pack(*values) for values in records[name]), len(records[name])
+        sections.append(_SECTION.pack(offset, count))
+        chunks.append(chunk)
+        offset += len(chunk)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, generation, time.time(), snapshot.seq, offset)
+    return header + b"".join(sections) + b"".join(chunks)
+
+
+class _Reader:
+    """Unpacks records straight from the mapped file; only the strings actually used are decoded (and cached)."""
+
+    def __init__(self, buffer):
+        self.view = memoryview(buffer)
+        if len(self.view) < _DATA_START:
+            raise ValueError("truncated read model file")
+        magic, version, self.generation, self.written_at, self.seq, size = _HEADER.unpack_from(self.view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION or size != len(self.view):
+            raise ValueError("not a read model file of this version")
+        self.sections = {}
+        for i, name in enumerate(SECTIONS):
+            offset, count = _SECTION.unpack_from(self.view, _HEADER.size + i * _SECTION.size)
+            if offset + count * RECORDS[name].size > size:
+                raise ValueError(f"section {name} out of bounds")
+            self.sections[name] = (offset, count)
+        self._strings = {}
+
+    def record(self, name, index):
+        offset, _ = self.sections[name]
+        record = RECORDS[name]
+        return record.unpack_from(self.view, offset + index * record.size)
+
+    def records(self, name):
+        offset, count = self.sections[name]
+        return RECORDS[name].iter_unpack(self.view[offset:offset + count * RECORDS[name].size])
+
+    def string(self, number):
+        if number == NO_STRING:
+            return None
+        text = self._strings.get(number)
+        if text is None:
+            start, length = self.record("strings", number)
+            blob_offset, _ = self.sections["blob"]
+            text = self._strings[number] = str(self.view[blob_offset + start:blob_offset + start + length], "utf-8")
+        return text
+
+    def standing(self, index):
+        rank, class_id, name, points, wins, losses, ties, sets_won, league_points = self.record("standings", index)
+        return {"rank": rank, "class_id": class_id, "class_name": self.string(name), "points": points, "wins": wins,
+                "losses": losses, "ties": ties, "sets_won_points": sets_won, "league_points": league_points}
+
+    def ranking(self, index):
+        rank, class_id, name, total, start, num_league, num_tournament = self.record("rankings", index)
+        details = [self.record("details", start + i) for i in range(num_league + num_tournament)]
+        return {
+            "rank": rank, "class_id": class_id, "class_name": self.string(name), "total_points": total,
+            "league_points_details": {self.string(sport): points for sport, points in details[:num_league]},
+            "tournament_points_details": {self.string(sport): points for sport, points in details[num_league:]},
+        }
+
+
+class _Groups(Mapping):
+    """(sport, league) -> standings, decoded from the mapping on each lookup."""
+
+    def __init__(self, reader, kind, decode):
+        self._decode = decode
+        self._groups = {}
+        for group_kind, key1, key2, start, count in reader.records("groups"):
+            if group_kind == kind:
+                self._groups[(reader.string(key1), reader.string(key2))] = (start, count)
+
+    def __getitem__(self, key):
+        start, count = self._groups.get((_key(key[0]), _key(key[1])), (0, 0))
+        return [self._decode(start + i) for i in range(count)]
+
+    def __iter__(self):
+        yield from self._groups
+
+    def __len__(self):
+        return len(self._groups)
+
+
+class _Rankings(Sequence):
+    def __init__(self, reader):
+        self._reader = reader
+        self._count = reader.sections["rankings"][1]
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._reader.ranking(i) for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._reader.ranking(index)
+
+
+class MappedSnapshot:
+    """
+    Read-only view of one generation of the file with the same attributes as readmodel.Snapshot;
+    lists and rows are built from the shared mapping only when they are accessed.
+    """
+
+    def __init__(self, buffer):
+        reader = _Reader(buffer)
+        self.version = reader.generation
+        self.computed_at = reader.written_at
+        self.seq = reader.seq
+        self.standings = _Groups(reader, STANDINGS, reader.standing)
+        self.total_rankings = _Rankings(reader)
+
+
+def snapshot_path(engine):
+    """`<db>.readmodel.bin` next to a file-backed SQLite database; None for in-memory ones or when disabled."""
+    database = engine.url.database
+    if not ENABLED or not database or database == ":memory:" or database.startswith("file::memory:"):
+        return None
+    root, _ = os.path.splitext(os.path.abspath(database))
+    return f"{root}.readmodel.bin"
+
+
+def _open(path):
+    with open(path, "rb") as f:
+        return MappedSnapshot(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class SharedReadModel:
+    """
+    Keeps the current generation of each database's file mapped. `get` stats the file and, when
+    another worker (or this one) has replaced it, maps the new generation and swaps it in with one
+    assignment; requests still holding the previous view keep reading the old mapping, whose file
+    stays alive until they drop it.
+    """
+
+    def __init__(self):
+        self.publications = 0
+        self.swaps = 0
+        self._mapped = {}
+        self._lock = threading.Lock()
+
+    def get(self, engine):
+        path = snapshot_path(engine)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        current = self._mapped.get(path)
+        if current is not None and current[0] == identity:
+            return current[1]
+        with self._lock:
+            current = self._mapped.get(path)
+            if current is None or current[0] != identity:
+                try:
+                    snapshot = _open(path)
+                    if snapshot.computed_at < _STARTED:
+                        snapshot = None
+                except (OSError, ValueError):
+                    logger.exception("ignoring unreadable read model file %s", path)
+                    snapshot = None
+                current = self._mapped[path] = (identity, snapshot)
+                self.swaps += 1
+        return current[1]
+
+    @contextmanager
+    def writing(self, engine):
+        """Serializes recompute-and-publish across worker processes (so none overwrites a newer generation)."""
+        path = snapshot_path(engine)
+        if path is None or fcntl is None:
+            yield
+            return
+        with open(f"{path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def publish(self, engine, snapshot):
+        """Writes `snapshot` as the next generation and atomically replaces the file; False when not file-backed."""
+        path = snapshot_path(engine)
+        if path is None:
+            return False
+        generation = 1
+        try:
+            with open(path, "rb") as f:
+                magic, _, previous, _, _, _ = _HEADER.unpack(f.read(_HEADER.size))
+            if magic == MAGIC:
+                generation = previous + 1
+        except (OSError, struct.error):
+            pass
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(encode(snapshot, generation))
+        os.replace(temporary, path)
+        self.publications += 1
+        return True
+
+    def stats(self):
+        return {
+            "publications": self.publications,
+            "swaps": self.swaps,
+            "generations": {path: entry[1].version for path, entry in self._mapped.items() if entry[1] is not None},
+        }
+
+
+model = SharedReadModel()
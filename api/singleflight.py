@@ -0,0 +1,62 @@
+import threading
+from sqlalchemy.orm import Session
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the computation and
+    every caller that arrives while it is running waits for it and gets the same result (or
+    exception). Nothing is cached once the computation has finished.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.computations = 0
+        self.deduplicated = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.computations += 1
+            else:
+                self.deduplicated += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {"computations": self.computations, "deduplicated": self.deduplicated, "in_flight": len(self._calls)}
+
+
+group = SingleFlight()
+
+
+def database_key(db: Session):
+    """Identifies the database a session reads from, so festivals and the read replica never share results."""
+    return str(db.get_bind().url)
@@ -0,0 +1,165 @@
+import json
+import threading
+import weakref
+from sqlalchemy import case, event, func, select
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+import models
+
+# 種目ごとに指定しなかった場合のリーグ順位・トーナメント順位ごとの総合ポイント
+DEFAULT_LEAGUE_POINTS = {1: 12, 2: 10, 3: 8, 4: 6, 5: 4}
+DEFAULT_TOURNAMENT_POINTS = {"優勝": 10, "準優勝": 8, "3位": 6, "4位": 4}
+
+# カタログに無い種目 (ORMを通さずに書き込まれた試合など) の設定
+_DEFAULTS = {
+    sport.value: {"kind": kind, "bracket": bracket, "advancing": advancing, "in_reports": in_reports}
+    for sport, kind, bracket, advancing, in_reports in models.DEFAULT_SPORTS
+}
+_FALLBACK = {"kind": "ball", "bracket": "top4", "advancing": 1, "in_reports": True}
+
+
+class SportConfig:
+    """One sport of the catalog with its points maps decoded."""
+    __slots__ = ("name", "position", "kind", "bracket", "advancing", "league_points", "tournament_points", "in_reports")
+
+    def __init__(self, name, position, kind, bracket, advancing, league_points=None, tournament_points=None, in_reports=True):
+        self.name = name
+        self.position = position
+        self.kind = kind
+        self.bracket = bracket
+        self.advancing = advancing
+        # JSON のキーは文字列なので順位は int に戻す
+        self.league_points = {int(rank): points for rank, points in json.loads(league_points).items()} if league_points else DEFAULT_LEAGUE_POINTS
+        self.tournament_points = json.loads(tournament_points) if tournament_points else DEFAULT_TOURNAMENT_POINTS
+        self.in_reports = bool(in_reports)
+
+    def as_dict(self):
+        return {
+            "name": self.name, "position": self.position, "kind": self.kind, "bracket": self.bracket,
+            "advancing": self.advancing, "league_points": self.league_points,
+            "tournament_points": self.tournament_points, "in_reports": self.in_reports,
+        }
+
+
+class Catalog:
+    """
+    The sports and leagues registered in one database, in display order. Lookups of names that
+    are not registered fall back to the defaults so stored data is never dropped; request
+    validation uses require_sport / require_league instead.
+    """
+
+    def __init__(self, sports, leagues):
+        self.sports = {sport.name: sport for sport in sorted(sports, key=lambda s: (s.position, s.name))}
+        self.leagues = [name for _, name in sorted((position, name) for name, position in leagues)]
+        self._sport_order = {name: i for i, name in enumerate(self.sports)}
+        self._league_order = {name: i for i, name in enumerate(self.leagues)}
+
+    def sport(self, name) -> SportConfig:
+        config = self.sports.get(name)
+        if config is None:
+            config = SportConfig(name, len(self.sports), **_DEFAULTS.get(name, _FALLBACK))
+        return config
+
+    def require_sport(self, name):
+        if name not in self.sports:
+            raise HTTPException(status_code=404, detail=f"Sport '{name}' not found")
+        return name
+
+    def require_league(self, name):
+        if name not in self._league_order:
+            raise HTTPException(status_code=404, detail=f"League '{name}' not found")
+        return name
+
+    def order(self, sport, league=None):
+        """Sort key for a sport or a (sport, league) in catalog order; unregistered names come last."""
+        return (self._sport_order.get(sport, len(self._sport_order)), sport,
+                self._league_order.get(league, len(self._league_order)), league or "")
+
+    def as_dict(self):
+        return {
+            "sports": [sport.as_dict() for sport in self.sports.values()],
+            "leagues": [{"name": name, "position": position} for position, name in enumerate(self.leagues)],
+        }
+
+
+# change_log の中でカタログの変更を表す記録
+CATALOG_TABLES = (models.Sport.__tablename__, models.League.__tablename__)
+
+
+def _load(conn):
+    """The Catalog and the change_log position it reflects (read first, so no later change is missed)."""
+    seq = conn.execute(select(func.max(models.ChangeLog.seq))).scalar() or 0
+    sports = [SportConfig(**row._mapping) for row in conn.execute(select(models.Sport.__table__))]
+    leagues = conn.execute(select(models.League.name, models.League.position)).all()
+    return Catalog(sports, leagues), seq
+
+
+def _refresh(conn, catalog, seq):
+    """
+    Reloads the catalog when change_log has a sports or leagues entry after `seq`, or when the
+    entries after `seq` have already been pruned; otherwise only moves the position forward.
+    """
+    log = models.ChangeLog.__table__
+    first, last, catalog_changed = conn.execute(
+        select(func.min(log.c.seq), func.max(log.c.seq), func.max(case((log.c.table_name.in_(CATALOG_TABLES), log.c.seq))))
+        .where(log.c.seq > seq)
+    ).one()
+    if last is None:
+        return catalog, seq
+    # 番号は1ずつ増えるので、最初の番号が続いていなければ古い記録が既に削除されている
+    if catalog_changed is not None or first != seq + 1:
+        return _load(conn)
+    return catalog, last
+
+
+class CatalogCache:
+    """
+    Per-database Catalogs, loaded on first use and checked against change_log on every use, so
+    catalog changes committed by other workers and scripts are seen as well. The lock only guards
+    the dictionary; the change_log query runs outside it. Keyed by the engine itself (not its
+    URL) so that throwaway in-memory databases, such as the audit replay, never share an entry.
+    """
+
+    def __init__(self):
+        self._catalogs = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, engine) -> Catalog:
+        with self._lock:
+            entry = self._catalogs.get(engine)
+        # DBへの問い合わせはロックの外で行い、他の大会・他のリクエストを待たせない
+        with engine.connect() as conn:
+            entry = _load(conn) if entry is None else _refresh(conn, *entry)
+        with self._lock:
+            # 並行して読んだ他のスレッドの方が新しければ、そちらを残す
+            current = self._catalogs.get(engine)
+            if current is None or current[1] <= entry[1]:
+                self._catalogs[engine] = entry
+        return entry[0]
+
+    def invalidate(self, engine):
+        with self._lock:
+            self._catalogs.pop(engine, None)
+
+
+cache = CatalogCache()
+
+
+def for_session(db: Session) -> Catalog:
+    """
+    The Catalog of the database a request's session stands for (its primary, for replica
+    sessions). change_log is checked once per transaction; later lookups reuse that Catalog.
+    """
+    catalog = db.info.get("catalog")
+    if catalog is None:
+        catalog = db.info["catalog"] = cache.get(db.info.get("primary") or db.get_bind())
+    return catalog
+
+
+@event.listens_for(models.SessionLocal, "after_commit")
+@event.listens_for(models.SessionLocal, "after_rollback")
+def _forget(session):
+    # SAVEPOINT の確定・取り消しではまだトランザクションは終わっていない
+    if session.in_nested_transaction():
+        return
+    session.info.pop("catalog", None)
@@ -0,0 +1,206 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+from fastapi import HTTPException
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+import models
+
+# 1 のとき、得点入力・勝ち上がり・準備の書き込みを DB ごとに1つの書き込みスレッドに集め、まとめてコミットする
+ENABLED = os.environ.get("TOKUTEN_GROUP_COMMIT") == "1"
+# 最初の書き込みが届いてからコミットするまでの待ち時間 (秒)。この間に届いた書き込みを1つのトランザクションにまとめる
+FLUSH_INTERVAL = float(os.environ.get("TOKUTEN_GROUP_COMMIT_INTERVAL", "0.005"))
+# 1回のコミットにまとめる書き込みの最大数
+MAX_BATCH = int(os.environ.get("TOKUTEN_GROUP_COMMIT_MAX_BATCH", "64"))
+# 書き込みスレッドの結果を待つ最大時間 (秒)。過ぎたら 503 を返す
+TIMEOUT = float(os.environ.get("TOKUTEN_GROUP_COMMIT_TIMEOUT", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class BatchSession(models.SessionLocal.class_):
+    """
+    The session operations run in inside a group commit. Every operation has its own savepoint:
+    commit() only flushes into it and rollback() undoes just that operation's writes, so the
+    services run unchanged while the writer commits the whole batch once.
+    """
+
+    def commit(self):
+        self.flush()
+
+    def rollback(self):
+        savepoint = self.get_nested_transaction()
+        if savepoint is not None:
+            savepoint.rollback()
+        self.begin_nested()
+
+
+def _begin(db: Session):
+    if db.get_bind().dialect.name == "sqlite":
+        # pysqlite は INSERT/UPDATE の直前にしか BEGIN を発行しないため、先に始めておかないと
+        # 最初の SAVEPOINT が単独のトランザクションになってしまう。書き込みのロックもここで取る
+        db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _load_relationships(result):
+    """Loads what the response reads of returned ORM objects, which outlive the batch session."""
+    for obj in result if isinstance(result, list) else (result,):
+        state = inspect(obj, raiseerr=False)
+        if state is None or not hasattr(state, "mapper"):
+            continue
+        for key in state.mapper.relationships.keys():
+            getattr(obj, key)
+
+
+class GroupCommitWriter:
+    """
+    The write queue of one database, drained by a single thread. Whatever has queued up within
+    `interval` of the first waiting operation runs in one transaction, each operation in its own
+    savepoint, and every caller's future is resolved once that transaction has committed.
+    """
+
+    def __init__(self, engine, interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.engine = engine
+        self.interval = interval
+        self.max_batch = max_batch
+        self.batches = 0
+        self.operations = 0
+        self.largest_batch = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation):
+        """Queues `operation(session)`; the returned future holds its result or exception."""
+        future = Future()
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("group commit writer is stopped")
+            self._queue.append((operation, future))
+            self._cond.notify_all()
+        return future
+
+    def stop(self):
+        """Commits what is still queued, then ends the thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def stats(self):
+        with self._cond:
+            return {"queued": len(self._queue), "batches": self.batches, "operations": self.operations,
+                    "largest_batch": self.largest_batch}
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue and not self._stopping:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            deadline = time.monotonic() + self.interval
+            while len(self._queue) < self.max_batch and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                self._commit(batch)
+            except Exception:
+                logger.exception("group commit failed for %s", self.engine.url)
+
+    def _commit(self, batch):
+        db = BatchSession(bind=self.engine, expire_on_commit=False)
+        done = []
+        try:
+            _begin(db)
+            for operation, future in batch:
+                # 待ちきれずに取り消された操作は実行しない
+                if not future.set_running_or_notify_cancel():
+                    continue
+                db.begin_nested()
+                try:
+                    result = operation(db)
+                    db.flush()
+                    _load_relationships(result)
+                except BaseException as exc:
+                    db.get_nested_transaction().rollback()
+                    future.set_exception(exc)
+                    continue
+                # 操作中の rollback() で作り直された SAVEPOINT もあるので、その時点のものを確定する
+                db.get_nested_transaction().commit()
+                done.append((future, result))
+            Session.commit(db)
+        except BaseException as exc:
+            # BEGIN・SAVEPOINT・COMMIT の失敗はまとめた全員の失敗なので、まだ結果のない future にすべて伝える
+            try:
+                Session.rollback(db)
+            finally:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+            raise
+        finally:
+            db.close()
+        with self._cond:
+            self.batches += 1
+            self.operations += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+        for future, result in done:
+            future.set_result(result)
+
+
+_writers = {}
+_lock = threading.Lock()
+
+
+def writer_for(engine):
+    key = str(engine.url)
+    with _lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = GroupCommitWriter(engine)
+        return writer
+
+
+def run(db: Session, operation, timeout=None):
+    """
+    Runs `operation(session)` and returns its result: on the request's own session, or with
+    TOKUTEN_GROUP_COMMIT=1 through the database's writer, waiting for the batch to commit.
+    Waiting longer than `timeout` seconds raises a 503; an operation that had already started by
+    then may still be committed.
+    """
+    if not ENABLED:
+        return operation(db)
+    future = writer_for(db.info.get("primary") or db.get_bind()).submit(operation)
+    try:
+        return future.result(timeout=TIMEOUT if timeout is None else timeout)
+    except TimeoutError:
+        future.cancel()
+        raise HTTPException(status_code=503, detail="Write queue is busy, please retry")
+
+
+def stop():
+    with _lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
+
+
+def stats():
+    with _lock:
+        writers = list(_writers.items())
+    return {key: writer.stats() for key, writer in writers}
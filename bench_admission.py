@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# 'api' ディレクトリをPythonのパスに追加して、modelsをインポートできるようにする
+API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), 'api'))
+sys.path.append(API_DIR)
+TMP_DIR = tempfile.mkdtemp()
+DB_PATH = os.path.join(TMP_DIR, "bench.db")
+# サーバーが作る大会の一覧・各大会のDB・集計ファイルもすべて一時ディレクトリに置く
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["FESTIVAL_CATALOG_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'festivals.db')}"
+os.environ["FESTIVAL_DIR"] = os.path.join(TMP_DIR, "festivals")
+
+import httpx
+from sqlalchemy import insert
+import models
+
+API_TOKEN = "secret-token"
+READ_PATHS = ["/clinch/", "/leagues/サッカー/A/matches/", "/rankings/total/", "/leagues/卓球/B/standings/"]
+
+
+def populate(teams_per_league=6, seed=0):
+    models.ensure_schema()
+    rng = random.Random(seed)
+    num_classes = teams_per_league * len(models.LeagueName)
+    matches = []
+    with models.engine.begin() as conn:
+        conn.execute(insert(models.SchoolClass.__table__), [{"id": i, "name": f"{i // 10 + 1}-{i % 10}"} for i in range(1, num_classes + 1)])
+        for sport in models.SportName:
+            ids = list(range(1, num_classes + 1))
+            rng.shuffle(ids)
+            for index, league in enumerate(models.LeagueName):
+                members = ids[index * teams_per_league:(index + 1) * teams_per_league]
+                conn.execute(insert(models.LeagueTeam.__table__), [{"sport": sport, "league": league, "class_id": cid} for cid in members])
+                for i, a in enumerate(members):
+                    for b in members[i + 1:]:
+                        matches.append({"sport": sport, "league": league, "class1_id": a, "class2_id": b, "is_finished": False})
+        conn.execute(insert(models.LeagueMatch.__table__), matches)
+    return [(i + 1, match["class1_id"]) for i, match in enumerate(matches)]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, limits):
+    env = dict(os.environ, TOKUTEN_READ_CONCURRENCY=str(limits[0]), TOKUTEN_WRITE_CONCURRENCY=str(limits[1]))
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=API_DIR, env=env)
+    for _ in range(200):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/festivals/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def storm(url, pollers, interval, stop, results):
+    """Anonymous clients that each GET a public page every `interval` seconds, however slow the answers are."""
+    async def run():
+        statuses = {}
+        async with httpx.AsyncClient(base_url=url, timeout=None, limits=httpx.Limits(max_connections=pollers)) as client:
+            async def get(rng):
+                try:
+                    response = await client.get(rng.choice(READ_PATHS))
+                    key = f"{response.status_code}{' stale' if response.headers.get('x-cache') == 'stale' else ''}"
+                except httpx.HTTPError as exc:
+                    key = type(exc).__name__
+                statuses[key] = statuses.get(key, 0) + 1
+
+            async def poll(seed):
+                rng = random.Random(seed)
+                pending = set()
+                await asyncio.sleep(rng.random() * interval)
+                while not stop.is_set():
+                    # 前の応答を待たずに次を送る (画面の自動更新と同じ)
+                    task = asyncio.create_task(get(rng))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                    await asyncio.sleep(interval)
+                await asyncio.gather(*pending)
+
+            await asyncio.gather(*(poll(seed) for seed in range(pollers)))
+        results.put(statuses)
+    asyncio.run(run())
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000 if ordered else float("nan")
+
+
+def measure(matches, pollers, interval, limits):
+    """Starts a server with the given (public, priority) limits and submits `matches` results during a storm."""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = start_server(port, limits)
+    stop, results = multiprocessing.Event(), multiprocessing.Queue()
+    poller = multiprocessing.Process(target=storm, args=(url, pollers, interval, stop, results))
+    try:
+        poller.start()
+        time.sleep(2)
+        latencies, failures = [], 0
+        with httpx.Client(base_url=url, timeout=None, headers={"Authorization": f"Bearer {API_TOKEN}"}) as client:
+            for match_id, winner in matches:
+                body = {"class1_score": 1, "class2_score": 0, "class1_sets_won": 1, "class2_sets_won": 0, "winner_id": winner}
+                start = time.perf_counter()
+                failures += client.put(f"/leagues/matches/{match_id}/", json=body).status_code != 200
+                latencies.append(time.perf_counter() - start)
+                time.sleep(0.05)
+        stop.set()
+        statuses = results.get()
+        poller.join()
+    finally:
+        server.terminate()
+        server.wait()
+    return latencies, failures, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="公開GETが殺到している間の得点入力のレイテンシを、流量制御の有無で比較する")
+    parser.add_argument("--pollers", type=int, nargs="+", default=[100, 300], help="ポーリングする匿名クライアント数")
+    parser.add_argument("--interval", type=float, default=1.0, help="各クライアントのポーリング間隔 (秒)")
+    parser.add_argument("--writes", type=int, default=40, help="計測する得点入力の回数")
+    parser.add_argument("--read-limit", type=int, default=8)
+    parser.add_argument("--write-limit", type=int, default=4)
+    args = parser.parse_args()
+    try:
+        matches = populate()
+        random.Random(1).shuffle(matches)
+        for pollers in args.pollers:
+            for mode, limits in (("off", (10 ** 6, 10 ** 6)), ("on", (args.read_limit, args.write_limit))):
+                batch, matches = matches[:args.writes], matches[args.writes:]
+                latencies, failures, statuses = measure(batch, pollers, args.interval, limits)
+                reads = ", ".join(f"{key}: {count}" for key, count in sorted(statuses.items()))
+                print(f"{pollers:4d} pollers  admission {mode:<3}  write p50 {percentile(latencies, 0.5):8.1f} ms"
+                      f"   p99 {percentile(latencies, 0.99):8.1f} ms   failed {failures}   reads [{reads}]", flush=True)
+    finally:
+        models.engine.dispose()
+        shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# 'api' ディレクトリをPythonのパスに追加して、modelsをインポートできるようにする
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'api')))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event, insert
+import models, services, clinch, sportcatalog
+
+
+def make_database(sports, leagues, used_sports, used_leagues, teams_per_league=5, seed=0):
+    """A catalog of `sports` x `leagues` where only the first `used_sports` x `used_leagues` have finished matches."""
+    path = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    engine = create_engine(f"sqlite:///{path}")
+    models.ensure_schema(engine)
+    rng = random.Random(seed)
+    sport_names = [f"競技{i}" for i in range(sports)]
+    league_names = [chr(ord("A") + i) for i in range(leagues)]
+    num_classes = teams_per_league * used_leagues
+    teams, matches = [], []
+    for sport in sport_names[:used_sports]:
+        ids = list(range(1, num_classes + 1))
+        rng.shuffle(ids)
+        for index, league in enumerate(league_names[:used_leagues]):
+            members = ids[index * teams_per_league:(index + 1) * teams_per_league]
+            teams += [{"sport": sport, "league": league, "class_id": cid} for cid in members]
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    s1, s2 = rng.randint(0, 3), rng.randint(0, 3)
+                    matches.append({"sport": sport, "league": league, "class1_id": a, "class2_id": b, "class1_score": s1,
+                                    "class2_score": s2, "winner_id": a if s1 > s2 else b if s2 > s1 else None, "is_finished": True})
+    with engine.begin() as conn:
+        conn.execute(models.Sport.__table__.delete())
+        conn.execute(models.League.__table__.delete())
+        conn.execute(insert(models.Sport.__table__), [
+            {"name": name, "position": i, "kind": "ball", "bracket": "top4", "advancing": 1, "in_reports": True}
+            for i, name in enumerate(sport_names)
+        ])
+        conn.execute(insert(models.League.__table__), [{"name": name, "position": i} for i, name in enumerate(league_names)])
+        conn.execute(insert(models.SchoolClass.__table__), [{"id": i, "name": f"{i // 10 + 1}-{i % 10}"} for i in range(1, num_classes + 1)])
+        conn.execute(insert(models.LeagueTeam.__table__), teams)
+        conn.execute(insert(models.LeagueMatch.__table__), matches)
+    return path, engine
+
+
+def measure(engine, repeat):
+    """Mean milliseconds and statements per call of the total ranking and the clinch report of every league."""
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+    db = models.SessionLocal(bind=engine)
+    try:
+        sportcatalog.for_session(db)  # カタログの読み込みは最初の1回だけなので計測から除く
+        results = {}
+        for name, call in (("rankings", lambda: services.get_total_rankings(db)), ("clinch", lambda: clinch.get_all_clinch(db))):
+            call()
+            statements.clear()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                call()
+            results[name] = ((time.perf_counter() - start) / repeat * 1000, len(statements) / repeat)
+        return results
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登録された種目・リーグの数を増やしても、集計の時間が試合のある種目・リーグの数だけで決まることを確認する")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    cases = [
+        # (登録する種目数, リーグ数, 試合のある種目数, リーグ数)
+        (8, 4, 8, 4),
+        (30, 12, 8, 4),
+        (30, 12, 30, 12),
+    ]
+    for sports, leagues, used_sports, used_leagues in cases:
+        path, engine = make_database(sports, leagues, used_sports, used_leagues)
+        try:
+            results = measure(engine, args.repeat)
+        finally:
+            sportcatalog.cache.invalidate(engine)
+            engine.dispose()
+            os.remove(path)
+        line = "   ".join(f"{name} {ms:8.2f} ms ({queries:.0f} queries)" for name, (ms, queries) in results.items())
+        print(f"catalog {sports:2d} sports x {leagues:2d} leagues, data in {used_sports:2d} x {used_leagues:2d}:   {line}")
+
+
+if __name__ == "__main__":
+    main()
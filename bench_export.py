@@ -0,0 +1,93 @@
+import argparse
+import csv
+import gc
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# 'api' ディレクトリをPythonのパスに追加して、modelsをインポートできるようにする
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'api')))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert
+import models, csv_io
+
+
+def make_database(num_matches, num_classes=200, seed=0):
+    """`num_matches` finished league matches between random pairs of `num_classes` classes."""
+    rng = random.Random(seed)
+    path = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    engine = create_engine(f"sqlite:///{path}")
+    models.ensure_schema(engine)
+    sports = [sport.value for sport, *_ in models.DEFAULT_SPORTS]
+    matches = []
+    for _ in range(num_matches):
+        a, b = rng.sample(range(1, num_classes + 1), 2)
+        s1, s2 = rng.randint(0, 5), rng.randint(0, 5)
+        matches.append({"sport": rng.choice(sports), "league": rng.choice("ABCD"), "class1_id": a, "class2_id": b,
+                        "class1_score": s1, "class2_score": s2, "class1_sets_won": 0, "class2_sets_won": 0,
+                        "winner_id": a if s1 > s2 else b if s2 > s1 else None, "is_finished": True})
+    with engine.begin() as conn:
+        conn.execute(insert(models.SchoolClass.__table__), [{"id": i, "name": f"{i // 10 + 1}-{i % 10}"} for i in range(1, num_classes + 1)])
+        conn.execute(insert(models.LeagueMatch.__table__), matches)
+    return path, engine
+
+
+def buffered_export(db):
+    """The export as the paging clients assembled it: every match as an ORM object, then one CSV string."""
+    names = {c.id: c.name for c in db.query(models.SchoolClass)}
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(csv_io.LEAGUE_MATCH_EXPORT_COLUMNS)
+    for m in db.query(models.LeagueMatch).order_by(models.LeagueMatch.id).all():
+        writer.writerow([m.id, m.sport, m.league, m.class1_id, names.get(m.class1_id), m.class2_id, names.get(m.class2_id),
+                         m.class1_score, m.class2_score, m.class1_sets_won, m.class2_sets_won, m.winner_id,
+                         names.get(m.winner_id), int(bool(m.is_finished)), m.version])
+    yield buffer.getvalue()
+
+
+def measure(engine, export):
+    """Milliseconds and characters written by one export, then its peak traced memory (KiB) in a second run."""
+    db = models.SessionLocal(bind=engine)
+    try:
+        start = time.perf_counter()
+        size = sum(len(chunk) for chunk in export(db))
+        elapsed = (time.perf_counter() - start) * 1000
+        gc.collect()
+        tracemalloc.start()  # 計測中は遅くなるので時間は上で測る
+        for _ in export(db):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, size, peak / 1024
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="試合結果の全件エクスポートのメモリ使用量を、ストリーミングと一括生成で比較する")
+    parser.add_argument("--matches", type=int, nargs="+", default=[10000, 50000, 200000])
+    args = parser.parse_args()
+    exports = {
+        "buffered (ORM + one string)": buffered_export,
+        "stream csv": lambda db: csv_io.stream_export(db, "league_matches", "csv"),
+        "stream ndjson": lambda db: csv_io.stream_export(db, "league_matches", "ndjson"),
+    }
+    for num_matches in args.matches:
+        path, engine = make_database(num_matches)
+        try:
+            print(f"{num_matches} league matches:")
+            for name, export in exports.items():
+                ms, size, peak = measure(engine, export)
+                print(f"  {name:28s}: {ms:9.1f} ms  {size / 1e6:6.1f} M chars  peak {peak:9.0f} KiB")
+        finally:
+            engine.dispose()
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# 'api' ディレクトリをPythonのパスに追加して、modelsをインポートできるようにする
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'api')))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert
+import models, schemas, services, writer
+
+
+def make_database(num_matches):
+    path = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    engine = create_engine(f"sqlite:///{path}")
+    models.ensure_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.SchoolClass.__table__), [{"id": i, "name": f"1-{i}"} for i in range(1, 21)])
+        conn.execute(insert(models.LeagueMatch.__table__), [
+            {"sport": models.SportName.SOCCER, "league": models.LeagueName.A, "class1_id": n % 20 + 1,
+             "class2_id": (n + 7) % 20 + 1, "is_finished": False}
+            for n in range(num_matches)
+        ])
+    return path, engine
+
+
+def score_update(rng):
+    s1, s2 = rng.randint(0, 5), rng.randint(0, 5)
+    return schemas.LeagueMatchUpdate(class1_score=s1, class2_score=s2, class1_sets_won=s1, class2_sets_won=s2, winner_id=None)
+
+
+def run(mode, engine, clients, per_client, num_matches, interval):
+    """Every client thread writes `per_client` score results; returns (elapsed, latencies, errors)."""
+    group = writer.GroupCommitWriter(engine, interval=interval) if mode == "group" else None
+    latencies, errors = [], []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients)
+
+    def client(seed):
+        rng = random.Random(seed)
+        start_barrier.wait()
+        for _ in range(per_client):
+            match_id, update = rng.randint(1, num_matches), score_update(rng)
+            operation = lambda session: services.update_league_match(match_id, update, session)
+            start = time.perf_counter()
+            # エンドポイントと同じく、書き込みごとにセッションを開く
+            db = models.SessionLocal(bind=engine)
+            try:
+                if group is None:
+                    operation(db)
+                else:
+                    group.submit(operation).result()
+            except Exception as exc:
+                with lock:
+                    errors.append(str(getattr(exc, "status_code", type(exc).__name__)))
+                continue
+            finally:
+                db.close()
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if group is not None:
+        group.stop()
+        print(f"    batches: {group.batches}, largest: {group.largest_batch}")
+    return elapsed, latencies, errors
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000 if ordered else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="得点入力の同時書き込みを、リクエストごとのコミットとまとめてのコミットで比較する")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32], help="同時に書き込むスレッド数")
+    parser.add_argument("--writes", type=int, default=640, help="1回の計測での書き込みの総数")
+    parser.add_argument("--matches", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=writer.FLUSH_INTERVAL, help="まとめる待ち時間 (秒)")
+    args = parser.parse_args()
+    for clients in args.clients:
+        print(f"{clients} clients, {args.writes} writes:")
+        for mode in ("direct", "group"):
+            path, engine = make_database(args.matches)
+            try:
+                elapsed, latencies, errors = run(mode, engine, clients, args.writes // clients, args.matches, args.interval)
+            finally:
+                engine.dispose()
+                os.remove(path)
+            print(f"  {mode:<6} {len(latencies) / elapsed:8.0f} writes/s   p50 {percentile(latencies, 0.5):7.2f} ms"
+                  f"   p99 {percentile(latencies, 0.99):7.2f} ms   errors {len(errors)}"
+                  + (f" ({', '.join(sorted(set(errors)))})" if errors else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List
+
+# 'api' ディレクトリをPythonのパスに追加して、modelsをインポートできるようにする
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'api')))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import joinedload
+import models, schemas, memstore
+
+try:
+    from pydantic import TypeAdapter
+
+    def to_json(schema, objs):
+        adapter = TypeAdapter(List[schema])
+        return adapter.dump_python(adapter.validate_python(objs, from_attributes=True), mode="json")
+except ImportError:  # pydantic v1
+    def to_json(schema, objs):
+        return [schema.from_orm(obj).dict() for obj in objs]
+
+
+def make_database(teams_per_league, seed=0):
+    """Every sport with four round-robin leagues of `teams_per_league` classes, mostly finished, plus brackets."""
+    rng = random.Random(seed)
+    path = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    engine = create_engine(f"sqlite:///{path}")
+    models.ensure_schema(engine)
+    num_classes = teams_per_league * len(models.LeagueName)
+    classes = [{"id": i, "name": f"{i // 10 + 1}-{i % 10}"} for i in range(1, num_classes + 1)]
+    teams, matches, brackets = [], [], []
+    for sport in models.SportName:
+        ids = list(range(1, num_classes + 1))
+        rng.shuffle(ids)
+        for index, league in enumerate(models.LeagueName):
+            members = ids[index * teams_per_league:(index + 1) * teams_per_league]
+            teams += [{"sport": sport, "league": league, "class_id": cid} for cid in members]
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    finished = rng.random() < 0.8
+                    s1, s2 = (rng.randint(0, 3), rng.randint(0, 3)) if finished else (None, None)
+                    matches.append({"sport": sport, "league": league, "class1_id": a, "class2_id": b,
+                                    "class1_score": s1, "class2_score": s2, "class1_sets_won": s1, "class2_sets_won": s2,
+                                    "winner_id": (a if s1 >= s2 else b) if finished else None, "is_finished": finished})
+        for n in range(8):
+            brackets.append({"sport": sport, "match_name": f"E{n + 1}", "class1_id": rng.choice(ids), "class2_id": rng.choice(ids)})
+    with engine.begin() as conn:
+        conn.execute(insert(models.SchoolClass.__table__), classes)
+        conn.execute(insert(models.LeagueTeam.__table__), teams)
+        conn.execute(insert(models.LeagueMatch.__table__), matches)
+        conn.execute(insert(models.TournamentMatch.__table__), brackets)
+    return path, engine, len(classes) + len(teams) + len(matches) + len(brackets)
+
+
+# --- ORM経由の読み取り (メモリ上のテーブル導入前のエンドポイントと同じ処理) ---
+def orm_league_matches(db, sport, league):
+    return to_json(schemas.LeagueMatch, db.query(models.LeagueMatch).filter_by(sport=sport, league=league).all())
+
+
+def orm_league_teams(db, sport, league):
+    return to_json(schemas.SchoolClass, [lt.school_class for lt in db.query(models.LeagueTeam).filter_by(sport=sport, league=league).all()])
+
+
+def orm_tournament(db, sport):
+    return to_json(schemas.TournamentMatch, db.query(models.TournamentMatch).filter(models.TournamentMatch.sport == sport).all())
+
+
+def orm_class_matches(db, class_id):
+    return to_json(schemas.LeagueMatch, db.query(models.LeagueMatch).options(
+        joinedload(models.LeagueMatch.class1), joinedload(models.LeagueMatch.class2), joinedload(models.LeagueMatch.winner)
+    ).filter((models.LeagueMatch.class1_id == class_id) | (models.LeagueMatch.class2_id == class_id)).order_by(models.LeagueMatch.id).all())
+
+
+def measure_memory(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return kept, after - before
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def run(teams_per_league, repeat):
+    path, engine, num_rows = make_database(teams_per_league)
+    sport, league = models.SportName.VOLLEYBALL, models.LeagueName.A
+    try:
+        def load_orm():
+            # セッションの identity map は弱参照なので、読み込んだオブジェクトを保持して測る
+            db = models.SessionLocal(bind=engine)
+            return db, [db.query(model).all() for model in memstore.ROW_TYPES]
+        (db, _), orm_bytes = measure_memory(load_orm)
+        _, store_bytes = measure_memory(lambda: memstore.model.get(engine))
+        db.close()
+
+        print(f"{teams_per_league} teams/league, {num_rows} rows:")
+        print(f"  memory   ORM objects (all rows): {orm_bytes / 1024:8.0f} KiB   in-memory store: {store_bytes / 1024:8.0f} KiB")
+        # エンドポイントと同じく、毎回 change_log を確認してから読む
+        store = lambda: memstore.model.get(engine)
+        cases = [
+            ("league matches", lambda db: orm_league_matches(db, sport, league), lambda: store().league_match_list(sport, league)),
+            ("league teams", lambda db: orm_league_teams(db, sport, league), lambda: store().league_teams(sport, league)),
+            ("tournament", lambda db: orm_tournament(db, sport), lambda: store().tournament_match_list(sport)),
+            ("class matches", lambda db: orm_class_matches(db, 1), lambda: store().class_matches(1)["league_matches"]),
+        ]
+        for name, orm_read, store_read in cases:
+            def orm_request():
+                # エンドポイントと同じく、リクエストごとに新しいセッションで読む
+                session = models.SessionLocal(bind=engine)
+                try:
+                    return orm_read(session)
+                finally:
+                    session.close()
+            assert orm_request() == store_read(), f"{name}: results differ"
+            print(f"  {name:<15} ORM + Pydantic: {timed(orm_request, repeat):7.3f} ms   in-memory store: {timed(store_read, repeat):7.3f} ms")
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="公開GETのORM経由の読み取りとメモリ上のテーブルからの読み取りを比較する")
+    parser.add_argument("--teams", type=int, nargs="+", default=[6, 12], help="リーグあたりのチーム数")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    for teams in args.teams:
+        run(teams, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
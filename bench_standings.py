@@ -0,0 +1,183 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+# 'api' ディレクトリをPythonのパスに追加して、modelsをインポートできるようにする
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'api')))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert
+import models, services
+
+
+def legacy_calculate_league_standings(sport, league, db):
+    """The ORM + Python tally implementation that calculate_league_standings replaced, kept as the reference."""
+    matches = db.query(models.LeagueMatch).filter(
+        models.LeagueMatch.sport == sport,
+        models.LeagueMatch.league == league
+    ).all()
+    class_ids = {m.class1_id for m in matches} | {m.class2_id for m in matches}
+    class_names = dict(db.query(models.SchoolClass.id, models.SchoolClass.name).filter(models.SchoolClass.id.in_(class_ids)).all())
+    stats = defaultdict(lambda: {"points": 0, "wins": 0, "losses": 0, "ties": 0, "sets_won": 0, "class_name": ""})
+    all_class_ids = set()
+    for match in matches:
+        if match.class1_id not in class_names or match.class2_id not in class_names:
+            continue
+        all_class_ids.add(match.class1_id)
+        all_class_ids.add(match.class2_id)
+        if not stats[match.class1_id]["class_name"]:
+            stats[match.class1_id]["class_name"] = class_names[match.class1_id]
+        if not stats[match.class2_id]["class_name"]:
+            stats[match.class2_id]["class_name"] = class_names[match.class2_id]
+        if match.is_finished:
+            score1 = match.class1_score if match.class1_score is not None else 0
+            score2 = match.class2_score if match.class2_score is not None else 0
+            if score1 > score2:
+                stats[match.class1_id]["points"] += 2
+                stats[match.class1_id]["wins"] += 1
+                stats[match.class2_id]["losses"] += 1
+            elif score2 > score1:
+                stats[match.class2_id]["points"] += 2
+                stats[match.class2_id]["wins"] += 1
+                stats[match.class1_id]["losses"] += 1
+            else:
+                stats[match.class1_id]["points"] += 1
+                stats[match.class2_id]["points"] += 1
+                stats[match.class1_id]["ties"] += 1
+                stats[match.class2_id]["ties"] += 1
+            if match.class1_sets_won is not None:
+                stats[match.class1_id]["sets_won"] += match.class1_sets_won
+            if match.class2_sets_won is not None:
+                stats[match.class2_id]["sets_won"] += match.class2_sets_won
+    sorted_class_ids = sorted(list(all_class_ids), key=lambda cid: (stats[cid]["points"], stats[cid]["sets_won"]), reverse=True)
+    for i in range(len(sorted_class_ids) - 1):
+        for j in range(i + 1, len(sorted_class_ids)):
+            id1 = sorted_class_ids[i]
+            id2 = sorted_class_ids[j]
+            if stats[id1]["points"] == stats[id2]["points"]:
+                for m in matches:
+                    if m.is_finished and {m.class1_id, m.class2_id} == {id1, id2}:
+                        if m.winner_id == id2:
+                            sorted_class_ids[i], sorted_class_ids[j] = sorted_class_ids[j], sorted_class_ids[i]
+                        break
+    return [{
+        "rank": rank, "class_id": cid, "class_name": stats[cid]["class_name"], "points": stats[cid]["points"],
+        "wins": stats[cid]["wins"], "losses": stats[cid]["losses"], "ties": stats[cid]["ties"],
+        "sets_won_points": stats[cid]["sets_won"], "league_points": services.LEAGUE_POINTS_MAP.get(rank, 0),
+    } for rank, cid in enumerate(sorted_class_ids, 1)]
+
+
+def make_database(rng, teams_per_league, max_score=3, id_spread=1, unknown_rate=0.0, repeat_rate=0.0, finished_rate=0.8):
+    """
+    SQLite file with random leagues for every sport. `id_spread` spaces the class ids out so
+    Python set ordering sees hash collisions, unknown_rate adds matches against deleted classes
+    and repeat_rate adds rematches, to exercise every branch of the tie-breaks.
+    """
+    path = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    engine = create_engine(f"sqlite:///{path}")
+    models.ensure_schema(engine)
+    num_classes = teams_per_league * len(models.LeagueName)
+    class_ids = rng.sample(range(1, num_classes * id_spread + 1), num_classes)
+    classes = [{"id": cid, "name": f"class-{cid}"} for cid in class_ids]
+    matches = []
+    for sport in models.SportName:
+        rng.shuffle(class_ids)
+        for index, league in enumerate(models.LeagueName):
+            members = class_ids[index * teams_per_league:(index + 1) * teams_per_league]
+            pairs = [(a, b) for i, a in enumerate(members) for b in members[i + 1:]]
+            pairs += [rng.choice(pairs) for _ in range(int(len(pairs) * repeat_rate))] if pairs else []
+            pairs += [(rng.choice(members), 10 ** 6 + n) for n in range(int(len(pairs) * unknown_rate))]
+            rng.shuffle(pairs)
+            for a, b in pairs:
+                if rng.random() < 0.5:
+                    a, b = b, a
+                finished = rng.random() < finished_rate
+                s1 = rng.choice([None] + list(range(max_score + 1))) if finished else None
+                s2 = rng.choice([None] + list(range(max_score + 1))) if finished else None
+                matches.append({
+                    "sport": sport, "league": league, "class1_id": a, "class2_id": b,
+                    "class1_score": s1, "class2_score": s2,
+                    "class1_sets_won": rng.choice([None, 0, 1, 2]), "class2_sets_won": rng.choice([None, 0, 1, 2]),
+                    "winner_id": rng.choice([a, b, None]) if finished else None,
+                    "is_finished": finished,
+                })
+    with engine.begin() as conn:
+        conn.execute(insert(models.SchoolClass.__table__), classes)
+        if matches:
+            conn.execute(insert(models.LeagueMatch.__table__), matches)
+    return path, engine, len(matches)
+
+
+def verify(seeds):
+    """Compares the SQL aggregation with the reference implementation on randomized databases."""
+    mismatches = 0
+    for seed in range(seeds):
+        rng = random.Random(seed)
+        path, engine, _ = make_database(
+            rng, teams_per_league=rng.randint(1, 12), max_score=rng.choice([0, 1, 3]),
+            id_spread=rng.choice([1, 7, 64]), unknown_rate=rng.choice([0, 0.1]),
+            repeat_rate=rng.choice([0, 0.3]), finished_rate=rng.choice([0.0, 0.5, 1.0]),
+        )
+        db = models.SessionLocal(bind=engine)
+        try:
+            everything = services.calculate_all_league_standings(db)
+            for sport in models.SportName:
+                for league in models.LeagueName:
+                    expected = legacy_calculate_league_standings(sport, league, db)
+                    if expected != everything.get((sport, league), []) or expected != services.calculate_league_standings(sport, league, db):
+                        mismatches += 1
+                        print(f"mismatch: seed={seed} {sport.value}-{league.value}")
+        finally:
+            db.close()
+            engine.dispose()
+            os.remove(path)
+    print(f"verified {seeds} random databases: {'OK' if not mismatches else f'{mismatches} mismatching leagues'}")
+    return mismatches == 0
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def benchmark(teams_per_league, repeat):
+    path, engine, num_matches = make_database(random.Random(0), teams_per_league, id_spread=3)
+    db = models.SessionLocal(bind=engine)
+    leagues = [(sport, league) for sport in models.SportName for league in models.LeagueName]
+    try:
+        legacy = timed(lambda: [legacy_calculate_league_standings(s, l, db) for s, l in leagues], repeat)
+        per_league = timed(lambda: [services.calculate_league_standings(s, l, db) for s, l in leagues], repeat)
+        all_at_once = timed(lambda: services.calculate_all_league_standings(db), repeat)
+    finally:
+        db.close()
+        engine.dispose()
+        os.remove(path)
+    print(f"{teams_per_league} teams/league, {num_matches} matches, {len(leagues)} leagues (median of {repeat}):")
+    print(f"  ORM + Python tally, per league : {legacy:8.1f} ms")
+    print(f"  SQL GROUP BY, per league       : {per_league:8.1f} ms")
+    print(f"  SQL GROUP BY, all leagues      : {all_at_once:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="リーグ順位表のSQL集計を従来の実装と比較・計測する")
+    parser.add_argument("--seeds", type=int, default=200, help="検証に使うランダムなDBの数")
+    parser.add_argument("--teams", type=int, nargs="+", default=[6, 20, 40], help="計測するリーグあたりのチーム数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    ok = verify(args.seeds)
+    for teams in args.teams:
+        benchmark(teams, args.repeat)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
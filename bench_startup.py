@@ -0,0 +1,77 @@
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), 'api'))
+
+
+def find_free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_once(db_path, warmup=False, timeout=30.0):
+    """
+    uvicornを起動し、最初のレスポンス(GET /classes/)が返るまでの秒数を返す。
+    """
+    port = find_free_port()
+    # 大会の一覧や各大会のDBも一時ディレクトリに作り、リポジトリに残さない
+    tmp = os.path.dirname(db_path)
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", FESTIVAL_CATALOG_URL=f"sqlite:///{os.path.join(tmp, 'festivals.db')}",
+               FESTIVAL_DIR=os.path.join(tmp, "festivals"))
+    if warmup:
+        env["TOKUTEN_WARMUP"] = "1"
+
+    url = f"http://127.0.0.1:{port}/classes/"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR,
+        env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    response.read()
+                return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                if proc.poll() is not None:
+                    raise RuntimeError("サーバーの起動に失敗しました。")
+                time.sleep(0.005)
+        raise TimeoutError("サーバーが時間内に応答しませんでした。")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API サーバーの起動から最初のレスポンスまでの時間を計測する")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数")
+    parser.add_argument("--warmup", action="store_true", help="TOKUTEN_WARMUP=1 で起動する")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+
+        # 1回目は空のDBなのでテーブル作成を含む
+        first = measure_once(db_path, warmup=args.warmup)
+        print(f"新規DB (テーブル作成あり): {first * 1000:.1f} ms")
+
+        timings = [measure_once(db_path, warmup=args.warmup) for _ in range(args.runs)]
+        print(f"既存DB x{args.runs}: "
+              f"min {min(timings) * 1000:.1f} ms / "
+              f"median {statistics.median(timings) * 1000:.1f} ms / "
+              f"max {max(timings) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
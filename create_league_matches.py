@@ -1,129 +1,44 @@
-import requests
-from itertools import combinations
+import argparse
+import asyncio
+import time
+
+from admin_client import AdminClient, BASE_URL, API_TOKEN
+
+
+async def run(args):
+    start = time.perf_counter()
+    async with AdminClient(args.base_url, args.token, concurrency=args.concurrency) as client:
+        # 種目・リーグはサーバーのカタログから取る (大会ごとに変えられるため)
+        sports, leagues = await client.get_catalog()
+        if not sports or not leagues:
+            print("\n".join(client.report()) or "The catalog has no sports or leagues.")
+            return 1
+        unknown = [name for name in (args.sport or []) if name not in sports] + [name for name in (args.league or []) if name not in leagues]
+        if unknown:
+            print(f"Not in the catalog: {', '.join(unknown)} (sports: {', '.join(sports)}; leagues: {', '.join(leagues)})")
+            return 2
+        counts = await client.generate_all_league_matches(args.sport or sports, args.league or leagues, prefer_bulk=not args.no_bulk)
+        for (sport, league), created in counts.items():
+            if created:
+                print(f"{sport} - {league} League: created {created} matches")
+        total = sum(counts.values())
+        print(f"--- Finished creating {total} new matches in {time.perf_counter() - start:.2f}s. ---" if total
+              else "No new matches needed. All pairs already exist.")
+        print("\n".join(client.report()))
+        return 1 if client.failures else 0
 
-BASE_URL = "http://127.0.0.1:8000"
-API_TOKEN = "secret-token"
-
-def get_teams_for_league(sport, league):
-    """Fetches all teams for a given league."""
-    url = f"{BASE_URL}/leagues/{sport}/{league}/teams/"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching teams: {e}")
-        return []
-
-def get_existing_matches(sport, league):
-    """Fetches all existing matches for a given league."""
-    url = f"{BASE_URL}/leagues/{sport}/{league}/matches/"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching matches: {e}")
-        return []
-
-def create_match(payload):
-    """Creates a new match."""
-    url = f"{BASE_URL}/league_matches/"
-    headers = {"Authorization": f"Bearer {API_TOKEN}"}
-    response = None
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        print(f"Successfully created match: {payload['class1_id']} vs {payload['class2_id']}")
-    except requests.exceptions.RequestException as e:
-        print(f"Error creating match for {payload['class1_id']} vs {payload['class2_id']}: {e}")
-        if response is not None:
-            print(f"Server response: {response.text}")
-
-def generate_round_robin_pairs(teams):
-    """Generates match pairs using the round-robin (circle) method, interleaved to maximize rest time."""
-    if not teams:
-        return []
-
-    # If odd number of teams, add a dummy team for byes
-    if len(teams) % 2:
-        teams.append(None)
-    
-    n = len(teams)
-    rounds = []
-    for _ in range(n - 1):
-        round_pairs = []
-        for i in range(n // 2):
-            team1 = teams[i]
-            team2 = teams[n - 1 - i]
-            if team1 and team2: # Ensure no Nones are paired
-                # Sort by class_id to keep pairs consistent
-                pair = tuple(sorted((team1['id'], team2['id'])))
-                round_pairs.append(pair)
-        rounds.append(round_pairs) # Keep rounds separate
-        
-        # Rotate teams for next round, keeping first team fixed
-        teams.insert(1, teams.pop())
-        
-    # Interleave the matches to spread them out
-    interleaved_pairs = []
-    if not rounds:
-        return []
-        
-    num_matches_per_round = max(len(r) for r in rounds) if rounds else 0
-    
-    for i in range(num_matches_per_round):
-        for j in range(len(rounds)):
-            if i < len(rounds[j]):
-                interleaved_pairs.append(rounds[j][i])
-                
-    return interleaved_pairs
 
 def main():
-    sport = "サッカー"
-    league = "A"
-
-    print(f"--- Generating matches for {sport} - {league} League ---")
-    
-    teams = get_teams_for_league(sport, league)
-    if not teams:
-        print("No teams found for this league. Exiting.")
-        return
-
-    existing_matches = get_existing_matches(sport, league)
-    existing_pairs = set()
-    for match in existing_matches:
-        pair = tuple(sorted((match['class1']['id'], match['class2']['id'])))
-        existing_pairs.add(pair)
-
-    print(f"Found {len(teams)} teams and {len(existing_matches)} existing matches.")
-
-    # Generate pairs using the new round-robin algorithm
-    scheduled_pairs = generate_round_robin_pairs(list(teams)) # Pass a copy
-
-    match_count = 0
-    for team1_id, team2_id in scheduled_pairs:
-        pair = (team1_id, team2_id)
-        if pair not in existing_pairs:
-            payload = {
-                "sport": sport,
-                "league": league,
-                "class1_id": team1_id,
-                "class2_id": team2_id,
-                "class1_score": 0,
-                "class2_score": 0,
-                "class1_sets_won": 0,
-                "class2_sets_won": 0,
-                "winner_id": None
-            }
-            create_match(payload)
-            match_count += 1
-    
-    if match_count == 0:
-        print("No new matches needed. All pairs already exist.")
-    else:
-        print(f"--- Finished creating {match_count} new matches. ---")
+    parser = argparse.ArgumentParser(description="Generates the round-robin league matches for every sport and league.")
+    parser.add_argument("--sport", action="append", help="sport to generate (repeatable, default: every sport in the catalog)")
+    parser.add_argument("--league", action="append", help="league to generate (repeatable, default: every league in the catalog)")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--token", default=API_TOKEN)
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum number of requests in flight")
+    parser.add_argument("--no-bulk", action="store_true", help="create each match with its own request")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import time
+
+# 'api' ディレクトリをPythonのパスに追加して、modelsをインポートできるようにする
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'api')))
+
+from models import SessionLocal, ensure_schema
+import csv_io
+
+
+def run_import(args):
+    files = {}
+    try:
+        for key in ("classes", "teams", "results"):
+            path = getattr(args, key)
+            if path:
+                files[key] = open(path, encoding="utf-8-sig", newline="")
+        if not files:
+            print("インポートするファイルを --classes / --teams / --results で指定してください。")
+            return 1
+
+        ensure_schema()
+        db = SessionLocal()
+        start = time.perf_counter()
+        try:
+            summary = csv_io.import_files(db, **files)
+        except csv_io.CsvImportError as e:
+            print(f"エラー: {e} (変更はすべて取り消されました)")
+            return 1
+        finally:
+            db.close()
+        print(f"インポート完了 ({(time.perf_counter() - start) * 1000:.1f} ms): {summary}")
+        return 0
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def run_export(args):
+    db = SessionLocal()
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        for chunk in csv_io.EXPORTERS[args.kind](db):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        db.close()
+    return 0
+
+
+def main():
+    """
+    クラス・リーグ所属・試合結果のCSVを一括で取り込む/書き出す。
+
+    例:
+      python import_export.py import --classes classes.csv --teams teams.csv --results results.csv
+      python import_export.py export results -o results.csv
+    """
+    parser = argparse.ArgumentParser(description="クラス・リーグ所属・試合結果のCSV一括インポート/エクスポート")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="CSVを1つのトランザクションで取り込む")
+    p_import.add_argument("--classes", help="列: name")
+    p_import.add_argument("--teams", help="列: sport, league, class_name")
+    p_import.add_argument("--results", help="列: " + ", ".join(csv_io.RESULT_COLUMNS))
+    p_import.set_defaults(func=run_import)
+
+    p_export = sub.add_parser("export", help="CSVを書き出す")
+    p_export.add_argument("kind", choices=sorted(csv_io.EXPORTERS))
+    p_export.add_argument("-o", "--output", help="出力先ファイル (省略時は標準出力)")
+    p_export.set_defaults(func=run_export)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
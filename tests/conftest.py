@@ -0,0 +1,41 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+# APIのモジュールは読み込み時に環境変数を見るので、import より前に一時ディレクトリへ向ける
+TMP_DIR = tempfile.mkdtemp(prefix="tokuten-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'class_match.db')}"
+os.environ["FESTIVAL_CATALOG_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'festivals.db')}"
+os.environ["FESTIVAL_DIR"] = os.path.join(TMP_DIR, "festivals")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "api")))
+
+from fastapi.testclient import TestClient
+import main, writer
+
+AUTH = {"Authorization": f"Bearer {main.API_TOKEN}"}
+_slugs = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(params=[False, True], ids=["direct", "group-commit"])
+def group_commit(request, monkeypatch):
+    monkeypatch.setattr(writer, "ENABLED", request.param)
+    yield request.param
+    writer.stop()
+
+
+@pytest.fixture
+def headers(client, group_commit):
+    """Admin headers for a festival database of its own, so every test starts empty."""
+    slug = f"test-{next(_slugs)}"
+    response = client.post("/festivals/", json={"slug": slug, "name": slug}, headers=AUTH)
+    assert response.status_code == 200, response.text
+    return {**AUTH, "X-Festival": slug}
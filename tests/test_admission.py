@@ -0,0 +1,108 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import admission, main
+
+
+def streaming_app(control, content_type, seen):
+    """An ASGI app sending three body chunks and recording the public slots in use before each."""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        for i in range(3):
+            seen.append(control.reads)
+            await send({"type": "http.response.body", "body": b"x", "more_body": i < 2})
+    return app
+
+
+@pytest.mark.parametrize("content_type, held", [(b"text/csv", [1, 1, 1]), (b"text/event-stream", [0, 0, 0])])
+def test_streams_hold_their_slot_until_the_last_chunk(content_type, held):
+    control = admission.Admission(read_limit=2)
+    seen = []
+    middleware = admission.AdmissionMiddleware(streaming_app(control, content_type, seen), is_trusted=lambda _: False,
+                                               control=control)
+    scope = {"type": "http", "method": "GET", "path": "/export/league_matches/", "query_string": b"", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    asyncio.run(middleware(scope, receive, send))
+    # SSE は開始時に返し、それ以外は最後の送信まで枠を使う
+    assert seen == held
+    assert control.reads == 0
+
+
+def test_export_keeps_read_source_headers(client, headers, monkeypatch):
+    monkeypatch.setattr(main.festivals, "open_session", _with_staleness(main.festivals.open_session))
+    response = client.get("/export/league_matches/", headers={"X-Festival": headers["X-Festival"]})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="league_matches.csv"'
+    assert response.headers["x-read-source"] == "replica"
+    assert response.headers["x-replica-staleness"] == "0.250"
+
+
+def test_page_load_burst_is_queued_not_shed(client, headers, monkeypatch):
+    # 競技詳細の画面と同じく9件を同時に取得する (空の大会でも 200 を返すものを選ぶ)
+    paths = [f"/leagues/サッカー/{league}/{kind}/" for league in "ABCD" for kind in ("matches", "teams")]
+    paths.append("/rankings/total/")
+    monkeypatch.setattr(main.festivals, "open_session", _slowed(main.festivals.open_session))
+    public = {"X-Festival": headers["X-Festival"]}
+    shed = admission.control.shed
+    with ThreadPoolExecutor(len(paths)) as pool:
+        responses = list(pool.map(lambda path: client.get(path, headers=public), paths))
+    # 上限を超えた分も待ち行列で空きを待つので、古い応答も 503 も返らない
+    assert [response.status_code for response in responses] == [200] * len(paths)
+    assert all("x-cache" not in response.headers for response in responses)
+    assert admission.control.shed == shed
+
+
+def test_full_queue_is_shed():
+    control = admission.Admission(read_limit=1, read_queue=1, read_timeout=5)
+
+    async def burst():
+        assert await control.acquire_read()
+        queued = asyncio.ensure_future(control.acquire_read())
+        await asyncio.sleep(0)
+        # 待ち行列も一杯なので待たずに断る
+        assert not await control.acquire_read()
+        control.release_read()
+        assert await queued
+        control.release_read()
+
+    asyncio.run(burst())
+    assert (control.reads, control.shed) == (0, 1)
+
+
+def test_queued_read_gives_up_after_timeout():
+    control = admission.Admission(read_limit=1, read_timeout=0.05)
+
+    async def wait():
+        assert await control.acquire_read()
+        assert not await control.acquire_read()
+        control.release_read()
+
+    asyncio.run(wait())
+    assert (control.reads, control.shed) == (0, 1)
+
+
+def _slowed(open_session):
+    # 各リクエストが処理中に重なるよう、DBを開くのを遅らせる
+    def opened(*args, **kwargs):
+        time.sleep(0.2)
+        return open_session(*args, **kwargs)
+    return opened
+
+
+def _with_staleness(open_session):
+    # 複製を作らずに、複製から読んだセッションとして扱う
+    def opened(*args, **kwargs):
+        db = open_session(*args, **kwargs)
+        if kwargs.get("use_replica"):
+            db.info["replica_staleness"] = 0.25
+        return db
+    return opened
@@ -0,0 +1,96 @@
+import pytest
+from sqlalchemy import create_engine
+
+import festivals, models, services, sportcatalog
+
+SPORT = "卓球"
+
+
+def fill_leagues(client, headers, leagues, teams_per_league):
+    """Registers `teams_per_league` new classes in each league and finishes every match (class1 wins)."""
+    for league in leagues:
+        for number in range(teams_per_league):
+            class_id = client.post("/classes/", json={"name": f"{league}-{number}"}, headers=headers).json()["id"]
+            assert client.post("/leagues/teams/", json={"sport": SPORT, "league": league, "class_id": class_id},
+                               headers=headers).status_code == 200
+        assert client.post(f"/leagues/{SPORT}/{league}/generate_matches/", headers=headers).status_code == 200
+        for match in client.get(f"/leagues/{SPORT}/{league}/matches/", headers=headers).json():
+            result = {"class1_score": 1, "class2_score": 0, "class1_sets_won": 0, "class2_sets_won": 0,
+                      "winner_id": match["class1_id"]}
+            assert client.put(f"/leagues/matches/{match['id']}/", json=result, headers=headers).status_code == 200
+
+
+def test_seeds_follow_catalog_leagues_and_advancing(client, headers):
+    leagues = list("ABCDEFGH")
+    for position, league in enumerate(leagues):
+        assert client.post("/catalog/leagues/", json={"name": league, "position": position}, headers=headers).status_code == 200
+    response = client.post("/catalog/sports/", json={"name": SPORT, "kind": "racket", "bracket": "top8", "advancing": 1},
+                           headers=headers)
+    assert response.status_code == 200
+    fill_leagues(client, headers, leagues, 2)
+
+    response = client.post(f"/tournaments/{SPORT}/generate/", headers=headers)
+    assert response.status_code == 200, response.text
+    first_round = [match for match in response.json() if "1回戦" in match["match_name"]]
+    # 各リーグの1位が隣のリーグの1位と当たる
+    assert [(match["class1"]["name"][0], match["class2"]["name"][0]) for match in first_round] == \
+        [("A", "B"), ("C", "D"), ("E", "F"), ("G", "H")]
+
+
+@pytest.mark.parametrize("advancing", [2, 3])
+def test_unseedable_configuration_is_rejected(client, headers, advancing):
+    response = client.post("/catalog/sports/", json={"name": SPORT, "kind": "racket", "bracket": "top4", "advancing": advancing},
+                           headers=headers)
+    assert response.status_code == 200
+    fill_leagues(client, headers, "ABCD", 3)
+
+    response = client.post(f"/tournaments/{SPORT}/generate/", headers=headers)
+    assert response.status_code == 400
+    assert "cannot be seeded" in response.json()["detail"]
+    assert client.get(f"/tournaments/{SPORT}/", headers=headers).status_code == 404
+
+
+def test_traditional_layouts_are_kept():
+    assert services.seed_first_round(list("ABCD"), 1, 2) == [(("A", 1), ("B", 1)), (("C", 1), ("D", 1))]
+    assert services.seed_first_round(list("ABCD"), 2, 4) == [
+        (("A", 1), ("B", 2)), (("C", 1), ("D", 2)), (("B", 1), ("C", 2)), (("D", 1), ("A", 2))]
+
+
+def test_catalog_change_from_another_process_is_seen(client, headers):
+    session = festivals.open_session(headers["X-Festival"], write=True)
+    festival_engine = session.get_bind()
+    session.close()
+    # 別のプロセスの代わりに、同じファイルを開いた別のエンジンから書き込む
+    other = create_engine(festival_engine.url)
+    try:
+        db = models.SessionLocal(bind=other)
+        db.add(models.Sport(name="綱引き", position=99, kind="other", bracket="none", advancing=1))
+        db.delete(db.get(models.League, "D"))
+        db.commit()
+        db.close()
+    finally:
+        other.dispose()
+
+    catalog = client.get("/catalog/", headers=headers).json()
+    assert "綱引き" in [sport["name"] for sport in catalog["sports"]]
+    assert [league["name"] for league in catalog["leagues"]] == ["A", "B", "C"]
+    assert sportcatalog.cache.get(festival_engine).sport("綱引き").bracket == "none"
+
+
+def test_catalog_check_does_not_hold_the_cache_lock(client, headers, monkeypatch):
+    session = festivals.open_session(headers["X-Festival"], write=True)
+    festival_engine = session.get_bind()
+    session.close()
+    sportcatalog.cache.get(festival_engine)
+    refresh = sportcatalog._refresh
+    held = []
+
+    def checking(*args):
+        # change_log を確認している間、キャッシュのロックは空いている
+        held.append(sportcatalog.cache._lock.locked())
+        return refresh(*args)
+
+    monkeypatch.setattr(sportcatalog, "_refresh", checking)
+    sportcatalog.cache.get(festival_engine)
+    sportcatalog.cache.get(festival_engine)
+    assert held == [False, False]
@@ -0,0 +1,42 @@
+import itertools
+import random
+
+import clinch
+
+OUTCOMES = ((2, 0), (1, 1), (0, 2))
+
+
+def brute_force(team, class_ids, points, remaining_matches, slots):
+    """(can_miss_top, can_reach_top) by trying every outcome of the remaining matches."""
+    can_miss = can_reach = False
+    for outcome in itertools.product(OUTCOMES, repeat=len(remaining_matches)):
+        final = dict(points)
+        for (class1_id, class2_id), (gain1, gain2) in zip(remaining_matches, outcome):
+            final[class1_id] += gain1
+            final[class2_id] += gain2
+        rivals = [final[cid] for cid in class_ids if cid != team]
+        can_miss |= sum(1 for p in rivals if p >= final[team]) >= slots
+        can_reach |= sum(1 for p in rivals if p > final[team]) < slots
+    return can_miss, can_reach
+
+
+def test_clinch_matches_brute_force_on_small_leagues():
+    rng = random.Random(0)
+    for _ in range(300):
+        class_ids = list(range(10, 10 + rng.randint(2, 5)))
+        fixtures = list(itertools.combinations(class_ids, 2))
+        points = {cid: 0 for cid in class_ids}
+        remaining = []
+        for class1_id, class2_id in fixtures:
+            if rng.random() < 0.5:
+                gain1, gain2 = rng.choice(OUTCOMES)
+                points[class1_id] += gain1
+                points[class2_id] += gain2
+            else:
+                remaining.append((class1_id, class2_id))
+        slots = rng.randint(1, len(class_ids) - 1)
+        for team in class_ids:
+            expected = brute_force(team, class_ids, points, remaining, slots)
+            actual = (clinch.can_miss_top(team, class_ids, points, remaining, slots),
+                      clinch.can_reach_top(team, class_ids, points, remaining, slots))
+            assert actual == expected, (team, points, remaining, slots)
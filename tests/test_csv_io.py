@@ -0,0 +1,67 @@
+import io
+
+import pytest
+
+from conftest import AUTH
+import csv_io, festivals
+
+CLASSES = "name\n1-1\n1-2\n1-3\n"
+TEAMS = "sport,league,class_name\nサッカー,A,1-1\nサッカー,A,1-2\nサッカー,A,1-3\n"
+HEADER = ",".join(csv_io.RESULT_COLUMNS) + "\n"
+RESULTS = HEADER + "サッカー,A,1-1,1-2,2,1,0,0,1-1,1\nサッカー,A,1-2,1-3,,,,,,0\n"
+
+
+def session(slug):
+    return festivals.open_session(slug, write=True)
+
+
+def import_files(slug, **files):
+    db = session(slug)
+    try:
+        return csv_io.import_files(db, **{key: io.StringIO(text) for key, text in files.items()})
+    finally:
+        db.close()
+
+
+def export(slug, kind):
+    db = session(slug)
+    try:
+        return "".join(csv_io.EXPORTERS[kind](db))
+    finally:
+        db.close()
+
+
+def test_round_trip(client, headers):
+    slug = headers["X-Festival"]
+    summary = import_files(slug, classes=CLASSES, teams=TEAMS, results=RESULTS)
+    assert summary == {"classes_created": 3, "league_teams_created": 3, "league_matches": {"updated": 0, "created": 2}}
+    exported = {kind: export(slug, kind) for kind in ("classes", "teams", "results")}
+
+    copy = slug + "-copy"
+    assert client.post("/festivals/", json={"slug": copy, "name": copy}, headers=AUTH).status_code == 200
+    import_files(copy, **exported)
+    assert {kind: export(copy, kind) for kind in exported} == exported
+    # 書き出したものを同じ大会に読み込んでも新しい試合は作られない
+    assert import_files(slug, results=exported["results"])["league_matches"] == {"updated": 2, "created": 0}
+
+
+def test_repeated_match_is_updated_once(headers):
+    slug = headers["X-Festival"]
+    import_files(slug, classes=CLASSES, teams=TEAMS, results=RESULTS)
+    repeated = HEADER + "サッカー,A,1-1,1-2,3,1,0,0,1-1,1\nサッカー,A,1-2,1-1,4,1,0,0,1-2,1\n"
+    assert import_files(slug, results=repeated)["league_matches"] == {"updated": 1, "created": 0}
+    # 後の行 (class1/class2 が逆) が残る
+    assert "サッカー,A,1-1,1-2,1,4,0,0,1-2,1" in export(slug, "results")
+
+
+@pytest.mark.parametrize("row, message", [
+    ("サッカー,A,1-1,1-2,2,1,0,0,1-3,1", "line 2: winner '1-3' is neither class1 nor class2"),
+    ("サッカー,A,1-1,1-1,2,1,0,0,1-1,1", "line 2: class1 and class2 are the same class"),
+])
+def test_invalid_result_is_rejected(headers, row, message):
+    slug = headers["X-Festival"]
+    import_files(slug, classes=CLASSES, teams=TEAMS)
+    before = export(slug, "results")
+    with pytest.raises(csv_io.CsvImportError, match=message):
+        import_files(slug, results=HEADER + row + "\n")
+    assert export(slug, "results") == before
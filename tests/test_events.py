@@ -0,0 +1,39 @@
+from sqlalchemy import select
+
+import festivals, models
+from test_match_versions import SPORT, bracket, class_id, setup_tournament
+
+
+def table_state(slug):
+    """Every league and tournament match row except `version`, which rebuilds advance on purpose."""
+    db = festivals.open_session(slug, write=True)
+    try:
+        state = {}
+        for model in (models.LeagueMatch, models.TournamentMatch):
+            columns = [column for column in model.__table__.columns if column.name != "version"]
+            state[model.__tablename__] = db.execute(select(*columns).order_by(model.id)).all()
+        return state
+    finally:
+        db.close()
+
+
+def test_rebuild_and_rollback_restore_the_tables(client, headers):
+    slug = headers["X-Festival"]
+    semifinal = setup_tournament(client, headers)["E1 (準決勝)"]
+    before = table_state(slug)
+    marker = client.get("/events/", params={"limit": 1000}, headers=headers).json()[-1]["id"]
+
+    assert client.post("/events/rebuild/", headers=headers).status_code == 200
+    assert table_state(slug) == before
+
+    # 勝ち上がりと試合の削除をしてから、その前のイベントまで戻す
+    assert client.put(f"/tournaments/{SPORT}/matches/{semifinal['id']}/",
+                      json={"winner_id": class_id(semifinal["class1"])}, headers=headers).status_code == 200
+    assert client.delete(f"/leagues/{SPORT}/D/matches/", headers=headers).status_code == 200
+    assert table_state(slug) != before
+
+    response = client.post(f"/events/rollback/{marker}/", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["compensating_events"] > 0
+    assert table_state(slug) == before
+    assert bracket(client, headers)["E3 (決勝)"]["class1"] is None
@@ -0,0 +1,35 @@
+import live, writer
+
+SPORT = "サッカー"
+
+
+def start_match(client, headers):
+    """A league match of two new classes, as listed before it goes live."""
+    for name in ("1-1", "1-2"):
+        class_id = client.post("/classes/", json={"name": name}, headers=headers).json()["id"]
+        assert client.post("/leagues/teams/", json={"sport": SPORT, "league": "A", "class_id": class_id},
+                           headers=headers).status_code == 200
+    assert client.post(f"/leagues/{SPORT}/A/generate_matches/", headers=headers).status_code == 200
+    return client.get(f"/leagues/{SPORT}/A/matches/", headers=headers).json()[0]
+
+
+def test_result_with_version_read_before_live_is_accepted(client, headers, group_commit):
+    match = start_match(client, headers)
+    for tick in ({"class1_points": 1}, {"class1_points": 1}, {"class2_points": 1}):
+        assert client.post(f"/leagues/matches/{match['id']}/live/", json=tick, headers=headers).status_code == 200
+    live.scores._tick(flush=True)
+
+    # 速報の書き込みはDBに届くが版数は変わらない
+    flushed = client.get(f"/leagues/{SPORT}/A/matches/", headers=headers).json()[0]
+    assert (flushed["class1_score"], flushed["class2_score"]) == (2, 1)
+    assert flushed["version"] == match["version"]
+    if group_commit:
+        assert sum(stats["operations"] for stats in writer.stats().values()) > 0
+
+    result = {"class1_score": 3, "class2_score": 1, "class1_sets_won": 0, "class2_sets_won": 0,
+              "winner_id": match["class1_id"], "version": match["version"]}
+    response = client.put(f"/leagues/matches/{match['id']}/", json=result, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["version"] == match["version"] + 1
+    live.scores._tick(flush=True)
+    assert client.get(f"/leagues/{SPORT}/A/matches/", headers=headers).json()[0]["class1_score"] == 3
@@ -0,0 +1,181 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import object_session
+
+import festivals, models, schemas, services
+
+SPORT = "サッカー"  # 各リーグの1位の4チームで準決勝・決勝・3位決定戦を行う
+
+
+def setup_tournament(client, headers):
+    """Four leagues of three classes, every league match won by class1, and the generated bracket."""
+    class_ids = [client.post("/classes/", json={"name": f"{grade}-{number}"}, headers=headers).json()["id"]
+                 for grade in range(1, 5) for number in range(1, 4)]
+    for i, league in enumerate("ABCD"):
+        for class_id in class_ids[i * 3:i * 3 + 3]:
+            assert client.post("/leagues/teams/", json={"sport": SPORT, "league": league, "class_id": class_id},
+                               headers=headers).status_code == 200
+        assert client.post(f"/leagues/{SPORT}/{league}/generate_matches/", headers=headers).status_code == 200
+        for match in client.get(f"/leagues/{SPORT}/{league}/matches/", headers=headers).json():
+            result = {"class1_score": 1, "class2_score": 0, "class1_sets_won": 0, "class2_sets_won": 0,
+                      "winner_id": match["class1_id"]}
+            assert client.put(f"/leagues/matches/{match['id']}/", json=result, headers=headers).status_code == 200
+    response = client.post(f"/tournaments/{SPORT}/generate/", headers=headers)
+    assert response.status_code == 200, response.text
+    return bracket(client, headers)
+
+
+def bracket(client, headers):
+    return {match["match_name"]: match for match in client.get(f"/tournaments/{SPORT}/", headers=headers).json()}
+
+
+def class_id(school_class):
+    return school_class["id"] if school_class else None
+
+
+def test_stale_league_version_returns_current(client, headers):
+    setup_tournament(client, headers)
+    match = client.get(f"/leagues/{SPORT}/A/matches/", headers=headers).json()[0]
+    result = {"class1_score": 2, "class2_score": 3, "class1_sets_won": 0, "class2_sets_won": 0,
+              "winner_id": match["class2_id"], "version": match["version"]}
+    updated = client.put(f"/leagues/matches/{match['id']}/", json=result, headers=headers)
+    assert updated.status_code == 200
+    assert updated.json()["version"] == match["version"] + 1
+
+    stale = client.put(f"/leagues/matches/{match['id']}/", json={**result, "class2_score": 4}, headers=headers)
+    assert stale.status_code == 409
+    current = stale.json()["detail"]["current"]
+    assert current["version"] == match["version"] + 1
+    assert (current["class1_score"], current["class2_score"]) == (2, 3)
+
+
+def test_stale_tournament_version_returns_current(client, headers):
+    semifinal = setup_tournament(client, headers)["E1 (準決勝)"]
+    winner, loser = class_id(semifinal["class1"]), class_id(semifinal["class2"])
+    path = f"/tournaments/{SPORT}/matches/{semifinal['id']}/"
+    assert client.put(path, json={"winner_id": winner, "version": semifinal["version"]}, headers=headers).status_code == 200
+
+    stale = client.put(path, json={"winner_id": loser, "version": semifinal["version"]}, headers=headers)
+    assert stale.status_code == 409
+    current = stale.json()["detail"]["current"]
+    assert current["version"] == semifinal["version"] + 1
+    assert class_id(current["winner"]) == winner
+    assert class_id(bracket(client, headers)["E3 (決勝)"]["class1"]) == winner
+
+
+def test_concurrent_semifinals_both_reach_the_final(client, headers):
+    matches = setup_tournament(client, headers)
+    semifinals = [matches["E1 (準決勝)"], matches["E2 (準決勝)"]]
+    start = threading.Barrier(len(semifinals))
+
+    def advance(match):
+        start.wait()
+        return client.put(f"/tournaments/{SPORT}/matches/{match['id']}/",
+                          json={"winner_id": class_id(match["class1"]), "version": match["version"]}, headers=headers)
+
+    with ThreadPoolExecutor(len(semifinals)) as pool:
+        responses = list(pool.map(advance, semifinals))
+    assert [response.status_code for response in responses] == [200, 200]
+
+    after = bracket(client, headers)
+    final, third_place = after["E3 (決勝)"], after["E4 (3位決定戦)"]
+    assert (class_id(final["class1"]), class_id(final["class2"])) == tuple(class_id(m["class1"]) for m in semifinals)
+    assert (class_id(third_place["class1"]), class_id(third_place["class2"])) == tuple(class_id(m["class2"]) for m in semifinals)
+    # 決勝は2回の勝ち上がりで2回だけ更新される
+    assert final["version"] == matches["E3 (決勝)"]["version"] + 2
+
+
+def test_semifinal_committed_in_between_is_kept(client, headers, group_commit, monkeypatch):
+    if group_commit:
+        # 書き込みスレッドが書き込みロックを持っているので、別のセッションから割り込めない
+        pytest.skip("another session cannot commit while the group commit writer holds the lock")
+    matches = setup_tournament(client, headers)
+    first, second = matches["E1 (準決勝)"], matches["E2 (準決勝)"]
+    propagate = services.propagate_tournament_result
+    calls = []
+
+    def interleaved(match, matches_by_name, advancement_map):
+        calls.append(match.match_name)
+        if len(calls) == 1:
+            # 1つ目の準決勝が読み込んだ後、勝ち上がりを書く前にもう1つの準決勝がコミットする
+            other = festivals.open_session(headers["X-Festival"], write=True)
+            try:
+                services.update_tournament_match(SPORT, second["id"], schemas.TournamentMatchUpdate(
+                    winner_id=class_id(second["class2"])), other)
+            finally:
+                other.close()
+        return propagate(match, matches_by_name, advancement_map)
+
+    monkeypatch.setattr(services, "propagate_tournament_result", interleaved)
+    response = client.put(f"/tournaments/{SPORT}/matches/{first['id']}/",
+                          json={"winner_id": class_id(first["class1"])}, headers=headers)
+    assert response.status_code == 200, response.text
+    # 決勝が競合したので読み直してやり直した
+    assert calls == ["E1 (準決勝)", "E2 (準決勝)", "E1 (準決勝)"]
+
+    final = bracket(client, headers)["E3 (決勝)"]
+    assert (class_id(final["class1"]), class_id(final["class2"])) == (class_id(first["class1"]), class_id(second["class2"]))
+
+
+def test_downstream_conflict_is_retried(client, headers, monkeypatch):
+    matches = setup_tournament(client, headers)
+    semifinal, final = matches["E1 (準決勝)"], matches["E3 (決勝)"]
+    propagate = services.propagate_tournament_result
+    calls = []
+
+    def conflicting(match, matches_by_name, advancement_map):
+        calls.append(match.match_name)
+        if len(calls) == 1:
+            # 決勝の版数をORMを通さずに進め、勝ち上がりの書き込みを競合させる。
+            # やり直しの前の取り消し (group commit では SAVEPOINT の取り消し) でこの変更も消える
+            object_session(match).connection().execute(
+                update(models.TournamentMatch.__table__).where(models.TournamentMatch.id == final["id"])
+                .values(version=models.TournamentMatch.version + 1))
+        return propagate(match, matches_by_name, advancement_map)
+
+    monkeypatch.setattr(services, "propagate_tournament_result", conflicting)
+    response = client.put(f"/tournaments/{SPORT}/matches/{semifinal['id']}/",
+                          json={"winner_id": class_id(semifinal["class1"]), "version": semifinal["version"]},
+                          headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["version"] == semifinal["version"] + 1
+    assert calls == ["E1 (準決勝)", "E1 (準決勝)"]
+
+    after = bracket(client, headers)["E3 (決勝)"]
+    assert class_id(after["class1"]) == class_id(semifinal["class1"])
+    assert after["version"] == final["version"] + 1
+
+
+def test_corrected_semifinal_resets_downstream(client, headers):
+    matches = setup_tournament(client, headers)
+    first, second = matches["E1 (準決勝)"], matches["E2 (準決勝)"]
+
+    def play(name, winner, score=(2, 1)):
+        match = bracket(client, headers)[name]
+        result = {"winner_id": winner, "class1_score": score[0], "class2_score": score[1]}
+        response = client.put(f"/tournaments/{SPORT}/matches/{match['id']}/", json=result, headers=headers)
+        assert response.status_code == 200, response.text
+
+    play("E1 (準決勝)", class_id(first["class1"]))
+    play("E2 (準決勝)", class_id(second["class1"]))
+    play("E3 (決勝)", class_id(first["class1"]))
+    play("E4 (3位決定戦)", class_id(second["class2"]))
+    played = bracket(client, headers)
+
+    # 準決勝の勝者を訂正すると、決勝と3位決定戦の対戦相手が入れ替わり、その結果は取り消される
+    play("E1 (準決勝)", class_id(first["class2"]))
+    after = bracket(client, headers)
+    final, third_place = after["E3 (決勝)"], after["E4 (3位決定戦)"]
+    assert (class_id(final["class1"]), class_id(final["class2"])) == (class_id(first["class2"]), class_id(second["class1"]))
+    assert (class_id(third_place["class1"]), class_id(third_place["class2"])) == (class_id(first["class1"]), class_id(second["class2"]))
+    for match in (final, third_place):
+        assert not match["is_finished"] and match["winner"] is None and match["class1_score"] is None
+    # もう1つの準決勝はそのまま
+    assert after["E2 (準決勝)"] == played["E2 (準決勝)"]
+
+    # 訂正後の結果で試合をやり直せる
+    play("E3 (決勝)", class_id(first["class2"]))
+    assert class_id(bracket(client, headers)["E3 (決勝)"]["winner"]) == class_id(first["class2"])
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import festivals, memstore
+
+
+def public(headers):
+    return {"X-Festival": headers["X-Festival"]}
+
+
+def store_entry(headers):
+    session = festivals.open_session(headers["X-Festival"], write=True)
+    try:
+        engine = session.get_bind()
+    finally:
+        session.close()
+    memstore.model.get(engine)
+    return memstore.model._stores[str(engine.url)]
+
+
+def test_memory_reads_are_labelled(client, headers):
+    response = client.get("/leagues/サッカー/A/matches/", headers=public(headers))
+    assert response.status_code == 200
+    assert response.headers["x-read-source"] == "memory"
+    assert "x-replica-staleness" not in response.headers
+
+
+def test_catch_up_locks_only_its_own_store(client, headers):
+    other = {**headers, "X-Festival": headers["X-Festival"] + "-other"}
+    assert client.post("/festivals/", json={"slug": other["X-Festival"], "name": "other"}, headers=headers).status_code == 200
+    assert client.post("/classes/", json={"name": "1-1"}, headers=headers).status_code == 200
+    entry = store_entry(headers)
+    with ThreadPoolExecutor(2) as pool:
+        with entry.lock:
+            # 読み直し中の大会があっても、変更のない読み取りと他の大会の読み取りは待たない
+            same = pool.submit(client.get, "/classes/", headers=public(headers))
+            elsewhere = pool.submit(client.get, "/classes/", headers=public(other))
+            assert [c["name"] for c in same.result(timeout=5).json()] == ["1-1"]
+            assert elsewhere.result(timeout=5).json() == []
+            # 変更があれば読み直しを待つ
+            assert client.post("/classes/", json={"name": "1-2"}, headers=headers).status_code == 200
+            changed = pool.submit(client.get, "/classes/", headers=public(headers))
+            assert not changed.done()
+        assert [c["name"] for c in changed.result(timeout=5).json()] == ["1-1", "1-2"]
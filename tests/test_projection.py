@@ -0,0 +1,50 @@
+import io
+
+import pytest
+
+import csv_io, festivals
+
+CLASSES = "name\n1-1\n1-2\n1-3\n1-4\n"
+TEAMS = "sport,league,class_name\n" + "".join(f"サッカー,A,1-{i}\n" for i in range(1, 5))
+HEADER = ",".join(csv_io.RESULT_COLUMNS) + "\n"
+PAIRS = [("1-1", "1-2"), ("1-3", "1-4"), ("1-1", "1-3"), ("1-2", "1-4"), ("1-1", "1-4"), ("1-2", "1-3")]
+
+
+def import_results(slug, finished):
+    rows = "".join(f"サッカー,A,{a},{b},2,0,0,0,{a},1\n" if i < finished else f"サッカー,A,{a},{b},,,,,,0\n"
+                   for i, (a, b) in enumerate(PAIRS))
+    db = festivals.open_session(slug, write=True)
+    try:
+        csv_io.import_files(db, classes=io.StringIO(CLASSES), teams=io.StringIO(TEAMS),
+                            results=io.StringIO(HEADER + rows))
+    finally:
+        db.close()
+
+
+def project(client, headers, seed):
+    response = client.get("/rankings/projection/", params={"simulations": 2000, "seed": seed}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_probabilities_sum_to_one(client, headers):
+    import_results(headers["X-Festival"], finished=2)
+    projected = project(client, headers, seed=7)
+    assert len(projected["classes"]) == 4
+    for entry in projected["classes"]:
+        assert sum(entry["rank_probabilities"]) == pytest.approx(1)
+    # 各順位にもちょうど1クラスが入る
+    for rank in range(4):
+        assert sum(entry["rank_probabilities"][rank] for entry in projected["classes"]) == pytest.approx(1)
+    # 同じ seed なら同じ結果になる
+    assert project(client, headers, seed=7) == projected
+
+
+def test_finished_event_is_certain(client, headers):
+    import_results(headers["X-Festival"], finished=len(PAIRS))
+    total = client.get("/rankings/total/", headers=headers).json()
+    projected = {entry["class_id"]: entry for entry in project(client, headers, seed=1)["classes"]}
+    for rank, entry in enumerate(total):
+        probabilities = projected[entry["class_id"]]["rank_probabilities"]
+        assert probabilities[rank] == 1
+        assert projected[entry["class_id"]]["expected_total_points"] == entry["total_points"]
@@ -0,0 +1,89 @@
+import time
+
+from sqlalchemy import create_engine, insert, update
+
+import festivals, models, readmodel
+
+SPORT = "サッカー"
+
+
+def festival_engine(headers):
+    session = festivals.open_session(headers["X-Festival"], write=True)
+    try:
+        return session.get_bind()
+    finally:
+        session.close()
+
+
+def league_match(client, headers):
+    """A league match of two new classes in league A."""
+    for name in ("1-1", "1-2"):
+        class_id = client.post("/classes/", json={"name": name}, headers=headers).json()["id"]
+        assert client.post("/leagues/teams/", json={"sport": SPORT, "league": "A", "class_id": class_id},
+                           headers=headers).status_code == 200
+    assert client.post(f"/leagues/{SPORT}/A/generate_matches/", headers=headers).status_code == 200
+    return client.get(f"/leagues/{SPORT}/A/matches/", headers=headers).json()[0]
+
+
+def wait_for_standings(client, headers, done):
+    deadline = time.monotonic() + 5
+    while True:
+        response = client.get(f"/leagues/{SPORT}/A/standings/", headers={"X-Festival": headers["X-Festival"]})
+        if response.status_code == 200 and done(response.json()):
+            return response.json()
+        assert time.monotonic() < deadline, response.text
+        time.sleep(0.05)
+
+
+def test_writes_from_another_process_are_recomputed(client, headers, monkeypatch):
+    monkeypatch.setattr(readmodel.worker, "poll_interval", 0.05)
+    # 別のプロセスの代わりに、同じファイルを開いた別のエンジンから書き込む (このプロセスには通知されない)
+    other = create_engine(festival_engine(headers).url)
+    try:
+        with other.begin() as conn:
+            conn.execute(insert(models.SchoolClass.__table__), [{"id": 1, "name": "1-1"}, {"id": 2, "name": "1-2"}])
+            conn.execute(insert(models.LeagueTeam.__table__), [{"sport": SPORT, "league": "A", "class_id": i} for i in (1, 2)])
+            match_id = conn.execute(insert(models.LeagueMatch.__table__).values(
+                sport=SPORT, league="A", class1_id=1, class2_id=2, is_finished=False)).inserted_primary_key[0]
+        # 1回だけ再計算させ、その結果から返されるようになるまで待つ
+        engine = festival_engine(headers)
+        readmodel.worker.mark_dirty(engine)
+        deadline = time.monotonic() + 5
+        while readmodel.worker.get(engine) is None:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        assert [row["wins"] for row in wait_for_standings(client, headers, lambda rows: True)] == [0, 0]
+
+        with other.begin() as conn:
+            conn.execute(update(models.LeagueMatch.__table__).where(models.LeagueMatch.id == match_id).values(
+                class1_score=3, class2_score=0, winner_id=1, is_finished=True))
+    finally:
+        other.dispose()
+    standings = wait_for_standings(client, headers, lambda rows: rows[0]["wins"] == 1)
+    assert standings[0]["class_id"] == 1
+
+
+def test_changed_sports_come_from_the_log(client, headers):
+    match = league_match(client, headers)
+    engine = festival_engine(headers)
+    db = models.SessionLocal(bind=engine)
+    try:
+        since = readmodel.last_seq(db)
+        db.execute(update(models.LeagueMatch.__table__).where(models.LeagueMatch.id == match["id"]).values(class1_score=1))
+        db.commit()
+        assert readmodel.changed_sports(db, since, readmodel.last_seq(db)) == {SPORT}
+
+        # クラス名は全種目の順位表に出る
+        since = readmodel.last_seq(db)
+        db.execute(update(models.SchoolClass.__table__).where(models.SchoolClass.id == match["class1_id"]).values(name="1-9"))
+        db.commit()
+        assert readmodel.changed_sports(db, since, readmodel.last_seq(db)) is readmodel.ALL_SPORTS
+
+        # 削除された試合は種目が分からない
+        since = readmodel.last_seq(db)
+        db.query(models.LeagueMatch).filter(models.LeagueMatch.id == match["id"]).delete()
+        db.commit()
+        assert readmodel.changed_sports(db, since, readmodel.last_seq(db)) is readmodel.ALL_SPORTS
+        assert readmodel.changed_sports(db, readmodel.last_seq(db), readmodel.last_seq(db)) == frozenset()
+    finally:
+        db.close()
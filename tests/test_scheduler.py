@@ -0,0 +1,42 @@
+import itertools
+import random
+from collections import defaultdict
+
+import pytest
+
+import scheduler
+
+
+def random_fixtures(rng):
+    fixtures = []
+    classes = list(range(1, rng.randint(4, 12)))
+    for sport in ("サッカー", "バスケ", "卓球")[:rng.randint(1, 3)]:
+        teams = rng.sample(classes, rng.randint(2, len(classes)))
+        for a, b in itertools.combinations(teams, 2):
+            fixtures.append((len(fixtures) + 1, sport, a, b))
+    courts = {"サッカー": rng.randint(1, 2), "バスケ": rng.randint(1, 3), "卓球": rng.randint(1, 4)}
+    return fixtures, courts
+
+
+@pytest.mark.parametrize("rest_slots", [0, 1, 2])
+def test_schedule_has_no_conflicts(rest_slots):
+    rng = random.Random(rest_slots)
+    for _ in range(50):
+        fixtures, courts = random_fixtures(rng)
+        total_slots, bound, assignments = scheduler.build_schedule(fixtures, courts, rest_slots)
+        assert total_slots >= bound
+        assert assignments.keys() == {match_id for match_id, _, _, _ in fixtures}
+
+        used = set()
+        class_slots = defaultdict(list)
+        for match_id, sport, class1_id, class2_id in fixtures:
+            slot, court = assignments[match_id]
+            assert 0 <= slot < total_slots and 1 <= court <= courts[sport]
+            assert (sport, slot, court) not in used
+            used.add((sport, slot, court))
+            class_slots[class1_id].append(slot)
+            class_slots[class2_id].append(slot)
+        # 同じクラスの試合の間には rest_slots 枠以上の休みがある (同じ枠の試合もない)
+        for slots in class_slots.values():
+            slots.sort()
+            assert all(later - earlier > rest_slots for earlier, later in zip(slots, slots[1:]))
@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from conftest import TMP_DIR
+import writer
+
+
+@pytest.fixture
+def engine():
+    path = os.path.join(TMP_DIR, "writer.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 0.1})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS t (x INTEGER)"))
+    yield engine
+    engine.dispose()
+    os.remove(path)
+
+
+def insert(value):
+    return lambda session: session.execute(text("INSERT INTO t VALUES (:x)"), {"x": value})
+
+
+def test_failed_batch_fails_every_operation(engine):
+    # 他の接続が書き込みロックを持ち続けているので、まとめたトランザクションの BEGIN IMMEDIATE が失敗する
+    locker = sqlite3.connect(engine.url.database, isolation_level=None)
+    locker.execute("BEGIN IMMEDIATE")
+    group = writer.GroupCommitWriter(engine, interval=0.05)
+    try:
+        futures = [group.submit(insert(i)) for i in range(3)]
+        for future in futures:
+            with pytest.raises(Exception, match="locked"):
+                future.result(timeout=5)
+    finally:
+        locker.rollback()
+        locker.close()
+        group.stop()
+
+
+def test_run_gives_up_with_503(engine, monkeypatch):
+    monkeypatch.setattr(writer, "ENABLED", True)
+    release = threading.Event()
+    db = Session(bind=engine)
+    try:
+        # 1つ目の操作が書き込みスレッドを止めている間、2つ目は待ちきれずに取り消される
+        first = writer.writer_for(engine).submit(lambda session: release.wait(5))
+        with pytest.raises(HTTPException) as raised:
+            writer.run(db, insert(1), timeout=0.1)
+        assert raised.value.status_code == 503
+        release.set()
+        assert first.result(timeout=5) is True
+    finally:
+        release.set()
+        db.close()
+        writer.stop()
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM t")).scalar() == 0